@@ -0,0 +1,174 @@
+"""Analytics queries on the rollups and on the raw logs, as the logs grow.
+
+For each number of `--rows`, a scratch copy of the prediction logs is
+filled with the rows spread over the same `--days` days and rolled up
+with `src.analytics`. Then it times the hourly request counts and
+inference time quantiles of the whole range, read from the rollups and
+computed from the raw logs with the equivalent SQL, and reports the p99
+of `--repeat` runs. The rollups hold at most one row per minute whatever
+the traffic, so their p99 should stay flat while the raw one grows with
+the rows. The tables are dropped at the end.
+
+Usage: python -m benchmarks.bench_analytics --rows 100000,1000000 --days 7
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Connection, create_engine, text
+
+from src.analytics import distribution, request_counts, roll_up
+from src.utils import settings
+
+TABLE = "bench_analytics_logs"
+ROLLUPS = ("minutes", "minute_histograms")
+
+RAW_REQUEST_COUNTS = f"""
+    SELECT date_trunc('hour', timestamp), count(*),
+        count(*) FILTER (WHERE cache_hit),
+        count(*) FILTER (WHERE prediction_response IS NULL),
+        avg(inference_time), avg(prediction_response),
+        min(prediction_response), max(prediction_response)
+    FROM {TABLE} WHERE timestamp >= :start AND timestamp < :end
+    GROUP BY 1 ORDER BY 1
+"""
+RAW_DISTRIBUTION = f"""
+    SELECT date_trunc('hour', timestamp), count(inference_time),
+        percentile_cont(ARRAY[0.5, 0.9, 0.95, 0.99])
+            WITHIN GROUP (ORDER BY inference_time)
+    FROM {TABLE} WHERE timestamp >= :start AND timestamp < :end
+    GROUP BY 1 ORDER BY 1
+"""
+
+
+def create_tables(connection: Connection):
+    connection.execute(
+        text(f"CREATE TABLE {TABLE} (LIKE prediction_logs INCLUDING ALL)")
+    )
+    for rollup in ROLLUPS:
+        connection.execute(
+            text(
+                f"CREATE TABLE {TABLE}_{rollup} "
+                f"(LIKE prediction_logs_{rollup} INCLUDING ALL)"
+            )
+        )
+
+
+def drop_tables(connection: Connection):
+    for name in (TABLE, *(f"{TABLE}_{rollup}" for rollup in ROLLUPS)):
+        connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    connection.execute(
+        text("DELETE FROM rollup_watermarks WHERE source_table = :table"),
+        {"table": TABLE},
+    )
+
+
+def fill(connection: Connection, rows: int, start: datetime, days: int):
+    """Inserts the rows evenly spread from `start` over the days."""
+    step = days * 86400 / rows
+    connection.execute(
+        text(
+            f"INSERT INTO {TABLE} (mainroad, guestroom, basement, "
+            "hotwaterheating, airconditioning, prefarea, furnishingstatus, "
+            "area, bedrooms, bathrooms, stories, parking, "
+            "prediction_response, timestamp, inference_time, cache_hit) "
+            "SELECT 'yes', 'no', 'no', 'no', 'yes', 'no', 'furnished', "
+            "1000 + i % 9000, 1 + i % 5, 1, 2, 1, "
+            "CASE WHEN i % 100 = 0 THEN NULL ELSE 1e6 + i % 100000 * 50 END, "
+            ":start + make_interval(secs => i * :step), "
+            "0.005 + (i % 997) * 0.0001, i % 3 = 0 "
+            "FROM generate_series(0, :rows - 1) AS i"
+        ),
+        {"start": start, "step": step, "rows": rows},
+    )
+
+
+def p99(repeat: int, function) -> float:
+    """p99 of the milliseconds the function took over the runs."""
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start_time) * 1000)
+    return statistics.quantiles(times, n=100)[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", default="100000,1000000,4000000")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=args.days)
+    window = {"start": start, "end": end}
+    engine = create_engine(settings.DATABASE_URL)
+    results = {"days": args.days, "sizes": {}}
+    try:
+        for rows in map(int, args.rows.split(",")):
+            with engine.begin() as connection:
+                drop_tables(connection)
+                create_tables(connection)
+                fill(connection, rows, start, args.days)
+            with engine.connect().execution_options(
+                isolation_level="AUTOCOMMIT"
+            ) as connection:
+                connection.execute(text(f"VACUUM ANALYZE {TABLE}"))
+            with engine.connect() as connection:
+                start_time = time.perf_counter()
+                roll_up(connection, end, table=TABLE)
+                roll_up_ms = (time.perf_counter() - start_time) * 1000
+                results["sizes"][rows] = {
+                    "roll_up_ms": roll_up_ms,
+                    "requests_rollup_p99_ms": p99(
+                        args.repeat,
+                        lambda: request_counts(
+                            connection, start, end, "hour", table=TABLE
+                        ),
+                    ),
+                    "requests_raw_p99_ms": p99(
+                        args.repeat,
+                        lambda: connection.execute(
+                            text(RAW_REQUEST_COUNTS), window
+                        ).all(),
+                    ),
+                    "quantiles_rollup_p99_ms": p99(
+                        args.repeat,
+                        lambda: distribution(
+                            connection,
+                            "inference_time",
+                            start,
+                            end,
+                            "hour",
+                            table=TABLE,
+                        ),
+                    ),
+                    "quantiles_raw_p99_ms": p99(
+                        args.repeat,
+                        lambda: connection.execute(
+                            text(RAW_DISTRIBUTION), window
+                        ).all(),
+                    ),
+                }
+                connection.rollback()
+    finally:
+        with engine.begin() as connection:
+            drop_tables(connection)
+
+    for rows, result in results["sizes"].items():
+        print(
+            f"{rows:>10} rows: roll up {result['roll_up_ms']:9.1f} ms  "
+            f"requests p99 {result['requests_rollup_p99_ms']:7.2f} / "
+            f"{result['requests_raw_p99_ms']:8.2f} ms  "
+            f"quantiles p99 {result['quantiles_rollup_p99_ms']:7.2f} / "
+            f"{result['quantiles_raw_p99_ms']:8.2f} ms (rollup / raw)"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
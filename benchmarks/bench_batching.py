@@ -0,0 +1,73 @@
+"""Load test of /predict with and without server-side micro-batching.
+
+The stub model server charges a fixed cost per request plus a small cost
+per row and only processes a few requests in parallel, so coalescing
+concurrent calls raises the throughput.
+
+Usage: python -m benchmarks.bench_batching --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+
+from benchmarks.harness import PAYLOAD, free_port, serve
+from benchmarks.load import run_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--model-latency-ms", type=float, default=50)
+    parser.add_argument("--model-latency-per-row-ms", type=float, default=0.1)
+    parser.add_argument("--model-workers", type=int, default=1)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    stub_env = {
+        "STUB_LATENCY_MS": str(args.model_latency_ms),
+        "STUB_LATENCY_PER_ROW_MS": str(args.model_latency_per_row_ms),
+        "STUB_MAX_CONCURRENCY": str(args.model_workers),
+    }
+    results = {}
+    with serve(
+        "benchmarks.stub_model_server:app", free_port(), stub_env
+    ) as stub_url:
+        for batching in ("false", "true"):
+            service_env = {
+                "MODEL_PREDICTION_ENDPOINT": f"{stub_url}/invocations",
+                "MODEL_BATCHING_ENABLED": batching,
+                "MODEL_BATCHING_MAX_SIZE": str(args.max_batch_size),
+                "MODEL_BATCHING_MAX_WAIT_MS": str(args.max_wait_ms),
+            }
+            with serve("src.main:app", free_port(), service_env) as url:
+                result = asyncio.run(
+                    run_load(
+                        f"{url}/predict",
+                        PAYLOAD,
+                        args.concurrency,
+                        args.requests,
+                    )
+                )
+            name = "batching" if batching == "true" else "no_batching"
+            results[name] = result.as_dict()
+
+    for name, result in results.items():
+        print(
+            f"{name:>12}: {result['requests_per_second']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms  "
+            f"errors {result['errors']}"
+        )
+    gain = (
+        results["batching"]["requests_per_second"]
+        / results["no_batching"]["requests_per_second"]
+    )
+    print(f"throughput gain: {gain:.2f}x")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Microbenchmark of the JSON and binary tensor model requests.
+
+Measures the CPU time this service spends per model call, encoding the
+request body and reading the predictions from the response, with JSON
+tensors and with the binary tensor data extension
+(`MODEL_BINARY_DATA=true`). The responses are the ones of the stub model
+server.
+
+Usage: python -m benchmarks.bench_binary --batch-sizes 1 32 1000 10000
+"""
+
+import argparse
+import json
+
+from benchmarks.bench_encoder import time_per_call_ns
+from benchmarks.harness import PAYLOAD
+from benchmarks.stub_model_server import binary_outputs
+from src.main import HousingData, kserve_encoder
+from src.model_client import HEADER_LENGTH, decode_binary_response
+
+
+def model_response(rows: int) -> dict:
+    return {
+        "model_name": "house_price_prediction_prod",
+        "model_version": "4",
+        "outputs": [
+            {
+                "name": "output-1",
+                "shape": [rows, 1],
+                "datatype": "FP32",
+                "data": [123456.7] * rows,
+            }
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 32, 1000, 10000]
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per repeat"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for batch_size in args.batch_sizes:
+        rows = [HousingData(**PAYLOAD) for _ in range(batch_size)]
+        json_body = json.dumps(model_response(batch_size)).encode()
+        binary = binary_outputs(model_response(batch_size))
+        binary_body = binary.body
+        binary_header_length = int(binary.headers[HEADER_LENGTH])
+
+        def json_call(rows):
+            kserve_encoder.encode(rows)
+            return json.loads(json_body)["outputs"][0]["data"]
+
+        def binary_call(rows):
+            kserve_encoder.encode_binary(rows)
+            response = decode_binary_response(
+                binary_body, binary_header_length
+            )
+            return response["outputs"][0]["data"].tolist()
+
+        json_ns = time_per_call_ns(json_call, rows, args.min_time)
+        binary_ns = time_per_call_ns(binary_call, rows, args.min_time)
+        results[batch_size] = {
+            "json_ns_per_call": json_ns,
+            "binary_ns_per_call": binary_ns,
+            "json_request_bytes": len(kserve_encoder.encode(rows)),
+            "binary_request_bytes": len(kserve_encoder.encode_binary(rows)[0]),
+            "speedup": json_ns / binary_ns,
+        }
+        print(
+            f"{batch_size:>6} rows: json {json_ns / 1000:10.1f} us  "
+            f"binary {binary_ns / 1000:10.1f} us  "
+            f"speedup {json_ns / binary_ns:5.2f}x"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark of /predict/bulk scoring a large NDJSON file.
+
+The file is generated while it is uploaded and the results are read while
+they are streamed back, the first result arriving long before the upload
+is over shows the rows are scored as they arrive.
+
+Usage: python -m benchmarks.bench_bulk --rows 200000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import h11
+
+from benchmarks.harness import PAYLOAD, free_port, serve
+
+
+async def upload(rows: int):
+    line = json.dumps(PAYLOAD).encode() + b"\n"
+    for _ in range(rows // 1000):
+        yield line * 1000
+    yield line * (rows % 1000)
+
+
+async def run_bulk(host: str, port: int, rows: int) -> dict:
+    """Uploads the rows and reads the results as they are streamed.
+
+    Most HTTP/1.1 clients, httpx included, only read the response once the
+    whole body is sent, so the upload is written with h11 while reading.
+    """
+    start_time = time.perf_counter()
+    connection = h11.Connection(our_role=h11.CLIENT)
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def send(event):
+        writer.write(connection.send(event))
+        await writer.drain()
+
+    async def send_body():
+        await send(
+            h11.Request(
+                method="POST",
+                target="/predict/bulk",
+                headers=[
+                    ("Host", host),
+                    ("Content-Type", "application/x-ndjson"),
+                    ("Transfer-Encoding", "chunked"),
+                ],
+            )
+        )
+        async for block in upload(rows):
+            await send(h11.Data(data=block))
+        await send(h11.EndOfMessage())
+
+    sender = asyncio.create_task(send_body())
+    first_result, results, buffer = None, 0, b""
+    while True:
+        event = connection.next_event()
+        if event is h11.NEED_DATA:
+            connection.receive_data(await reader.read(65536))
+        elif isinstance(event, h11.Response):
+            assert event.status_code == 200, event.status_code
+        elif isinstance(event, h11.Data):
+            if first_result is None:
+                first_result = time.perf_counter() - start_time
+            buffer += event.data
+            *lines, buffer = buffer.split(b"\n")
+            results += len(lines)
+            if lines:
+                last = lines[-1]
+        elif isinstance(event, h11.EndOfMessage):
+            break
+    await sender
+    writer.close()
+    duration = time.perf_counter() - start_time
+    return {
+        "rows": rows,
+        "results": results - 1,
+        "duration": duration,
+        "rows_per_second": rows / duration,
+        "first_result_seconds": first_result,
+        "server_stats": json.loads(last)["stats"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--model-latency-ms", type=float, default=5)
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    stub_env = {"STUB_LATENCY_MS": str(args.model_latency_ms)}
+    with serve(
+        "benchmarks.stub_model_server:app", free_port(), stub_env
+    ) as stub_url:
+        service_env = {
+            "MODEL_PREDICTION_ENDPOINT": f"{stub_url}/invocations",
+            "MODEL_BULK_CHUNK_SIZE": str(args.chunk_size),
+            "MODEL_BULK_MAX_CONCURRENCY": str(args.max_concurrency),
+        }
+        port = free_port()
+        with serve("src.main:app", port, service_env):
+            result = asyncio.run(run_bulk("127.0.0.1", port, args.rows))
+
+    print(
+        f"{result['rows']} rows in {result['duration']:.2f} s: "
+        f"{result['rows_per_second']:.0f} rows/s, first result after "
+        f"{result['first_result_seconds'] * 1000:.0f} ms"
+    )
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
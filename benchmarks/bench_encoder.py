@@ -0,0 +1,79 @@
+"""Microbenchmark of the encoding of the KServe request body.
+
+Compares the previous encoding, dumping the rows to JSON, parsing them
+back into the payload and serialising it again the way httpx does with
+`json=`, with the precomputed `KServeEncoder`.
+
+Usage: python -m benchmarks.bench_encoder --batch-sizes 1 32 1000
+"""
+
+import argparse
+import json
+import timeit
+
+from benchmarks.harness import PAYLOAD
+from src.main import DATATYPE_MAPPING, HousingData, kserve_encoder
+
+
+def json_payload(rows: list[HousingData]) -> dict:
+    """The request payload as it was built before `KServeEncoder`."""
+    transformed_rows = [json.loads(row.model_dump_json()) for row in rows]
+    return {
+        "inputs": [
+            {
+                "name": key,
+                "shape": [len(rows)],
+                "datatype": datatype,
+                "data": [
+                    row[key].upper() if isinstance(row[key], str) else row[key]
+                    for row in transformed_rows
+                ],
+            }
+            for key, datatype in DATATYPE_MAPPING.items()
+        ]
+    }
+
+
+def json_round_trip(rows: list[HousingData]) -> bytes:
+    return json.dumps(json_payload(rows)).encode()
+
+
+def time_per_call_ns(function, rows, min_time: float) -> float:
+    timer = timeit.Timer(lambda: function(rows))
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 32, 1000]
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per repeat"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for batch_size in args.batch_sizes:
+        rows = [HousingData(**PAYLOAD) for _ in range(batch_size)]
+        json_ns = time_per_call_ns(json_round_trip, rows, args.min_time)
+        encoder_ns = time_per_call_ns(
+            kserve_encoder.encode, rows, args.min_time
+        )
+        results[batch_size] = {
+            "json_round_trip_ns_per_request": json_ns,
+            "encoder_ns_per_request": encoder_ns,
+            "speedup": json_ns / encoder_ns,
+        }
+        print(
+            f"{batch_size:>5} rows: json round trip {json_ns:12.0f} ns  "
+            f"encoder {encoder_ns:12.0f} ns  "
+            f"speedup {json_ns / encoder_ns:5.2f}x"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
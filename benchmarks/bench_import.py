@@ -0,0 +1,69 @@
+"""Benchmark of the import time of the app, which each worker start pays.
+
+Imports `src.main` in fresh interpreters and reports the median wall time
+of the import, next to the bare interpreter start up, and the modules
+taking the longest to import according to `python -X importtime`.
+
+Usage: python -m benchmarks.bench_import --repeat 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+
+def wall_time(code: str) -> float:
+    """Seconds to run the code in a fresh interpreter."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(module: str, count: int) -> list[tuple[str, float]]:
+    """Modules with the longest cumulative import time, in ms."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = []
+    for line in output.splitlines()[1:]:
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        times.append((name.strip(), int(cumulative) / 1000))
+    return sorted(times, key=lambda item: item[1], reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    interpreter = statistics.median(
+        wall_time("pass") for _ in range(args.repeat)
+    )
+    total = statistics.median(
+        wall_time(f"import {args.module}") for _ in range(args.repeat)
+    )
+    results = {
+        "interpreter_ms": interpreter * 1000,
+        "import_ms": (total - interpreter) * 1000,
+        "slowest_imports_ms": dict(slowest_imports(args.module, args.top)),
+    }
+    print(
+        f"interpreter {results['interpreter_ms']:8.1f} ms  "
+        f"import {args.module} {results['import_ms']:8.1f} ms"
+    )
+    for name, ms in results["slowest_imports_ms"].items():
+        print(f"{name:>50}: {ms:8.1f} ms")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
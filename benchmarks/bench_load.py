@@ -0,0 +1,177 @@
+"""Load test suite of /predict, giving a baseline to compare commits with.
+
+Each scenario runs the service against the stub model server, at fixed
+request rates and then at ramping concurrency, and reports the req/s,
+p50/p95/p99 latency and the CPU time of the service per request. The
+scenarios are the default service, the service without the database
+logs and the service with more uvicorn workers.
+
+Usage:
+    python -m benchmarks.bench_load --output baseline.json
+    python -m benchmarks.bench_load --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks.harness import (
+    PAYLOAD,
+    cpu_seconds,
+    free_port,
+    serve,
+    serve_process,
+)
+from benchmarks.load import compare, run_fixed_rate, run_load, run_ramp
+
+
+def scenarios(workers: list[int]) -> dict[str, tuple[dict, int]]:
+    """Service environment and number of workers of each scenario."""
+    runs = {
+        "predict": ({}, 1),
+        "predict_no_db_log": ({"DB_LOG_ENABLED": "false"}, 1),
+    }
+    for count in workers:
+        if count != 1:
+            runs[f"predict_{count}_workers"] = ({}, count)
+    return runs
+
+
+def commit() -> str | None:
+    """Git commit of the tree benchmarked, None outside of a repository."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measured(pid: int, run) -> dict:
+    """Runs the load coroutine, adding the CPU time of the service."""
+    before = cpu_seconds(pid)
+    result = asyncio.run(run)
+    used = cpu_seconds(pid) - before
+    if result.requests:
+        result.cpu_ms_per_request = used * 1000 / result.requests
+    return result.as_dict()
+
+
+def run_scenario(url: str, pid: int, args) -> dict[str, dict]:
+    """Runs the fixed rates and the ramp against the service."""
+    predict_url = f"{url}/predict"
+    # Warm up the connections to the database and the model
+    asyncio.run(run_load(predict_url, PAYLOAD, 8, 200))
+    results = {}
+    for rate in args.rates:
+        results[f"rate_{rate:g}"] = measured(
+            pid,
+            run_fixed_rate(predict_url, PAYLOAD, rate, args.stage_seconds),
+        )
+    before = cpu_seconds(pid)
+    ramp = asyncio.run(
+        run_ramp(predict_url, PAYLOAD, args.ramp, args.stage_seconds)
+    )
+    # The CPU time of the ramp is only known for all of its stages
+    used = cpu_seconds(pid) - before
+    total = sum(result.requests for result in ramp.values())
+    for concurrency, result in ramp.items():
+        if total:
+            result.cpu_ms_per_request = used * 1000 / total
+        results[f"concurrency_{concurrency}"] = result.as_dict()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        "--rates", type=float, nargs="+", default=[100, 200, 400]
+    )
+    parser.add_argument("--ramp", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--stage-seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--scenarios", nargs="+", help="default: all")
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    parser.add_argument("--model-jitter-ms", type=float, default=5)
+    parser.add_argument("--model-error-rate", type=float, default=0)
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--baseline", help="results to compare with")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=10,
+        help="percent a metric may be worse than the baseline",
+    )
+    args = parser.parse_args()
+
+    stub_env = {
+        "STUB_LATENCY_MS": str(args.model_latency_ms),
+        "STUB_JITTER_MS": str(args.model_jitter_ms),
+        "STUB_ERROR_RATE": str(args.model_error_rate),
+    }
+    runs = scenarios(args.workers)
+    if args.scenarios:
+        runs = {name: runs[name] for name in args.scenarios}
+    results = {}
+    with serve(
+        "benchmarks.stub_model_server:app", free_port(), stub_env
+    ) as stub_url:
+        for name, (env, workers) in runs.items():
+            service_env = {
+                "MODEL_PREDICTION_ENDPOINT": f"{stub_url}/invocations",
+                **env,
+            }
+            with serve_process(
+                "src.main:app", free_port(), service_env, workers
+            ) as (url, process):
+                for run, result in run_scenario(
+                    url, process.pid, args
+                ).items():
+                    results[f"{name}/{run}"] = result
+
+    for run, result in results.items():
+        print(
+            f"{run:>36}: {result['requests_per_second']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  "
+            f"p95 {result['p95_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms  "
+            f"cpu {result['cpu_ms_per_request'] or 0:6.3f} ms/req  "
+            f"errors {result['errors']}"
+        )
+    report = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print(json.dumps(report))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        lines, regressions = compare(
+            baseline["results"], results, args.tolerance
+        )
+        print(f"Compared with {args.baseline} ({baseline.get('commit')}):")
+        print("\n".join(lines))
+        if regressions:
+            print(f"Worse than the baseline by more than {args.tolerance}%:")
+            print("\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
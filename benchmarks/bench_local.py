@@ -0,0 +1,68 @@
+"""Latency of /predict with the remote and the local prediction backend.
+
+The remote backend calls the stub model server over HTTP, the local one
+scores in-process with a pickled `StubRegressionModel`, so the difference
+is the cost of the HTTP hop to the model server.
+
+Usage: python -m benchmarks.bench_local --concurrency 8 --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+import pickle
+import tempfile
+from pathlib import Path
+
+from benchmarks.harness import PAYLOAD, free_port, serve
+from benchmarks.load import run_load
+from benchmarks.stub_model_server import StubRegressionModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--model-latency-ms", type=float, default=0)
+    parser.add_argument(
+        "--executor", choices=["thread", "process"], default="thread"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as model_dir:
+        model_path = Path(model_dir) / "model.pkl"
+        model_path.write_bytes(pickle.dumps(StubRegressionModel()))
+        stub_env = {"STUB_LATENCY_MS": str(args.model_latency_ms)}
+        with serve(
+            "benchmarks.stub_model_server:app", free_port(), stub_env
+        ) as stub_url:
+            for backend in ("remote", "local"):
+                service_env = {
+                    "MODEL_PREDICTION_ENDPOINT": f"{stub_url}/invocations",
+                    "PREDICTION_BACKEND": backend,
+                    "LOCAL_MODEL_PATH": str(model_path),
+                    "LOCAL_MODEL_EXECUTOR": args.executor,
+                }
+                with serve("src.main:app", free_port(), service_env) as url:
+                    results[backend] = asyncio.run(
+                        run_load(
+                            f"{url}/predict",
+                            PAYLOAD,
+                            args.concurrency,
+                            args.requests,
+                        )
+                    ).as_dict()
+
+    for name, result in results.items():
+        print(
+            f"{name:>6}: {result['requests_per_second']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms  "
+            f"errors {result['errors']}"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
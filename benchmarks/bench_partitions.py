@@ -0,0 +1,181 @@
+"""Time-range queries and retention on a heap and a partitioned log table.
+
+Two synthetic copies of the prediction logs are created, one plain table
+indexed on `id` only like the original schema and one partitioned by day
+with an index on `timestamp`, and filled with the same rows spread over
+`--days` days. Then it times counting the logs of one hour and deleting
+the logs older than `--retention-days`, with a DELETE on the plain table
+and by detaching concurrently and dropping the partitions of the other
+one, as `src.retention` does. The tables are dropped
+at the end.
+
+Usage: python -m benchmarks.bench_partitions --rows 5000000 --days 60
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Connection, create_engine, text
+
+from src.utils import settings
+
+HEAP_TABLE = "bench_logs_heap"
+PARTITIONED_TABLE = "bench_logs_partitioned"
+COLUMNS = """
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    mainroad varchar NOT NULL,
+    furnishingstatus varchar NOT NULL,
+    area double precision NOT NULL,
+    bedrooms integer NOT NULL,
+    prediction_response double precision,
+    timestamp timestamp NOT NULL,
+    inference_time double precision
+"""
+
+
+def fill(
+    connection: Connection, table: str, rows: int, start: datetime, days: int
+):
+    """Inserts the rows evenly spread from `start` over the days."""
+    step = days * 86400 / rows
+    connection.execute(
+        text(
+            f"INSERT INTO {table} (mainroad, furnishingstatus, area, "
+            "bedrooms, prediction_response, timestamp, inference_time) "
+            "SELECT 'yes', 'furnished', 1000 + i % 9000, 1 + i % 5, "
+            "i * 0.5, :start + make_interval(secs => i * :step), 0.01 "
+            "FROM generate_series(0, :rows - 1) AS i"
+        ),
+        {"start": start, "step": step, "rows": rows},
+    )
+
+
+def create_tables(connection: Connection, start: datetime, days: int):
+    connection.execute(
+        text(f"CREATE TABLE {HEAP_TABLE} ({COLUMNS}, PRIMARY KEY (id))")
+    )
+    connection.execute(text(f"CREATE INDEX ON {HEAP_TABLE} (id)"))
+    connection.execute(
+        text(
+            f"CREATE TABLE {PARTITIONED_TABLE} "
+            f"({COLUMNS}, PRIMARY KEY (id, timestamp)) "
+            "PARTITION BY RANGE (timestamp)"
+        )
+    )
+    connection.execute(
+        text(f"CREATE INDEX ON {PARTITIONED_TABLE} (timestamp)")
+    )
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).date()
+        connection.execute(
+            text(
+                f"CREATE TABLE {PARTITIONED_TABLE}_p{day:%Y%m%d} "
+                f"PARTITION OF {PARTITIONED_TABLE} FOR VALUES "
+                f"FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            )
+        )
+
+
+def drop_tables(connection: Connection):
+    for table in (HEAP_TABLE, PARTITIONED_TABLE):
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+
+def timed(connection: Connection, statement: str, **params) -> float:
+    """Runs the statement, returns the milliseconds it took."""
+    start_time = time.perf_counter()
+    connection.execute(text(statement), params)
+    return (time.perf_counter() - start_time) * 1000
+
+
+def best_of(repeat: int, function) -> float:
+    return min(function() for _ in range(repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--retention-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=args.days)
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.begin() as connection:
+        drop_tables(connection)
+        create_tables(connection, start, args.days)
+    with engine.begin() as connection:
+        load_ms = {}
+        for table in (HEAP_TABLE, PARTITIONED_TABLE):
+            start_time = time.perf_counter()
+            fill(connection, table, args.rows, start, args.days)
+            load_ms[table] = (time.perf_counter() - start_time) * 1000
+    with engine.connect().execution_options(
+        isolation_level="AUTOCOMMIT"
+    ) as connection:
+        for table in (HEAP_TABLE, PARTITIONED_TABLE):
+            connection.execute(text(f"VACUUM ANALYZE {table}"))
+
+    results = {"rows": args.rows, "days": args.days}
+    window_start = end - timedelta(days=1)
+    window = {"start": window_start, "end": window_start + timedelta(hours=1)}
+    cutoff = end - timedelta(days=args.retention_days)
+    try:
+        with engine.connect() as connection:
+            for table in (HEAP_TABLE, PARTITIONED_TABLE):
+                results[table] = {
+                    "load_ms": load_ms[table],
+                    "hour_query_ms": best_of(
+                        args.repeat,
+                        lambda table=table: timed(
+                            connection,
+                            f"SELECT count(*), avg(prediction_response) "
+                            f"FROM {table} "
+                            "WHERE timestamp >= :start AND timestamp < :end",
+                            **window,
+                        ),
+                    ),
+                }
+            connection.rollback()
+            with connection.begin():
+                results[HEAP_TABLE]["retention_ms"] = timed(
+                    connection,
+                    f"DELETE FROM {HEAP_TABLE} WHERE timestamp < :cutoff",
+                    cutoff=cutoff,
+                )
+        with engine.connect().execution_options(
+            isolation_level="AUTOCOMMIT"
+        ) as connection:
+            start_time = time.perf_counter()
+            for offset in range(args.days - args.retention_days):
+                day = (start + timedelta(days=offset)).date()
+                partition = f"{PARTITIONED_TABLE}_p{day:%Y%m%d}"
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {PARTITIONED_TABLE} "
+                        f"DETACH PARTITION {partition} CONCURRENTLY"
+                    )
+                )
+                connection.execute(text(f"DROP TABLE {partition}"))
+            results[PARTITIONED_TABLE]["retention_ms"] = (
+                time.perf_counter() - start_time
+            ) * 1000
+    finally:
+        with engine.begin() as connection:
+            drop_tables(connection)
+
+    for table in (HEAP_TABLE, PARTITIONED_TABLE):
+        result = results[table]
+        print(
+            f"{table:>22}: hour query {result['hour_query_ms']:9.2f} ms  "
+            f"retention {result['retention_ms']:10.2f} ms"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
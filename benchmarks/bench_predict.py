@@ -0,0 +1,71 @@
+"""Benchmark /predict throughput and latency against a local stub model.
+
+The stub model server is benchmarked directly as well, which gives the
+upper bound the service can reach with the given model latency.
+
+Usage: python -m benchmarks.bench_predict --concurrency 64 --requests 5000
+"""
+
+import argparse
+import asyncio
+import json
+
+from benchmarks.harness import PAYLOAD, free_port, serve
+from benchmarks.load import run_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    stub_env = {"STUB_LATENCY_MS": str(args.model_latency_ms)}
+    with serve(
+        "benchmarks.stub_model_server:app", free_port(), stub_env
+    ) as stub_url:
+        model_url = f"{stub_url}/invocations"
+        service_env = {"MODEL_PREDICTION_ENDPOINT": model_url}
+        with serve("src.main:app", free_port(), service_env) as service_url:
+            stub_payload = {
+                "inputs": [
+                    {
+                        "name": "area",
+                        "shape": [1],
+                        "datatype": "FP32",
+                        "data": [1200],
+                    }
+                ]
+            }
+            results = {
+                "stub_direct": asyncio.run(
+                    run_load(
+                        model_url,
+                        stub_payload,
+                        args.concurrency,
+                        args.requests,
+                    )
+                ).as_dict(),
+                "predict": asyncio.run(
+                    run_load(
+                        f"{service_url}/predict",
+                        PAYLOAD,
+                        args.concurrency,
+                        args.requests,
+                    )
+                ).as_dict(),
+            }
+
+    for name, result in results.items():
+        print(
+            f"{name:>12}: {result['requests_per_second']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.2f} ms  "
+            f"p99 {result['p99_ms']:7.2f} ms  "
+            f"errors {result['errors']}"
+        )
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmark of the validation of large batches, in rows per second.
+
+Compares validating each row with `HousingData`, as /predict/batch did,
+with the column by column validation of `ColumnarValidator`, for rows
+parsed from JSON, rows of a CSV file where every value is a string and
+typed NumPy columns. The `+ encode` timings include writing the KServe
+request body from the validated rows.
+
+Usage: python -m benchmarks.bench_validation --rows 10000
+"""
+
+import argparse
+import json
+import timeit
+
+import numpy as np
+from pydantic import ValidationError
+
+from benchmarks.harness import PAYLOAD
+from src.main import HousingData, housing_validator, kserve_encoder
+
+
+def validate_each(rows: list) -> list[HousingData]:
+    """Validation of the rows one by one, as done before."""
+    models = []
+    for row in rows:
+        try:
+            models.append(HousingData.model_validate(row))
+        except ValidationError:
+            pass
+    return models
+
+
+def rows_per_second(function, rows: int, min_time: float) -> float:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return rows / (min(timer.repeat(repeat=5, number=number)) / number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per repeat"
+    )
+    args = parser.parse_args()
+
+    count = args.rows
+    json_rows = [
+        {**PAYLOAD, "area": 1000 + index % 5000} for index in range(count)
+    ]
+    csv_rows = [
+        {name: str(value) for name, value in row.items()} for row in json_rows
+    ]
+    columns = {
+        name: np.array([row[name] for row in json_rows]) for name in PAYLOAD
+    }
+
+    def columnar_encode(rows):
+        _, batch, _ = housing_validator.validate_rows(rows)
+        return kserve_encoder.encode(batch)
+
+    cases = {
+        "json rows": (
+            lambda: validate_each(json_rows),
+            lambda: housing_validator.validate_rows(json_rows),
+        ),
+        "csv rows": (
+            lambda: validate_each(csv_rows),
+            lambda: housing_validator.validate_rows(csv_rows),
+        ),
+        "json rows + encode": (
+            lambda: kserve_encoder.encode(validate_each(json_rows)),
+            lambda: columnar_encode(json_rows),
+        ),
+        "numpy columns": (
+            None,
+            lambda: housing_validator.check(columns, count),
+        ),
+    }
+    results = {}
+    for name, (per_row, columnar) in cases.items():
+        columnar_rate = rows_per_second(columnar, count, args.min_time)
+        results[name] = {"columnar_rows_per_second": columnar_rate}
+        line = f"{name:>20}: columnar {columnar_rate:12.0f} rows/s"
+        if per_row is not None:
+            per_row_rate = rows_per_second(per_row, count, args.min_time)
+            results[name]["per_row_rows_per_second"] = per_row_rate
+            results[name]["speedup"] = columnar_rate / per_row_rate
+            line += (
+                f"  per row {per_row_rate:10.0f} rows/s"
+                f"  speedup {columnar_rate / per_row_rate:5.2f}x"
+            )
+        print(line)
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Helpers to run the service and the stub model server as subprocesses."""
+
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+PAYLOAD = {
+    "mainroad": "yes",
+    "guestroom": "no",
+    "basement": "yes",
+    "hotwaterheating": "no",
+    "airconditioning": "yes",
+    "prefarea": "no",
+    "furnishingstatus": "furnished",
+    "area": 1200,
+    "bedrooms": 3,
+    "bathrooms": 2,
+    "stories": 2,
+    "parking": 1,
+}
+
+
+def free_port() -> int:
+    """Finds a free local TCP port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 30.0):
+    """Polls the url until the server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server at {url} did not start in {timeout}s")
+
+
+def cpu_seconds(pid: int) -> float:
+    """CPU time used by the process and its children, from /proc (Linux).
+
+    The children are counted while they run, like the workers started
+    by `uvicorn --workers`.
+    """
+    tick = os.sysconf("SC_CLK_TCK")
+    stats = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as file:
+                # The fields after the command name, which may have spaces
+                fields = file.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        stats[int(entry)] = (int(fields[1]), int(fields[11]) + int(fields[12]))
+    total, parents = 0, {pid}
+    while parents:
+        total += sum(stats[parent][1] for parent in parents if parent in stats)
+        parents = {
+            child for child, (ppid, _) in stats.items() if ppid in parents
+        }
+    return total / tick
+
+
+@contextlib.contextmanager
+def serve_process(
+    app: str, port: int, env: dict | None = None, workers: int = 1
+):
+    """Runs `uvicorn <app>` on the port, gives its url and process."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            app,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        env={**os.environ, **(env or {})},
+    )
+    try:
+        wait_until_up(f"http://127.0.0.1:{port}/")
+        yield f"http://127.0.0.1:{port}", process
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+@contextlib.contextmanager
+def serve(app: str, port: int, env: dict | None = None, workers: int = 1):
+    """Runs `uvicorn <app>` on the port for the duration of the block."""
+    with serve_process(app, port, env, workers) as (url, _):
+        yield url
@@ -0,0 +1,231 @@
+"""HTTP load generators used by the benchmarks.
+
+`run_load` and `run_for` are closed loops: a fixed number of workers each
+send a request as soon as the previous one is answered. `run_fixed_rate`
+is an open loop sending requests on a schedule, whatever the latency of
+the server, which shows the latency at a given throughput.
+"""
+
+import asyncio
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import httpx
+
+# Metrics compared with a baseline, True when higher is better
+COMPARED_METRICS = {
+    "requests_per_second": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "cpu_ms_per_request": False,
+}
+
+
+@dataclass
+class LoadResult:
+    """Summary of a load run."""
+
+    requests: int
+    errors: int
+    duration: float
+    requests_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    # CPU time of the server per request, when measured
+    cpu_ms_per_request: float | None = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Returns the q-th percentile (0-100) of the values."""
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[
+        max(0, min(98, int(q) - 1))
+    ]
+
+
+def summarise(latencies: list[float], errors: int, duration: float):
+    """Builds a `LoadResult` from the latencies in seconds."""
+    ms = [latency * 1000 for latency in latencies]
+    total = len(latencies) + errors
+    return LoadResult(
+        requests=total,
+        errors=errors,
+        duration=duration,
+        requests_per_second=total / duration if duration else 0.0,
+        p50_ms=percentile(ms, 50),
+        p95_ms=percentile(ms, 95),
+        p99_ms=percentile(ms, 99),
+    )
+
+
+async def _closed_loop(
+    url: str,
+    payload,
+    concurrency: int,
+    next_request: Callable[[], bool],
+    transport: httpx.AsyncBaseTransport | None,
+) -> LoadResult:
+    """Sends POSTs from `concurrency` workers while `next_request()`."""
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        limits=limits, timeout=60, transport=transport
+    ) as client:
+
+        async def worker():
+            nonlocal errors
+            while next_request():
+                body = payload() if callable(payload) else payload
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=body)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - start
+
+    return summarise(latencies, errors, duration)
+
+
+async def run_load(
+    url: str,
+    payload,
+    concurrency: int,
+    total_requests: int,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> LoadResult:
+    """Sends `total_requests` POSTs from `concurrency` concurrent workers.
+
+    `payload` is either a JSON body or a callable returning one per request.
+    """
+    remaining = total_requests
+
+    def next_request() -> bool:
+        nonlocal remaining
+        remaining -= 1
+        return remaining >= 0
+
+    return await _closed_loop(
+        url, payload, concurrency, next_request, transport
+    )
+
+
+async def run_for(
+    url: str,
+    payload,
+    concurrency: int,
+    duration: float,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> LoadResult:
+    """Sends POSTs from `concurrency` concurrent workers for `duration`s."""
+    deadline = time.perf_counter() + duration
+    return await _closed_loop(
+        url,
+        payload,
+        concurrency,
+        lambda: time.perf_counter() < deadline,
+        transport,
+    )
+
+
+async def run_fixed_rate(
+    url: str,
+    payload,
+    rate: float,
+    duration: float,
+    max_connections: int = 1000,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> LoadResult:
+    """Sends `rate` POSTs per second for `duration` seconds.
+
+    The latency of each request is counted from the time it was scheduled
+    at, so that the time it waits for a connection when the server falls
+    behind is part of it.
+    """
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=max_connections)
+
+    async with httpx.AsyncClient(
+        limits=limits, timeout=60, transport=transport
+    ) as client:
+
+        async def send(scheduled: float):
+            nonlocal errors
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            body = payload() if callable(payload) else payload
+            try:
+                response = await client.post(url, json=body)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - scheduled)
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(send(start + i / rate) for i in range(int(rate * duration)))
+        )
+        elapsed = time.perf_counter() - start
+
+    return summarise(latencies, errors, elapsed)
+
+
+async def run_ramp(
+    url: str,
+    payload,
+    concurrencies: list[int],
+    stage_seconds: float,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> dict[int, LoadResult]:
+    """Runs `run_for` at each concurrency in turn, for `stage_seconds`."""
+    return {
+        concurrency: await run_for(
+            url, payload, concurrency, stage_seconds, transport
+        )
+        for concurrency in concurrencies
+    }
+
+
+def compare(
+    baseline: dict[str, dict], results: dict[str, dict], tolerance: float
+) -> tuple[list[str], list[str]]:
+    """Compares the results of runs with the ones of a baseline.
+
+    Both map a run name to its `LoadResult.as_dict()`. Returns a line per
+    metric of the runs found in both, and the lines of the metrics worse
+    than the baseline by more than `tolerance` percent.
+    """
+    lines, regressions = [], []
+    for run, result in results.items():
+        before = baseline.get(run)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            line = f"{run} {metric}: {old:.2f} -> {new:.2f} ({change:+.1f}%)"
+            lines.append(line)
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(line)
+    return lines, regressions
@@ -0,0 +1,170 @@
+"""Local stand-in for the KServe v2 regression model server.
+
+Run with `uvicorn benchmarks.stub_model_server:app --port 5001` and
+configure the behaviour with the STUB_* environment variables.
+"""
+
+import asyncio
+import json
+import os
+import random
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request, Response
+
+from src.encoder import NUMPY_DTYPES
+
+HEADER_LENGTH = "Inference-Header-Content-Length"
+MODEL_NAME = "house_price_prediction_prod"
+
+
+def read_binary_request(body: bytes, header_length: int) -> dict:
+    """Parses a request using the binary tensor data extension.
+
+    The binary inputs are decoded into their `data` like a model server
+    would, a size not matching the tensor shape is a bad request.
+    """
+    payload = json.loads(body[:header_length])
+    offset = header_length
+    for tensor in payload["inputs"]:
+        size = tensor.get("parameters", {}).get("binary_data_size")
+        if size is None:
+            continue
+        dtype = np.dtype(NUMPY_DTYPES[tensor["datatype"]])
+        if size != dtype.itemsize * int(np.prod(tensor["shape"])):
+            raise HTTPException(status_code=400, detail="Bad binary size")
+        tensor["data"] = np.frombuffer(
+            body, dtype=dtype, count=size // dtype.itemsize, offset=offset
+        )
+        offset += size
+    if offset != len(body):
+        raise HTTPException(status_code=400, detail="Bad binary body")
+    return payload
+
+
+def binary_outputs(response: dict) -> Response:
+    """Sends the outputs of the response as FP32 binary tensors."""
+    buffers = []
+    for output in response["outputs"]:
+        buffer = np.asarray(output.pop("data"), dtype="<f4").tobytes()
+        output["parameters"] = {"binary_data_size": len(buffer)}
+        buffers.append(buffer)
+    header = json.dumps(response).encode()
+    return Response(
+        header + b"".join(buffers),
+        media_type="application/octet-stream",
+        headers={HEADER_LENGTH: str(len(header))},
+    )
+
+
+class StubRegressionModel:
+    """Local model for `PREDICTION_BACKEND=local` answering like the stub.
+
+    Pickle an instance and point LOCAL_MODEL_PATH to it.
+    """
+
+    def __init__(self, price: float = 500000.0):
+        self.price = price
+
+    def predict(self, frame):
+        return np.full(len(frame["area"]), self.price)
+
+
+def create_app(
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    price: float = 500000.0,
+    latency_per_row_ms: float = 0.0,
+    max_concurrency: int = 0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 0.0,
+    seed: int | None = None,
+    model_version: str = "4",
+    version_in_response: bool = True,
+) -> FastAPI:
+    """Creates a stub model server with configurable latency and errors.
+
+    `max_concurrency` limits the requests processed in parallel, like the
+    fixed number of workers of a real model server (0 means unlimited).
+    Requests using the binary tensor data extension are supported, with
+    binary outputs when they are asked for.
+
+    Faults are injected at random: `error_rate` of the requests fail with
+    a 503 and `slow_rate` of them take `slow_ms` longer. A `seed` makes the
+    faults reproducible.
+
+    Without `version_in_response` the responses leave the model version
+    out, as some model servers do, it is only given by the v2 metadata
+    endpoint.
+    """
+    rng = random.Random(seed)
+    stub = FastAPI(title="Stub KServe v2 model server")
+    stub.state.requests = 0
+    stub.state.metadata_requests = 0
+    slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def infer(request: Request):
+        stub.state.requests += 1
+        if HEADER_LENGTH in request.headers:
+            payload = read_binary_request(
+                await request.body(), int(request.headers[HEADER_LENGTH])
+            )
+        else:
+            payload = await request.json()
+        rows = payload["inputs"][0]["shape"][0]
+        delay = latency_ms + rng.uniform(-jitter_ms, jitter_ms)
+        delay += latency_per_row_ms * rows
+        if slow_rate and rng.random() < slow_rate:
+            delay += slow_ms
+        if slots is not None:
+            async with slots:
+                await asyncio.sleep(max(delay, 0) / 1000)
+        elif delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and rng.random() < error_rate:
+            raise HTTPException(status_code=503, detail="Injected failure")
+        response = {
+            "model_name": MODEL_NAME,
+            "model_version": model_version,
+            "id": "stub",
+            "parameters": {"content_type": "np"},
+            "outputs": [
+                {
+                    "name": "output-1",
+                    "shape": [rows, 1],
+                    "datatype": "FP32",
+                    "parameters": {"content_type": "np"},
+                    "data": [price] * rows,
+                }
+            ],
+        }
+        if not version_in_response:
+            del response["model_version"]
+        if payload.get("parameters", {}).get("binary_data_output"):
+            return binary_outputs(response)
+        return response
+
+    async def metadata(model: str):
+        stub.state.metadata_requests += 1
+        return {
+            "name": model,
+            "versions": [model_version],
+            "platform": "mlflow",
+        }
+
+    stub.add_api_route("/invocations", infer, methods=["POST"])
+    stub.add_api_route("/v2/models/{model}/infer", infer, methods=["POST"])
+    stub.add_api_route("/v2/models/{model}", metadata, methods=["GET"])
+    return stub
+
+
+app = create_app(
+    latency_ms=float(os.getenv("STUB_LATENCY_MS", "0")),
+    jitter_ms=float(os.getenv("STUB_JITTER_MS", "0")),
+    error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+    latency_per_row_ms=float(os.getenv("STUB_LATENCY_PER_ROW_MS", "0")),
+    max_concurrency=int(os.getenv("STUB_MAX_CONCURRENCY", "0")),
+    slow_rate=float(os.getenv("STUB_SLOW_RATE", "0")),
+    slow_ms=float(os.getenv("STUB_SLOW_MS", "0")),
+)
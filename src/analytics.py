@@ -0,0 +1,391 @@
+"""Time-bucketed aggregates of the prediction logs, served from rollups.
+
+The logs are folded into per-minute rollup tables: `<table>_minutes` holds
+the counts, sums and extremes of each minute, `<table>_minute_histograms`
+the counts of the inference times and predicted prices in log-scale bins.
+A background task adds the logs after the last `id` processed, recorded
+in `rollup_watermarks`, so that the queries read at most one row per
+minute and bin of the range asked for, whatever the size of the logs.
+
+Logs younger than `settle_seconds` are left to the next update: the ids
+are given out when a log is inserted, so a log with a smaller id may still
+be committed after the ones processed. Rollups are not dropped with the
+expired partitions of the logs.
+
+Run once with `python -m src.analytics`, the service also runs it
+periodically while it is up.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from sqlalchemy import Connection, MetaData, Table, create_engine, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.data_models import PredictionLog
+from src.utils import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "prediction_logs"
+Bucket = Literal["minute", "hour", "day"]
+Metric = Literal["inference_time", "prediction"]
+
+# Column of the logs and smallest value of the bins of each distribution
+HISTOGRAMS = {
+    "inference_time": ("inference_time", 1e-4),
+    "prediction": ("prediction_response", 1.0),
+}
+# Bin i holds the values from `base * GROWTH**i` to `base * GROWTH**(i+1)`,
+# so that quantiles are within GROWTH of the value, values below the base
+# are in bin 0
+GROWTH = 1.05
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def utc_now() -> datetime:
+    """Current time in UTC, without time zone like the log timestamps."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def bin_expression(column: str, base: float) -> str:
+    return (
+        f"floor(ln(greatest({column}, {base!r}) / {base!r}) "
+        f"/ ln({GROWTH!r}))::int"
+    )
+
+
+def bin_value(index: int, base: float) -> float:
+    """Value at the middle of the bin, on the log scale."""
+    return base * GROWTH ** (index + 0.5)
+
+
+def log_table(name: str = PARENT_TABLE) -> Table:
+    """The table of the logs, or a table shaped like it."""
+    if name == PARENT_TABLE:
+        return PredictionLog.__table__
+    return PredictionLog.__table__.to_metadata(MetaData(), name=name)
+
+
+def lock_watermark(connection: Connection, table: str) -> int | None:
+    """Last id of the table rolled up, locked until the transaction ends.
+
+    Returns None when another process is updating the rollups.
+    """
+    last_id = connection.execute(
+        text(
+            "SELECT last_id FROM rollup_watermarks "
+            "WHERE source_table = :table FOR UPDATE SKIP LOCKED"
+        ),
+        {"table": table},
+    ).scalar()
+    if last_id is not None:
+        return last_id
+    exists = connection.execute(
+        text(
+            "SELECT count(*) FROM rollup_watermarks "
+            "WHERE source_table = :table"
+        ),
+        {"table": table},
+    ).scalar()
+    if exists:
+        return None
+    return connection.execute(
+        text(
+            "INSERT INTO rollup_watermarks (source_table, last_id) "
+            "VALUES (:table, 0) ON CONFLICT DO NOTHING RETURNING last_id"
+        ),
+        {"table": table},
+    ).scalar()
+
+
+def roll_up_batch(
+    connection: Connection,
+    cutoff: datetime,
+    batch_size: int,
+    table: str = PARENT_TABLE,
+) -> int | None:
+    """Adds the next logs after the watermark to the rollups.
+
+    Takes up to `batch_size` logs in `id` order, stopping before the first
+    log from `cutoff` on, and moves the watermark past them in the same
+    transaction. Returns the number of logs rolled up, None when another
+    process holds the watermark.
+    """
+    last_id = lock_watermark(connection, table)
+    if last_id is None:
+        return None
+    histogram_rows = " UNION ALL ".join(
+        f"SELECT date_trunc('minute', timestamp), '{metric}', "
+        f"{bin_expression(column, base)} FROM settled "
+        f"WHERE {column} IS NOT NULL"
+        for metric, (column, base) in HISTOGRAMS.items()
+    )
+    return connection.execute(
+        text(
+            f"""
+            WITH batch AS (
+                SELECT id, timestamp, cache_hit, inference_time,
+                    prediction_response
+                FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit
+            ), settled AS (
+                SELECT * FROM batch WHERE id < coalesce(
+                    (SELECT min(id) FROM batch WHERE timestamp >= :cutoff),
+                    9223372036854775807
+                )
+            ), minutes AS (
+                INSERT INTO {table}_minutes AS rollup (
+                    minute, requests, cache_hits, failures,
+                    inference_time_count, inference_time_sum,
+                    prediction_sum, prediction_min, prediction_max
+                )
+                SELECT date_trunc('minute', timestamp), count(*),
+                    count(*) FILTER (WHERE cache_hit),
+                    count(*) FILTER (WHERE prediction_response IS NULL),
+                    count(inference_time), coalesce(sum(inference_time), 0),
+                    coalesce(sum(prediction_response), 0),
+                    min(prediction_response), max(prediction_response)
+                FROM settled GROUP BY 1
+                ON CONFLICT (minute) DO UPDATE SET
+                    requests = rollup.requests + excluded.requests,
+                    cache_hits = rollup.cache_hits + excluded.cache_hits,
+                    failures = rollup.failures + excluded.failures,
+                    inference_time_count = rollup.inference_time_count
+                        + excluded.inference_time_count,
+                    inference_time_sum = rollup.inference_time_sum
+                        + excluded.inference_time_sum,
+                    prediction_sum = rollup.prediction_sum
+                        + excluded.prediction_sum,
+                    prediction_min = least(
+                        rollup.prediction_min, excluded.prediction_min
+                    ),
+                    prediction_max = greatest(
+                        rollup.prediction_max, excluded.prediction_max
+                    )
+            ), histograms AS (
+                INSERT INTO {table}_minute_histograms AS rollup (
+                    minute, metric, bin, count
+                )
+                SELECT minute, metric, bin, count(*)
+                FROM ({histogram_rows}) AS binned (minute, metric, bin)
+                GROUP BY 1, 2, 3
+                ON CONFLICT (minute, metric, bin) DO UPDATE SET
+                    count = rollup.count + excluded.count
+            )
+            UPDATE rollup_watermarks SET
+                last_id = coalesce((SELECT max(id) FROM settled), last_id),
+                updated_at = now() AT TIME ZONE 'utc'
+            WHERE source_table = :table
+            RETURNING (SELECT count(*) FROM settled)
+            """
+        ),
+        {
+            "last_id": last_id,
+            "limit": batch_size,
+            "cutoff": cutoff,
+            "table": table,
+        },
+    ).scalar()
+
+
+def roll_up(
+    connection: Connection,
+    cutoff: datetime,
+    batch_size: int = 50000,
+    table: str = PARENT_TABLE,
+) -> int:
+    """Rolls up all the logs before `cutoff`, one transaction per batch.
+
+    Returns the number of logs rolled up. Needs a connection not in a
+    transaction yet.
+    """
+    total = 0
+    while True:
+        with connection.begin():
+            count = roll_up_batch(connection, cutoff, batch_size, table)
+        total += count or 0
+        if count is None or count < batch_size:
+            return total
+
+
+def request_counts(
+    connection: Connection,
+    start: datetime,
+    end: datetime,
+    bucket: Bucket = "hour",
+    table: str = PARENT_TABLE,
+) -> list[dict]:
+    """Counts of the requests and mean inference time and prediction.
+
+    One item per bucket with logs from `start` to `end`, in time order.
+    """
+    rows = connection.execute(
+        text(
+            "SELECT date_trunc(:bucket, minute) AS bucket, "
+            "sum(requests) AS requests, sum(cache_hits) AS cache_hits, "
+            "sum(failures) AS failures, "
+            "sum(inference_time_sum) / nullif(sum(inference_time_count), 0) "
+            "AS mean_inference_time, "
+            "sum(prediction_sum) / nullif(sum(requests - failures), 0) "
+            "AS mean_prediction, "
+            "min(prediction_min) AS min_prediction, "
+            "max(prediction_max) AS max_prediction "
+            f"FROM {table}_minutes "
+            "WHERE minute >= :start AND minute < :end "
+            "GROUP BY 1 ORDER BY 1"
+        ),
+        {"bucket": bucket, "start": start, "end": end},
+    )
+    return [
+        {
+            **row._asdict(),
+            "requests": int(row.requests),
+            "cache_hits": int(row.cache_hits),
+            "failures": int(row.failures),
+        }
+        for row in rows
+    ]
+
+
+def quantiles(bins: list[tuple[int, int]], base: float) -> dict[str, float]:
+    """Quantiles of the values counted in the sorted bins."""
+    total = sum(count for _, count in bins)
+    result = {}
+    seen, position = 0, 0
+    for q in QUANTILES:
+        # Rank of the quantile among the values, from 1
+        rank = max(1, math.ceil(q * total))
+        while seen + bins[position][1] < rank:
+            seen += bins[position][1]
+            position += 1
+        result[f"p{q * 100:g}"] = bin_value(bins[position][0], base)
+    return result
+
+
+def distribution(
+    connection: Connection,
+    metric: Metric,
+    start: datetime,
+    end: datetime,
+    bucket: Bucket = "hour",
+    table: str = PARENT_TABLE,
+) -> list[dict]:
+    """Count and quantiles of the metric in each bucket with values."""
+    base = HISTOGRAMS[metric][1]
+    rows = connection.execute(
+        text(
+            "SELECT date_trunc(:bucket, minute), bin, sum(count) "
+            f"FROM {table}_minute_histograms "
+            "WHERE metric = :metric AND minute >= :start AND minute < :end "
+            "GROUP BY 1, 2 ORDER BY 1, 2"
+        ),
+        {"bucket": bucket, "metric": metric, "start": start, "end": end},
+    )
+    buckets: dict[datetime, list[tuple[int, int]]] = {}
+    for time_bucket, index, count in rows:
+        buckets.setdefault(time_bucket, []).append((index, int(count)))
+    return [
+        {
+            "bucket": time_bucket,
+            "count": sum(count for _, count in bins),
+            **quantiles(bins, base),
+        }
+        for time_bucket, bins in buckets.items()
+    ]
+
+
+def export_logs(
+    connection: Connection,
+    cursor: int = 0,
+    limit: int = 1000,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    table: str = PARENT_TABLE,
+) -> tuple[list[dict], int | None]:
+    """Logs after the `cursor` id, in id order, and the next cursor.
+
+    The next cursor is None once the last log has been read.
+    """
+    logs = log_table(table)
+    query = (
+        select(logs).where(logs.c.id > cursor).order_by(logs.c.id).limit(limit)
+    )
+    if start is not None:
+        query = query.where(logs.c.timestamp >= start)
+    if end is not None:
+        query = query.where(logs.c.timestamp < end)
+    rows = connection.execute(query).mappings().all()
+    next_cursor = rows[-1]["id"] if len(rows) == limit else None
+    return [dict(row) for row in rows], next_cursor
+
+
+class RollupUpdater:
+    """Rolls up the new logs every `interval` seconds in the background."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        interval: float = 60.0,
+        settle_seconds: float = 30.0,
+        batch_size: int = 50000,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Starts updating, must be called inside the event loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> int:
+        cutoff = utc_now() - timedelta(seconds=self.settle_seconds)
+        async with self.engine.connect() as connection:
+            return await connection.run_sync(roll_up, cutoff, self.batch_size)
+
+    async def _run(self):
+        while True:
+            try:
+                count = await self.run_once()
+                logger.debug("Rolled up %d prediction logs", count)
+            except Exception:
+                logger.exception("Rolling up the prediction logs failed")
+            await asyncio.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=settings.DB_LOG_ROLLUP_SETTLE_SECONDS,
+        help="age of the newest logs rolled up",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=settings.DB_LOG_ROLLUP_BATCH_SIZE
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL)
+    cutoff = utc_now() - timedelta(seconds=args.settle_seconds)
+    with engine.connect() as connection:
+        count = roll_up(connection, cutoff, args.batch_size)
+    print(f"rolled up {count} prediction logs")
+
+
+if __name__ == "__main__":
+    main()
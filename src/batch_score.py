@@ -0,0 +1,436 @@
+"""Offline scoring of large Parquet, CSV and JSONL files.
+
+The rows are read in chunks, validated like the API does and scored with
+concurrent model requests. The results are written in columns, `row`,
+`prediction` and `error`, to numbered part files of the output directory.
+A checkpoint written with each part lets an interrupted run resume after
+the last part written. Run with
+`python -m src.batch_score houses.parquet --output scores/`.
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
+import httpx
+
+from src.bulk import InvalidRow, score_stream
+from src.columnar import ColumnBatch
+from src.db_connection import get_engine
+from src.main import (
+    PROBE_HOUSE_DATA,
+    housing_validator,
+    kserve_encoder,
+    log_record,
+    score_batch,
+)
+from src.model_client import Predictions
+from src.resilience import create_upstream_policy
+from src.routing import Replica, ReplicaRouter, create_router
+from src.utils import model_settings
+
+# Formats of the input files, by extension
+INPUT_FORMATS = {
+    ".parquet": "parquet",
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+CHECKPOINT_FILE = "checkpoint.json"
+LOG_COLUMNS = (
+    "mainroad",
+    "guestroom",
+    "basement",
+    "hotwaterheating",
+    "airconditioning",
+    "prefarea",
+    "furnishingstatus",
+    "area",
+    "bedrooms",
+    "bathrooms",
+    "stories",
+    "parking",
+    "prediction_response",
+    "inference_time",
+    "model_name",
+    "model_version",
+)
+
+
+def import_pyarrow():
+    """Imports the optional `pyarrow` package used for Parquet files."""
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "Parquet files need the `pyarrow` package, "
+            "install it with `poetry install -E parquet`"
+        ) from e
+    return pyarrow
+
+
+def read_text_chunks(
+    path: Path, input_format: str, chunk_size: int, position: int = 0
+) -> Iterator[tuple[list[Any], int]]:
+    """Reads the rows of a CSV or JSONL file in chunks.
+
+    Reading starts at the byte offset `position`, a CSV header is always
+    read from the start of the file. Each chunk is yielded with the byte
+    offset of the row after it.
+    """
+    with open(path, "rb") as file:
+        header = None
+        if input_format == "csv":
+            [header] = csv.reader([file.readline().decode()])
+            header = [name.strip() for name in header]
+        if position:
+            file.seek(position)
+        chunk = []
+        for line in iter(file.readline, b""):
+            line = line.decode(errors="replace").rstrip("\r\n")
+            if not line.strip():
+                continue
+            if header is None:
+                try:
+                    chunk.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    chunk.append(
+                        InvalidRow("json_invalid", f"Invalid JSON: {e.msg}")
+                    )
+            else:
+                [values] = csv.reader([line])
+                if len(values) != len(header):
+                    chunk.append(
+                        InvalidRow(
+                            "csv_fields",
+                            f"Expected {len(header)} fields, "
+                            f"got {len(values)}",
+                        )
+                    )
+                else:
+                    chunk.append(dict(zip(header, values)))
+            if len(chunk) == chunk_size:
+                yield chunk, file.tell()
+                chunk = []
+        if chunk:
+            yield chunk, file.tell()
+
+
+def read_parquet_chunks(
+    path: Path, chunk_size: int, position: int = 0
+) -> Iterator[tuple[list[Any], int]]:
+    """Reads the rows of a Parquet file in chunks.
+
+    Reading starts at the row number `position`, skipping the row groups
+    before it. Each chunk is yielded with the number of the row after it.
+    """
+    pyarrow = import_pyarrow()
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    offset, row_groups = 0, []
+    for index in range(parquet_file.num_row_groups):
+        rows = parquet_file.metadata.row_group(index).num_rows
+        if offset + rows <= position and not row_groups:
+            offset += rows
+        else:
+            row_groups.append(index)
+    for batch in parquet_file.iter_batches(
+        batch_size=chunk_size, row_groups=row_groups
+    ):
+        if offset < position:
+            skipped = min(position - offset, batch.num_rows)
+            batch = batch.slice(skipped)
+            offset += skipped
+        if batch.num_rows:
+            offset += batch.num_rows
+            yield batch.to_pylist(), offset
+
+
+def read_chunks(
+    path: Path, chunk_size: int, position: int = 0
+) -> Iterator[tuple[list[Any], int]]:
+    """Reads the rows of the file in chunks, from the position."""
+    input_format = INPUT_FORMATS.get(path.suffix.lower())
+    if input_format is None:
+        raise ValueError(
+            f"Unsupported input file {path}, use one of "
+            + ", ".join(INPUT_FORMATS)
+        )
+    if input_format == "parquet":
+        return read_parquet_chunks(path, chunk_size, position)
+    return read_text_chunks(path, input_format, chunk_size, position)
+
+
+def write_part(
+    path: Path, columns: dict[str, list], output_format: str
+) -> Path:
+    """Writes the columns to the part file, replacing it at once."""
+    temporary = path.with_name(path.name + ".tmp")
+    if output_format == "parquet":
+        pyarrow = import_pyarrow()
+        pyarrow.parquet.write_table(pyarrow.table(columns), temporary)
+    else:
+        with open(temporary, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            writer.writerows(zip(*columns.values()))
+    os.replace(temporary, path)
+    return path
+
+
+def copy_logs(records: list[dict]):
+    """Writes the prediction logs with one COPY."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        [record[column] for column in LOG_COLUMNS] for record in records
+    )
+    buffer.seek(0)
+    connection = get_engine().raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY prediction_logs ({', '.join(LOG_COLUMNS)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class BatchScoringJob:
+    """Scores a file into the part files of the output directory.
+
+    The results are buffered in columns and written as a part file every
+    `part_rows` rows, together with the prediction logs when `log` is set
+    and then the checkpoint. After an interruption at most the rows of the
+    part being filled are scored again.
+    """
+
+    def __init__(
+        self,
+        input_path: Path,
+        output_dir: Path,
+        router: ReplicaRouter,
+        chunk_size: int = 256,
+        concurrency: int = 4,
+        part_rows: int = 100000,
+        output_format: str = "csv",
+        log: bool = False,
+    ):
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.router = router
+        self.policy = create_upstream_policy()
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.part_rows = part_rows
+        self.output_format = output_format
+        self.log = log
+        self.checkpoint_path = output_dir / CHECKPOINT_FILE
+        self.checkpoint = {
+            "input": str(input_path),
+            "input_size": input_path.stat().st_size,
+            "rows": 0,
+            "position": 0,
+            "parts": 0,
+        }
+
+    def load_checkpoint(self):
+        """Resumes from the checkpoint of the output directory, if any."""
+        if not self.checkpoint_path.exists():
+            return
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        if (checkpoint["input"], checkpoint["input_size"]) != (
+            self.checkpoint["input"],
+            self.checkpoint["input_size"],
+        ):
+            raise ValueError(
+                f"{self.checkpoint_path} is the checkpoint of another "
+                f"input file, {checkpoint['input']}"
+            )
+        self.checkpoint = checkpoint
+
+    def save_checkpoint(self):
+        temporary = self.checkpoint_path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.checkpoint))
+        os.replace(temporary, self.checkpoint_path)
+
+    async def score(self, rows: ColumnBatch) -> Predictions:
+        return await score_batch(self.router, rows, policy=self.policy)
+
+    async def run(self) -> dict:
+        """Scores the rows left and returns the stats of the run."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.load_checkpoint()
+        first_row = self.checkpoint["rows"]
+        position = first_position = self.checkpoint["position"]
+        # Row counts where a chunk ends, with the input position after it
+        boundaries = []
+        # Log records of the rows scored, by row number
+        scored = {}
+
+        async def items() -> AsyncIterator[Any]:
+            chunks = read_chunks(
+                self.input_path, self.chunk_size, first_position
+            )
+            read = 0
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    return
+                rows, end = chunk
+                read += len(rows)
+                boundaries.append((read, end))
+                for row in rows:
+                    yield row
+
+        async def on_scored(indices, rows, prices, inference_time):
+            if self.log:
+                for index, house_data, price in zip(indices, rows, prices):
+                    scored[first_row + index] = log_record(
+                        house_data,
+                        prediction_response=price,
+                        inference_time=inference_time,
+                        model_name=prices.model.name,
+                        model_version=prices.model.version,
+                    )
+
+        columns = {"row": [], "prediction": [], "error": []}
+        done = 0
+        async for result in score_stream(
+            items(),
+            housing_validator.validate_rows,
+            self.score,
+            chunk_size=self.chunk_size,
+            max_concurrency=self.concurrency,
+            on_scored=on_scored,
+        ):
+            if "stats" in result:
+                stats = result["stats"]
+                continue
+            columns["row"].append(first_row + result["index"])
+            columns["prediction"].append(result.get("prediction"))
+            error = result.get("error")
+            if "detail" in result:
+                error = json.dumps(result["detail"])
+            columns["error"].append(error)
+            done += 1
+            if boundaries[0][0] == done:
+                _, position = boundaries.pop(0)
+                if len(columns["row"]) >= self.part_rows:
+                    await self.write(columns, scored, position)
+                    columns = {"row": [], "prediction": [], "error": []}
+        if columns["row"]:
+            await self.write(columns, scored, position)
+        stats["first_row"] = first_row
+        return stats
+
+    async def write(self, columns: dict, scored: dict, position: int):
+        """Writes a part, its prediction logs and then the checkpoint."""
+        part = self.checkpoint["parts"]
+        path = self.output_dir / f"part-{part:05d}.{self.output_format}"
+        await asyncio.to_thread(write_part, path, columns, self.output_format)
+        if self.log:
+            records = [
+                scored.pop(row) for row in columns["row"] if row in scored
+            ]
+            if records:
+                await asyncio.to_thread(copy_logs, records)
+        self.checkpoint["rows"] += len(columns["row"])
+        self.checkpoint["position"] = position
+        self.checkpoint["parts"] += 1
+        self.save_checkpoint()
+        print(f"wrote {path}, {self.checkpoint['rows']} rows scored")
+
+
+def create_stub_router() -> ReplicaRouter:
+    """Router to the stub model server of the benchmarks, run in-process."""
+    from benchmarks.stub_model_server import create_app
+
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_app()),
+        headers={"Content-Type": "application/json"},
+    )
+    return ReplicaRouter([Replica("http://stub/invocations", client)])
+
+
+async def score_file(args: argparse.Namespace) -> dict:
+    probe_payload = kserve_encoder.encode([PROBE_HOUSE_DATA])
+    if args.dry_run:
+        router = create_stub_router()
+    else:
+        router = create_router(probe_payload=probe_payload)
+    router.start()
+    try:
+        job = BatchScoringJob(
+            Path(args.input),
+            Path(args.output),
+            router,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+            part_rows=args.part_rows,
+            output_format=args.output_format,
+            log=args.log and not args.dry_run,
+        )
+        return await job.run()
+    finally:
+        await router.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input", help="Parquet, CSV or JSONL file to score")
+    parser.add_argument(
+        "--output",
+        required=True,
+        help="directory of the part files, resumed from its checkpoint",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=model_settings.MODEL_BULK_CHUNK_SIZE,
+        help="rows scored with each model request",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=model_settings.MODEL_BULK_MAX_CONCURRENCY,
+        help="model requests in flight",
+    )
+    parser.add_argument(
+        "--part-rows",
+        type=int,
+        default=100000,
+        help="rows of each part file, a checkpoint is written with each",
+    )
+    parser.add_argument(
+        "--output-format", choices=["csv", "parquet"], default="csv"
+    )
+    parser.add_argument(
+        "--log",
+        action="store_true",
+        help="write the predictions to prediction_logs with COPY",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="score with the stub model server in-process, without logging",
+    )
+    args = parser.parse_args()
+
+    stats = asyncio.run(score_file(args))
+    print(
+        f"scored {stats['rows']} rows from row {stats['first_row']} in "
+        f"{stats['seconds']:.1f} s, {stats['rows_per_second']:.0f} rows/s, "
+        f"{stats['errors']} errors"
+    )
+
+
+if __name__ == "__main__":
+    main()
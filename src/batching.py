@@ -0,0 +1,147 @@
+"""Dynamic micro-batching of single-row predictions."""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from src.metrics import Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into multi-row requests.
+
+    Rows are collected until `max_batch_size` rows are queued or the first
+    queued row has waited `max_wait_ms`, whichever comes first. The batch
+    is then scored with one call to `score`, which receives the rows and
+    returns one prediction per row. Each caller gets its own prediction
+    together with its share of the batch round trip time and the `model`
+    of the predictions, if they have one.
+
+    At most `max_concurrent_batches` batches are scored at a time, while
+    they are in flight new rows keep queueing up for the next batch.
+    """
+
+    def __init__(
+        self,
+        score: Callable[[list[Any]], Awaitable[list[float]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_concurrent_batches: int = 4,
+    ):
+        self.score = score
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._slots = asyncio.Semaphore(max_concurrent_batches)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_time = Histogram(WAIT_TIME_BUCKETS)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._collector: asyncio.Task | None = None
+        # Batch being filled by the collector and whether it holds a slot
+        self._collecting: list = []
+        self._slot_held = False
+        self._dispatches: set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of rows waiting to be put in a batch."""
+        return self._queue.qsize()
+
+    def start(self):
+        """Starts collecting batches, must be called inside the event loop."""
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        """Stops collecting and scores the rows that are still queued."""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        # The rows of the batch being filled are scored first, with the
+        # slot the collector acquired for it
+        batch, self._collecting = self._collecting, []
+        while batch or not self._queue.empty():
+            if not self._slot_held:
+                await self._slots.acquire()
+            self._slot_held = False
+            self._dispatch(self._take_available(batch))
+            batch = []
+        if self._slot_held:
+            self._slots.release()
+            self._slot_held = False
+        if self._dispatches:
+            await asyncio.gather(*self._dispatches)
+
+    async def submit(self, row) -> tuple[float, float, Any]:
+        """Queues the row and waits for its prediction, time and model."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> dict:
+        """Current queue depth, batch size and wait time distributions."""
+        return {
+            "queue_depth": self.queue_depth,
+            "batch_size": self.batch_size.snapshot(),
+            "wait_time_seconds": self.wait_time.snapshot(),
+        }
+
+    def _take_available(self, batch: list) -> list:
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _collect(self):
+        while True:
+            await self._slots.acquire()
+            self._slot_held = True
+            batch = self._collecting = [await self._queue.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            self._collecting = []
+            self._slot_held = False
+            self._dispatch(self._take_available(batch))
+
+    def _dispatch(self, batch: list):
+        # Score batches concurrently so that a slow model call does not
+        # hold back the collection of the next batch
+        task = asyncio.create_task(self._score_batch(batch))
+        self._dispatches.add(task)
+        task.add_done_callback(self._release)
+
+    def _release(self, task: asyncio.Task):
+        self._dispatches.discard(task)
+        self._slots.release()
+
+    async def _score_batch(self, batch: list):
+        start_time = time.perf_counter()
+        for _, _, queued_at in batch:
+            self.wait_time.observe(start_time - queued_at)
+        self.batch_size.observe(len(batch))
+        try:
+            predictions = await self.score([row for row, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        # Share the round trip time across the rows of the batch
+        inference_time = (time.perf_counter() - start_time) / len(batch)
+        model = getattr(predictions, "model", None)
+        for (_, future, _), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result((prediction, inference_time, model))
@@ -0,0 +1,224 @@
+"""Streaming scoring of large NDJSON and CSV files.
+
+The rows of the uploaded file are read as they arrive, validated and
+scored in chunks of a fixed size, with a bounded number of chunks in
+flight to the model. The results are streamed back as NDJSON in the order
+of the rows, so the memory used does not grow with the size of the file.
+"""
+
+import asyncio
+import csv
+import json
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Sized,
+)
+
+import httpx
+from starlette.responses import StreamingResponse
+
+from src.model_client import ModelResponseError
+from src.resilience import CircuitOpenError
+
+# Media types of the uploads, by the format of their rows
+BULK_FORMATS = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+    "text/csv": "csv",
+}
+
+
+class InvalidRow:
+    """Row of the file that could not be parsed."""
+
+    def __init__(self, error_type: str, message: str):
+        self.detail = [{"type": error_type, "loc": [], "msg": message}]
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Splits the chunks of the body into lines, without the line ends."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode(errors="replace").rstrip("\r")
+    if buffer:
+        yield buffer.decode(errors="replace").rstrip("\r")
+
+
+async def read_ndjson(lines: AsyncIterable[str]) -> AsyncIterator[Any]:
+    """Parses one JSON value per line, blank lines are skipped."""
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield InvalidRow("json_invalid", f"Invalid JSON: {e.msg}")
+
+
+async def read_csv(lines: AsyncIterable[str]) -> AsyncIterator[Any]:
+    """Parses the rows of a CSV file with a header, one row per line.
+
+    Each row is a dict of the values by column name.
+    """
+    header = None
+    async for line in lines:
+        if not line.strip():
+            continue
+        [values] = csv.reader([line])
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield InvalidRow(
+                "csv_fields",
+                f"Expected {len(header)} fields, got {len(values)}",
+            )
+        else:
+            yield dict(zip(header, values))
+
+
+async def score_stream(
+    items: AsyncIterable[Any],
+    validate: Callable[[list[Any]], tuple[list[int], Sized, list[dict]]],
+    score: Callable[[Any], Awaitable[list[float]]],
+    chunk_size: int = 256,
+    max_concurrency: int = 4,
+    on_scored: (
+        Callable[[list[int], Any, list[float], float], Awaitable[None]] | None
+    ) = None,
+) -> AsyncIterator[dict]:
+    """Validates and scores the items, yielding one result per item.
+
+    Each `chunk_size` items are validated with one call to `validate`,
+    returning the positions of the valid items in the chunk, the rows to
+    score and the errors of the other items with their position as
+    `index`. The rows of each chunk are scored with one call to `score`,
+    with at most `max_concurrency` calls in flight. The results are
+    yielded in the order of the items, with the `index` of the item: its
+    `prediction`, the validation errors as `detail`, or the model `error`
+    of its chunk. `on_scored` receives the indices of the rows scored, the
+    rows, their prices and their share of the round trip time. The last
+    result holds the `stats` of the run.
+    """
+    start_time = time.perf_counter()
+    stats = {"rows": 0, "predictions": 0, "errors": 0, "chunks": 0}
+    # Chunks in flight, with the invalid rows and indices of the chunk
+    pending: deque[tuple[list[dict], list[int], asyncio.Task | None]]
+    pending = deque()
+
+    async def score_chunk(
+        indices: list[int], rows: Any
+    ) -> tuple[list[float], float]:
+        chunk_start = time.perf_counter()
+        prices = await score(rows)
+        inference_time = (time.perf_counter() - chunk_start) / len(rows)
+        if on_scored is not None:
+            await on_scored(indices, rows, prices, inference_time)
+        return prices, inference_time
+
+    def submit(chunk: list[tuple[int, Any]]):
+        invalid, item_indices, items = [], [], []
+        for index, item in chunk:
+            if isinstance(item, InvalidRow):
+                invalid.append({"index": index, "detail": item.detail})
+            else:
+                item_indices.append(index)
+                items.append(item)
+        indices, rows = [], []
+        if items:
+            positions, rows, errors = validate(items)
+            indices = [item_indices[position] for position in positions]
+            invalid += [
+                {
+                    "index": item_indices[error["index"]],
+                    "detail": error["detail"],
+                }
+                for error in errors
+            ]
+        task = None
+        if rows:
+            task = asyncio.create_task(score_chunk(indices, rows))
+        pending.append((invalid, indices, task))
+        stats["chunks"] += 1
+
+    async def collect() -> list[dict]:
+        invalid, indices, task = pending.popleft()
+        results = []
+        if task is not None:
+            try:
+                prices, _ = await task
+                results = [
+                    {"index": index, "prediction": price}
+                    for index, price in zip(indices, prices)
+                ]
+            except (
+                httpx.HTTPError,
+                ModelResponseError,
+                CircuitOpenError,
+            ) as e:
+                message = f"Regression model prediction service error: {e}"
+                results = [
+                    {"index": index, "error": message} for index in indices
+                ]
+        stats["predictions"] += sum("prediction" in r for r in results)
+        stats["errors"] += len(invalid) + sum("error" in r for r in results)
+        return sorted(invalid + results, key=lambda result: result["index"])
+
+    try:
+        chunk = []
+        async for item in items:
+            chunk.append((stats["rows"], item))
+            stats["rows"] += 1
+            if len(chunk) == chunk_size:
+                submit(chunk)
+                chunk = []
+                # Wait for the oldest chunk before reading more rows
+                if len(pending) >= max_concurrency:
+                    for result in await collect():
+                        yield result
+        if chunk:
+            submit(chunk)
+        while pending:
+            for result in await collect():
+                yield result
+    finally:
+        # The client went away, stop scoring its rows
+        for _, _, task in pending:
+            if task is not None:
+                task.cancel()
+
+    duration = time.perf_counter() - start_time
+    stats["seconds"] = duration
+    stats["rows_per_second"] = stats["rows"] / duration if duration else 0.0
+    yield {"stats": stats}
+
+
+async def ndjson_lines(results: AsyncIterable[dict]) -> AsyncIterator[bytes]:
+    """Encodes the results as NDJSON."""
+    async for result in results:
+        yield json.dumps(result).encode() + b"\n"
+
+
+class BulkStreamingResponse(StreamingResponse):
+    """Streams the results while the request body is still being read.
+
+    Starlette watches for the client disconnecting by reading the request
+    messages, which would take the body away from the endpoint. Instead
+    the disconnection is noticed when reading the body or sending results.
+    """
+
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
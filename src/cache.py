@@ -0,0 +1,171 @@
+"""Cache of the model predictions keyed on the normalised input features."""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from src.utils import CacheSettings, cache_settings
+
+
+class CacheBackend(Protocol):
+    """Storage used by the `PredictionCache`."""
+
+    async def get(self, key: str) -> float | None: ...
+
+    async def set(self, key: str, value: float, ttl: float): ...
+
+    async def clear(self): ...
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a time to live for each entry."""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def get(self, key: str) -> float | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: float, ttl: float):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache shared between replicas, stored in Redis.
+
+    `client` is a `redis.asyncio.Redis` client or any object with the same
+    `get` and `set` coroutines. Entries are never deleted explicitly, a
+    change of model version moves to new keys and Redis expires the old
+    ones after their time to live.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        """Creates the backend from a `redis://` url."""
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError(
+                "The redis cache backend needs the `redis` package, "
+                "install it with `poetry install -E redis`"
+            ) from e
+        return cls(redis.from_url(url))
+
+    async def get(self, key: str) -> float | None:
+        value = await self.client.get(key)
+        return None if value is None else float(value)
+
+    async def set(self, key: str, value: float, ttl: float):
+        await self.client.set(key, repr(value), px=int(ttl * 1000))
+
+    async def clear(self):
+        pass
+
+
+def feature_key(features: dict) -> str:
+    """Canonical key of the input features.
+
+    Categories are upper-cased the same way they are sent to the model and
+    numbers are compared as floats, so `yes`/`Yes` or `1200`/`1200.0`
+    share a key.
+    """
+    return json.dumps(
+        [
+            value.upper() if isinstance(value, str) else float(value)
+            for _, value in sorted(features.items())
+        ],
+        separators=(",", ":"),
+    )
+
+
+class PredictionCache:
+    """Predictions cached per input features and served model version.
+
+    The served model version is taken from the model responses, when it
+    changes the cached predictions of the previous version are no longer
+    used.
+    """
+
+    def __init__(
+        self, backend: CacheBackend, ttl: float, prefix: str = "prediction"
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.model_name: str | None = None
+        self.model_version: str | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, features: dict) -> str:
+        return f"{self.prefix}:{self.model_version}:{feature_key(features)}"
+
+    async def get(self, features: dict) -> float | None:
+        """Returns the cached prediction for the features, if any."""
+        value = await self.backend.get(self.key(features))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, features: dict, prediction: float):
+        """Caches the prediction for the features."""
+        await self.backend.set(self.key(features), prediction, self.ttl)
+
+    async def observe_model_version(
+        self, model_version: str | None, model_name: str | None = None
+    ):
+        """Invalidates the cache if the served model version has changed."""
+        if model_version is None or model_version == self.model_version:
+            return
+        self.model_name = model_name
+        self.model_version = model_version
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        """Hit and miss counts and the hit ratio."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "model_name": self.model_name,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_cache(
+    config: CacheSettings = cache_settings,
+) -> PredictionCache | None:
+    """Creates the prediction cache configured in the settings, if enabled."""
+    if not config.CACHE_ENABLED:
+        return None
+    if config.CACHE_BACKEND == "redis":
+        backend = RedisCacheBackend.from_url(config.CACHE_REDIS_URL)
+    else:
+        backend = MemoryCacheBackend(max_size=config.CACHE_MAX_SIZE)
+    return PredictionCache(backend, ttl=config.CACHE_TTL_SECONDS)
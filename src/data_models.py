@@ -1,8 +1,18 @@
 """Data models for storing the requests."""
 
-from datetime import datetime, timezone
-
-from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Identity,
+    Integer,
+    String,
+    false,
+    text,
+)
 from sqlalchemy.orm import declarative_base
 
 # Base class for data models to inherit from
@@ -13,8 +23,10 @@ class PredictionLog(Base):
     """Data mapping for database table."""
 
     __tablename__ = "prediction_logs"
+    # One partition per day of logs, see src/retention.py
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(BigInteger, Identity(), primary_key=True)
     # Categorical fields
     mainroad = Column(String, nullable=False)
     guestroom = Column(String, nullable=False)
@@ -31,7 +43,73 @@ class PredictionLog(Base):
     parking = Column(Integer, nullable=False)
 
     prediction_response = Column(Float, nullable=True)  # Prediction result
+    # Log timestamp in UTC, part of the key as the partitioning column
     timestamp = Column(
-        DateTime, default=datetime.now(timezone.utc)
-    )  # Log timestamp
+        DateTime,
+        primary_key=True,
+        index=True,
+        server_default=text("(now() AT TIME ZONE 'utc')"),
+    )
     inference_time = Column(Float, nullable=True)  # Inference time
+    # Prediction served from the cache
+    cache_hit = Column(Boolean, nullable=False, server_default=false())
+    # Model that made the prediction, as reported by the model server
+    model_name = Column(String, nullable=True, index=True)
+    model_version = Column(String, nullable=True, index=True)
+
+
+class PredictionLogMinute(Base):
+    """Rollup of the prediction logs of each minute, see src/analytics.py."""
+
+    __tablename__ = "prediction_logs_minutes"
+
+    minute = Column(DateTime, primary_key=True)
+    requests = Column(BigInteger, nullable=False)
+    cache_hits = Column(BigInteger, nullable=False)
+    # Logs without a prediction
+    failures = Column(BigInteger, nullable=False)
+    inference_time_count = Column(BigInteger, nullable=False)
+    inference_time_sum = Column(Float, nullable=False)
+    prediction_sum = Column(Float, nullable=False)
+    prediction_min = Column(Float, nullable=True)
+    prediction_max = Column(Float, nullable=True)
+
+
+class PredictionLogMinuteHistogram(Base):
+    """Counts of the values of a metric of the logs of each minute.
+
+    The values are counted in log-scale bins, see src/analytics.py.
+    """
+
+    __tablename__ = "prediction_logs_minute_histograms"
+
+    minute = Column(DateTime, primary_key=True)
+    # "inference_time" or "prediction"
+    metric = Column(String, primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False)
+
+
+class RollupWatermark(Base):
+    """Last id of a log table added to its rollups."""
+
+    __tablename__ = "rollup_watermarks"
+
+    source_table = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class DriftSnapshot(Base):
+    """Profile of the input features of a window, see src/drift.py."""
+
+    __tablename__ = "drift_snapshots"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=False, index=True)
+    count = Column(BigInteger, nullable=False)
+    # Sketches and counts of the features, `FeatureProfile.to_dict`
+    profile = Column(JSON, nullable=False)
+    # Drift scores from the reference, null without reference
+    scores = Column(JSON, nullable=True)
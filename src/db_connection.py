@@ -1,22 +1,68 @@
-"""Database connection for storing the user requests."""
+"""Database connection for storing the user requests.
 
-from sqlalchemy import create_engine
+The engines are created on first use, in the lifespan of the app, rather
+than when this module is imported. Importing the app stays cheap and the
+workers forked from a preloaded app each open their own connections.
+"""
+
+from functools import cache
+
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import sessionmaker
 
 from src.utils import settings
 
-# Create the SQLAlchemy engine
-database_url = settings.DATABASE_URL
-engine = create_engine(database_url)
 
-# Create a sessionmaker to manage sessions/connections to the db
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def pool_options() -> dict:
+    """Options of the connection pool of both engines."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+@cache
+def get_engine() -> Engine:
+    """The SQLAlchemy engine, created on the first call."""
+    return create_engine(settings.DATABASE_URL, **pool_options())
+
+
+@cache
+def get_async_engine() -> AsyncEngine:
+    """The async engine for the async endpoints and background tasks, so
+    that the database I/O does not use up threadpool workers."""
+    return create_async_engine(settings.ASYNC_DATABASE_URL, **pool_options())
+
+
+# Sessionmakers to manage sessions/connections to the db, bound to the
+# engines when a session is opened
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+
+def async_session():
+    """Opens an async session on the async engine."""
+    return AsyncSessionLocal(bind=get_async_engine())
 
 
 def get_db():
     """FastAPI endpoint dependency to get the session."""
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """FastAPI endpoint dependency to get an async session."""
+    async with async_session() as db:
+        yield db
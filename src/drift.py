@@ -0,0 +1,611 @@
+"""Streaming profile of the input features, compared with a reference.
+
+Each validated input is added to a `FeatureProfile`: a quantile sketch
+per numeric feature and a counter of the values of each categorical one.
+Adding an input takes one logarithm per numeric feature and one dict
+update per feature, and the memory is bounded by the number of bins of
+the sketches, whatever the traffic.
+
+The `DriftMonitor` scores the profile of the inputs since the last
+snapshot against a reference profile, saved as JSON, with the population
+stability index (PSI) of each feature and the Kolmogorov-Smirnov (KS)
+statistic of the numeric ones. The `DriftSnapshotter` stores the profile
+and scores in `drift_snapshots` every interval and starts a new window.
+Each worker process profiles the inputs it validates, the profiles of the
+snapshots can be merged.
+
+Build a reference profile from the logs of a period or a CSV file with
+`python -m src.drift`.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import math
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Iterable, Mapping
+
+import numpy as np
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.analytics import utc_now
+from src.data_models import DriftSnapshot, PredictionLog
+from src.utils import drift_settings, settings
+
+logger = logging.getLogger(__name__)
+
+# Fraction given to the bins without values, so that the PSI is finite
+MIN_FRACTION = 1e-4
+# Number of bins of the PSI of the numeric features, at most, split at
+# the quantiles of the reference
+PSI_BINS = 10
+
+# Bins of a sketch in the order of their values: the negative values from
+# the largest magnitude, the zeros, then the positive values
+Bin = tuple[int, int]
+ZERO_BIN: Bin = (0, 0)
+
+
+class QuantileSketch:
+    """Quantiles of a stream of numbers within a relative accuracy.
+
+    The values are counted in log-spaced bins, bin `k` holding the
+    magnitudes from `gamma**(k - 1)` to `gamma**k`, with
+    `gamma = (1 + accuracy) / (1 - accuracy)`, so that each quantile is
+    within `relative_accuracy` of the exact one (DDSketch). Magnitudes
+    below `min_value` count as zeros. Beyond `max_bins` bins, the ones of
+    the smallest magnitudes are merged.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.01,
+        max_bins: int = 2048,
+        min_value: float = 1e-9,
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        self.positive: dict[int, int] = {}
+        self.negative: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value > self.min_value:
+            self._add_to(self.positive, self._key(value), 1)
+        elif value < -self.min_value:
+            self._add_to(self.negative, self._key(-value), 1)
+        else:
+            self.zeros += 1
+
+    def add_many(self, values: np.ndarray):
+        """Adds an array of values, the same as adding them one by one."""
+        values = np.asarray(values, dtype=float)
+        if not len(values):
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        positive = values[values > self.min_value]
+        negative = -values[values < -self.min_value]
+        self.zeros += len(values) - len(positive) - len(negative)
+        for bins, magnitudes in (
+            (self.positive, positive),
+            (self.negative, negative),
+        ):
+            keys = np.ceil(np.log(magnitudes) * self._multiplier)
+            for key, count in zip(
+                *np.unique(keys.astype(int), return_counts=True)
+            ):
+                self._add_to(bins, int(key), int(count))
+
+    def _key(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) * self._multiplier)
+
+    def _add_to(self, bins: dict[int, int], key: int, count: int):
+        if key in bins:
+            bins[key] += count
+            return
+        bins[key] = count
+        if len(bins) > self.max_bins:
+            # Merge the two bins of the smallest magnitudes
+            smallest, second = sorted(bins)[:2]
+            bins[second] += bins.pop(smallest)
+
+    def _value(self, key: int) -> float:
+        """Value in the bin, within the relative accuracy of all of them."""
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def bins(self) -> dict[Bin, int]:
+        """Counts of the values in each bin, in the order of the values."""
+        bins = {
+            (-1, -key): self.negative[key]
+            for key in sorted(self.negative, reverse=True)
+        }
+        if self.zeros:
+            bins[ZERO_BIN] = self.zeros
+        for key in sorted(self.positive):
+            bins[(1, key)] = self.positive[key]
+        return bins
+
+    def bin_value(self, bin: Bin) -> float:
+        sign, key = bin
+        return sign * self._value(sign * key) if sign else 0.0
+
+    def quantile(self, q: float) -> float | None:
+        """Value at the quantile `q`, from 0 to 1, None without values."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bin, count in self.bins().items():
+            seen += count
+            if seen > rank:
+                return min(max(self.bin_value(bin), self.min), self.max)
+        return self.max
+
+    def merge(self, other: "QuantileSketch"):
+        """Adds the values of a sketch with the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Sketches of different accuracies")
+        for bins, other_bins in (
+            (self.positive, other.positive),
+            (self.negative, other.negative),
+        ):
+            for key, count in other_bins.items():
+                self._add_to(bins, key, count)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zeros": self.zeros,
+            "positive": {str(key): c for key, c in self.positive.items()},
+            "negative": {str(key): c for key, c in self.negative.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.zeros = data["zeros"]
+        sketch.positive = {int(k): c for k, c in data["positive"].items()}
+        sketch.negative = {int(k): c for k, c in data["negative"].items()}
+        return sketch
+
+
+def feature_kinds(datatypes: Mapping[str, str]) -> tuple[list[str], list[str]]:
+    """Numeric and categorical features of the KServe datatypes of the
+    features, the categorical ones being sent as BYTES."""
+    numeric = [name for name, type in datatypes.items() if type != "BYTES"]
+    categorical = [name for name in datatypes if name not in numeric]
+    return numeric, categorical
+
+
+def psi(reference: list[float], current: list[float]) -> float:
+    """Population stability index of the fractions of the same bins."""
+    total = 0.0
+    for expected, actual in zip(reference, current):
+        expected = max(expected, MIN_FRACTION)
+        actual = max(actual, MIN_FRACTION)
+        total += (actual - expected) * math.log(actual / expected)
+    return total
+
+
+def fractions(counts: Iterable[int], total: int) -> list[float]:
+    return [count / total for count in counts]
+
+
+def numeric_drift(
+    reference: QuantileSketch, current: QuantileSketch
+) -> dict[str, float]:
+    """PSI on bins split at the quantiles of the reference and KS.
+
+    Both are computed on the bins of the sketches, which must have the
+    same accuracy, so the values are compared within that accuracy.
+    """
+    if reference.relative_accuracy != current.relative_accuracy:
+        raise ValueError("Sketches of different accuracies")
+    reference_bins = reference.bins()
+    current_bins = current.bins()
+    # KS: largest gap between the cumulative fractions at each bin
+    ks = 0.0
+    seen_reference = seen_current = 0
+    for bin in sorted(reference_bins.keys() | current_bins.keys()):
+        seen_reference += reference_bins.get(bin, 0)
+        seen_current += current_bins.get(bin, 0)
+        ks = max(
+            ks,
+            abs(
+                seen_reference / reference.count - seen_current / current.count
+            ),
+        )
+    # PSI: groups of bins holding about 1 / PSI_BINS of the reference
+    bins = list(reference_bins)
+    cumulative = list(accumulate(reference_bins.values()))
+    splits = sorted(
+        {
+            bins[bisect_right(cumulative, reference.count * i / PSI_BINS)]
+            for i in range(1, PSI_BINS)
+        }
+        - {bins[0]}
+    )
+    reference_groups = [0] * (len(splits) + 1)
+    current_groups = [0] * (len(splits) + 1)
+    for groups, sketch_bins in (
+        (reference_groups, reference_bins),
+        (current_groups, current_bins),
+    ):
+        for bin, count in sketch_bins.items():
+            groups[bisect_right(splits, bin)] += count
+    return {
+        "psi": psi(
+            fractions(reference_groups, reference.count),
+            fractions(current_groups, current.count),
+        ),
+        "ks": ks,
+    }
+
+
+def categorical_drift(
+    reference: Counter, current: Counter
+) -> dict[str, float]:
+    """PSI of the fractions of each value."""
+    values = sorted(reference.keys() | current.keys())
+    return {
+        "psi": psi(
+            fractions(
+                (reference[value] for value in values), reference.total()
+            ),
+            fractions((current[value] for value in values), current.total()),
+        )
+    }
+
+
+class FeatureProfile:
+    """Sketches of the numeric features and counts of the categorical ones.
+
+    The categorical values are lower-cased, "Yes" and "yes" are the same.
+    """
+
+    def __init__(
+        self,
+        numeric: Iterable[str],
+        categorical: Iterable[str],
+        relative_accuracy: float = 0.01,
+    ):
+        self.sketches = {
+            name: QuantileSketch(relative_accuracy) for name in numeric
+        }
+        self.categories = {name: Counter() for name in categorical}
+        self.count = 0
+
+    def observe(self, features: Mapping[str, Any]):
+        """Adds the features of one input."""
+        self.count += 1
+        for name, sketch in self.sketches.items():
+            sketch.add(features[name])
+        for name, counts in self.categories.items():
+            counts[features[name].lower()] += 1
+
+    def observe_columns(self, columns: Mapping[str, np.ndarray]):
+        """Adds the inputs of validated columns, one value per input."""
+        self.count += len(next(iter(columns.values())))
+        for name, sketch in self.sketches.items():
+            sketch.add_many(columns[name])
+        for name, counts in self.categories.items():
+            counts.update(map(str.lower, columns[name].tolist()))
+
+    def merge(self, other: "FeatureProfile"):
+        """Adds the inputs of a profile of the same features."""
+        self.count += other.count
+        for name, sketch in self.sketches.items():
+            sketch.merge(other.sketches[name])
+        for name, counts in self.categories.items():
+            counts.update(other.categories[name])
+
+    def summary(self) -> dict[str, dict]:
+        """Mean and quantiles of the numeric features, fractions of the
+        values of the categorical ones."""
+        summary = {}
+        for name, sketch in self.sketches.items():
+            summary[name] = {
+                "mean": sketch.sum / sketch.count if sketch.count else None,
+                "min": sketch.min if sketch.count else None,
+                "p50": sketch.quantile(0.5),
+                "p90": sketch.quantile(0.9),
+                "p99": sketch.quantile(0.99),
+                "max": sketch.max if sketch.count else None,
+            }
+        for name, counts in self.categories.items():
+            total = counts.total()
+            summary[name] = {
+                "fractions": {
+                    value: count / total
+                    for value, count in sorted(counts.items())
+                }
+            }
+        return summary
+
+    def drift(self, reference: "FeatureProfile") -> dict[str, dict] | None:
+        """Drift scores of each feature from the reference profile, None
+        until both have inputs."""
+        if not self.count or not reference.count:
+            return None
+        scores = {
+            name: numeric_drift(reference.sketches[name], sketch)
+            for name, sketch in self.sketches.items()
+        }
+        scores.update(
+            (name, categorical_drift(reference.categories[name], counts))
+            for name, counts in self.categories.items()
+        )
+        return scores
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "numeric": {
+                name: sketch.to_dict()
+                for name, sketch in self.sketches.items()
+            },
+            "categorical": {
+                name: dict(counts) for name, counts in self.categories.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FeatureProfile":
+        profile = cls([], [])
+        profile.count = data["count"]
+        profile.sketches = {
+            name: QuantileSketch.from_dict(sketch)
+            for name, sketch in data["numeric"].items()
+        }
+        profile.categories = {
+            name: Counter(counts)
+            for name, counts in data["categorical"].items()
+        }
+        return profile
+
+
+def load_profile(path: str) -> FeatureProfile:
+    with open(path) as file:
+        return FeatureProfile.from_dict(json.load(file))
+
+
+def save_profile(profile: FeatureProfile, path: str):
+    with open(path, "w") as file:
+        json.dump(profile.to_dict(), file)
+
+
+class DriftMonitor:
+    """Profile of the inputs since the window started, scored against the
+    reference profile, if any.
+
+    A feature has drifted when its PSI is at least `psi_threshold`.
+    """
+
+    def __init__(
+        self,
+        numeric: Iterable[str],
+        categorical: Iterable[str],
+        reference: FeatureProfile | None = None,
+        relative_accuracy: float = 0.01,
+        psi_threshold: float = 0.2,
+    ):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.reference = reference
+        self.relative_accuracy = relative_accuracy
+        self.psi_threshold = psi_threshold
+        self.window = self._new_profile()
+        self.started_at = utc_now()
+
+    def _new_profile(self) -> FeatureProfile:
+        return FeatureProfile(
+            self.numeric, self.categorical, self.relative_accuracy
+        )
+
+    def observe(self, features: Mapping[str, Any]):
+        self.window.observe(features)
+
+    def observe_columns(self, columns: Mapping[str, np.ndarray]):
+        self.window.observe_columns(columns)
+
+    def scores(self) -> dict[str, dict] | None:
+        """Drift scores of the window, None without reference or inputs."""
+        if self.reference is None:
+            return None
+        scores = self.window.drift(self.reference)
+        if scores is not None:
+            for score in scores.values():
+                score["drifted"] = score["psi"] >= self.psi_threshold
+        return scores
+
+    def report(self) -> dict:
+        """Summary and drift scores of each feature in the window."""
+        scores = self.scores() or {}
+        summary = self.window.summary()
+        return {
+            "started_at": self.started_at,
+            "count": self.window.count,
+            "reference_count": (
+                self.reference.count if self.reference is not None else None
+            ),
+            "psi_threshold": self.psi_threshold,
+            "features": {
+                name: {**summary[name], **scores.get(name, {})}
+                for name in summary
+            },
+        }
+
+    def rotate(self) -> tuple[FeatureProfile, datetime]:
+        """Starts a new window, returns the profile and start of the last."""
+        window, started_at = self.window, self.started_at
+        self.window, self.started_at = self._new_profile(), utc_now()
+        return window, started_at
+
+
+class DriftSnapshotter:
+    """Stores the window of the monitor every `interval` seconds and starts
+    a new one, the last window is stored when stopping."""
+
+    def __init__(
+        self, monitor: DriftMonitor, engine: AsyncEngine, interval: float
+    ):
+        self.monitor = monitor
+        self.engine = engine
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Starts the snapshots, must be called inside the event loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Storing the last drift snapshot failed")
+
+    async def run_once(self) -> bool:
+        """Stores the window if it has inputs, returns whether it did."""
+        scores = self.monitor.scores()
+        window, started_at = self.monitor.rotate()
+        if not window.count:
+            return False
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                insert(DriftSnapshot).values(
+                    started_at=started_at,
+                    ended_at=self.monitor.started_at,
+                    count=window.count,
+                    profile=window.to_dict(),
+                    scores=scores,
+                )
+            )
+        return True
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Storing the drift snapshot failed")
+
+
+def profile_logs(
+    engine, start: datetime, end: datetime, profile: FeatureProfile
+):
+    """Adds the inputs logged from `start` to `end` to the profile."""
+    columns = [
+        getattr(PredictionLog, name)
+        for name in (*profile.sketches, *profile.categories)
+    ]
+    query = select(*columns).where(
+        PredictionLog.timestamp >= start, PredictionLog.timestamp < end
+    )
+    with engine.connect() as connection:
+        rows = connection.execute(query.execution_options(yield_per=10000))
+        for partition in rows.partitions():
+            batch = [row._mapping for row in partition]
+            profile.observe_columns(
+                {
+                    column.name: np.array([row[column.name] for row in batch])
+                    for column in columns
+                }
+            )
+
+
+def profile_csv(path: str, profile: FeatureProfile):
+    """Adds the inputs of a CSV file with a header to the profile."""
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            profile.observe(
+                {
+                    **row,
+                    **{name: float(row[name]) for name in profile.sketches},
+                }
+            )
+
+
+def main():
+    from src.main import DATATYPE_MAPPING
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output", help="JSON file of the reference profile")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--csv", help="CSV file of inputs, with a header")
+    source.add_argument(
+        "--days",
+        type=float,
+        default=7,
+        help="days of logs before --end profiled",
+    )
+    parser.add_argument(
+        "--end",
+        type=datetime.fromisoformat,
+        default=None,
+        help="end of the logs profiled, in UTC, by default now",
+    )
+    parser.add_argument(
+        "--relative-accuracy",
+        type=float,
+        default=drift_settings.DRIFT_RELATIVE_ACCURACY,
+    )
+    args = parser.parse_args()
+
+    profile = FeatureProfile(
+        *feature_kinds(DATATYPE_MAPPING), args.relative_accuracy
+    )
+    if args.csv:
+        profile_csv(args.csv, profile)
+    else:
+        end = args.end or utc_now()
+        engine = create_engine(settings.DATABASE_URL)
+        profile_logs(engine, end - timedelta(days=args.days), end, profile)
+    save_profile(profile, args.output)
+    print(f"profiled {profile.count} inputs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
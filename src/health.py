@@ -0,0 +1,75 @@
+"""Readiness checks of the service dependencies."""
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class ReadinessChecker:
+    """Checks the dependencies of the service and caches the result.
+
+    Each check is a coroutine function raising when the dependency is not
+    usable. The checks run concurrently, each within `timeout` seconds, and
+    the result is reused for `ttl` seconds so that frequent probes do not
+    add load on the dependencies. Probes arriving while the checks run wait
+    for the same result.
+    """
+
+    def __init__(
+        self,
+        checks: dict[str, Callable[[], Awaitable]],
+        ttl: float = 5.0,
+        timeout: float = 2.0,
+        clock=time.monotonic,
+    ):
+        self.checks = checks
+        self.ttl = ttl
+        self.timeout = timeout
+        self.clock = clock
+        self._result: dict | None = None
+        self._checked_at = 0.0
+        self._running: asyncio.Future | None = None
+
+    async def _run_check(self, check: Callable[[], Awaitable]) -> dict:
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            error = f"no answer within {self.timeout}s"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            error = None
+        result = {
+            "ready": error is None,
+            "latency_ms": (time.perf_counter() - start_time) * 1000,
+        }
+        if error is not None:
+            result["error"] = error
+        return result
+
+    async def _run_checks(self) -> dict:
+        results = await asyncio.gather(
+            *(self._run_check(check) for check in self.checks.values())
+        )
+        dependencies = dict(zip(self.checks, results))
+        return {
+            "ready": all(result["ready"] for result in results),
+            "dependencies": dependencies,
+        }
+
+    async def check(self) -> dict:
+        """Readiness of each dependency, and of all of them as `ready`."""
+        age = self.clock() - self._checked_at
+        if self._result is not None and age < self.ttl:
+            return {**self._result, "cached": True, "age_seconds": age}
+        if self._running is None:
+            self._running = asyncio.ensure_future(self._run_checks())
+            try:
+                self._result = await asyncio.shield(self._running)
+                self._checked_at = self.clock()
+            finally:
+                self._running = None
+            return {**self._result, "cached": False, "age_seconds": 0.0}
+        result = await asyncio.shield(self._running)
+        return {**result, "cached": True, "age_seconds": 0.0}
@@ -0,0 +1,170 @@
+"""In-process scoring with a model loaded from a local path."""
+
+import asyncio
+import os
+import pickle
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from operator import attrgetter
+from typing import Literal
+
+import numpy as np
+from pydantic import BaseModel
+
+from src.columnar import ColumnBatch
+from src.encoder import NUMPY_DTYPES
+from src.model_client import ModelResponseError
+
+
+class LocalModelError(ModelResponseError):
+    """The local model failed to score the rows."""
+
+
+def load_model(path: str):
+    """Loads an MLflow pyfunc model directory or a pickled sklearn model.
+
+    MLflow models need the `mlflow` package, other models are read with
+    `joblib` when it is installed (as it is with scikit-learn) or `pickle`.
+    """
+    if os.path.isdir(path):
+        try:
+            import mlflow.pyfunc
+        except ImportError as e:
+            raise ImportError(
+                "Loading an MLflow model needs the `mlflow` package "
+                "installed next to the service"
+            ) from e
+        return mlflow.pyfunc.load_model(path)
+    try:
+        import joblib
+    except ImportError:
+        with open(path, "rb") as model_file:
+            return pickle.load(model_file)
+    return joblib.load(path)
+
+
+def _as_frame(columns: dict[str, np.ndarray]):
+    # Models trained on data frames need the column names, a dict of
+    # columns is passed when pandas is not installed
+    try:
+        import pandas as pd
+    except ImportError:
+        return columns
+    return pd.DataFrame(columns)
+
+
+def _predict_with(model, columns: dict[str, np.ndarray]) -> np.ndarray:
+    return np.asarray(model.predict(_as_frame(columns)), dtype=float).ravel()
+
+
+# Model of a process pool worker, loaded once by the pool initializer
+_worker_model = None
+
+
+def _load_worker_model(path: str):
+    global _worker_model
+    _worker_model = load_model(path)
+
+
+def _predict_in_worker(columns: dict[str, np.ndarray]) -> np.ndarray:
+    return _predict_with(_worker_model, columns)
+
+
+class LocalModel:
+    """Model scoring the rows in the service instead of over HTTP.
+
+    The rows are converted to one column per feature, with the categories
+    upper-cased as they are sent to the model server, and scored with a
+    single vectorised `predict` call. Scoring runs in a thread pool, or in
+    a process pool with a copy of the model per process to score batches
+    in parallel without contending for the GIL.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        datatype_mapping: dict[str, str],
+        executor: Literal["thread", "process"] = "thread",
+        workers: int = 1,
+    ):
+        self.path = path
+        self.datatype_mapping = datatype_mapping
+        self.executor_type = executor
+        self.workers = workers
+        self.name = os.path.basename(os.path.normpath(path))
+        self.version = f"local:{self.name}"
+        self.model = None
+        self._executor: Executor | None = None
+
+    def start(self):
+        """Loads the model and starts the pool of workers."""
+        # Loaded here in both modes, so that a bad model fails the startup
+        self.model = load_model(self.path)
+        if self.executor_type == "process":
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                initializer=_load_worker_model,
+                initargs=(self.path,),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="local-model"
+            )
+
+    async def stop(self):
+        """Waits for the scoring in progress and stops the workers."""
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown)
+            self._executor = None
+
+    def columns(
+        self, rows: list[BaseModel] | ColumnBatch
+    ) -> dict[str, np.ndarray]:
+        """Converts the rows into one array per feature."""
+        columns = {}
+        for name, datatype in self.datatype_mapping.items():
+            if isinstance(rows, ColumnBatch):
+                values = rows.columns[name]
+                if datatype == "BYTES":
+                    columns[name] = np.array(
+                        [value.upper() for value in values.tolist()],
+                        dtype=object,
+                    )
+                else:
+                    columns[name] = values.astype(NUMPY_DTYPES[datatype])
+                continue
+            if datatype == "BYTES":
+                columns[name] = np.array(
+                    [getattr(row, name).upper() for row in rows], dtype=object
+                )
+            else:
+                columns[name] = np.fromiter(
+                    map(attrgetter(name), rows),
+                    dtype=NUMPY_DTYPES[datatype],
+                    count=len(rows),
+                )
+        return columns
+
+    async def predict(self, columns: dict[str, np.ndarray]) -> list[float]:
+        """Scores the columns in the pool, one prediction per row."""
+        loop = asyncio.get_running_loop()
+        rows = len(next(iter(columns.values()), ()))
+        try:
+            if self.executor_type == "process":
+                predictions = await loop.run_in_executor(
+                    self._executor, _predict_in_worker, columns
+                )
+            else:
+                predictions = await loop.run_in_executor(
+                    self._executor, _predict_with, self.model, columns
+                )
+        except Exception as e:
+            raise LocalModelError(f"local model error: {e!r}") from e
+        if len(predictions) != rows:
+            raise LocalModelError(
+                f"expected {rows} predictions, got {len(predictions)}"
+            )
+        return predictions.tolist()
@@ -0,0 +1,169 @@
+"""Buffered background writer for the prediction logs."""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Literal
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.data_models import PredictionLog
+from src.metrics import REGISTRY
+
+DB_POOL_CHECKOUT_SECONDS = REGISTRY.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time waiting for a connection from the database pool.",
+)
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    "prediction_log_write_duration_seconds",
+    "Time to write one batch of prediction logs to the database.",
+)
+
+logger = logging.getLogger(__name__)
+
+OverflowPolicy = Literal["drop", "block"]
+
+
+class PredictionLogWriter:
+    """Collects prediction log records and writes them in bulk.
+
+    Records are buffered in an in-process queue and inserted with one
+    multi-row INSERT once `batch_size` records are buffered or the oldest
+    buffered record is `flush_interval_ms` old. When the queue is full
+    new records are either dropped or the caller waits for space,
+    depending on `overflow_policy`. A writer that is not `enabled` does
+    not write anything, all records are discarded.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        batch_size: int = 500,
+        flush_interval_ms: float = 200,
+        max_queue_size: int = 10000,
+        overflow_policy: OverflowPolicy = "drop",
+        enabled: bool = True,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.overflow_policy = overflow_policy
+        self.enabled = enabled
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._buffer: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of records waiting to be written."""
+        return self._queue.qsize() + len(self._buffer)
+
+    def start(self):
+        """Starts the writer, must be called inside the event loop."""
+        if not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the writer after writing all the queued records."""
+        if self._task is not None:
+            # Holding the lock makes sure no insert is cancelled half way
+            async with self._lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def write(self, record: dict) -> bool:
+        """Queues a `PredictionLog` record, returns False if it was dropped."""
+        if not self.enabled:
+            return False
+        if self.overflow_policy == "block":
+            await self._queue.put(record)
+            return True
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(
+                "Prediction log queue is full, dropped %d records so far",
+                self.dropped,
+            )
+            return False
+        return True
+
+    async def write_many(self, records: list[dict]) -> int:
+        """Queues the records, returns the number of records accepted."""
+        accepted = 0
+        for record in records:
+            accepted += await self.write(record)
+        return accepted
+
+    async def flush(self):
+        """Writes everything that is queued right now."""
+        async with self._lock:
+            while not self._queue.empty():
+                self._buffer.append(self._queue.get_nowait())
+            while self._buffer:
+                await self._write_buffer()
+
+    def stats(self) -> dict:
+        """Counts of the records written, dropped and failed."""
+        return {
+            "queue_depth": self.queue_depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                self._buffer.append(await self._queue.get())
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._buffer) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                self._buffer.append(record)
+            async with self._lock:
+                await self._write_buffer()
+
+    async def _write_buffer(self):
+        size = self.batch_size
+        batch, self._buffer = self._buffer[:size], self._buffer[size:]
+        if not batch:
+            return
+        try:
+            with DB_WRITE_SECONDS.labels().time():
+                checkout_time = await self._insert(batch)
+            DB_POOL_CHECKOUT_SECONDS.labels().observe(checkout_time)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception(
+                "Failed to write %d prediction log records", len(batch)
+            )
+
+    async def _insert(self, records: list[dict]) -> float:
+        """Inserts the records, returns the pool checkout wait time."""
+        async with self.session_factory() as db:
+            start_time = time.perf_counter()
+            # Check out the connection up front to time the pool wait
+            await db.connection()
+            checkout_time = time.perf_counter() - start_time
+            await db.execute(insert(PredictionLog), records)
+            await db.commit()
+        return checkout_time
@@ -1,24 +1,200 @@
 """FastAPI prediction service."""
 
-import json
-import os
+import math
 import time
-from datetime import datetime, timezone
-from typing import Annotated, Literal
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Annotated, Any, Awaitable, Callable, Literal
 
-import requests
+import httpx
+import numpy as np
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field, field_validator
-from sqlalchemy.orm import Session
+from sqlalchemy import text
 
-from src.data_models import PredictionLog
-from src.db_connection import get_db
-from src.utils import get_app_version
-
-model_prediction_endpoint = os.getenv(
-    "MODEL_PREDICTION_ENDPOINT", "http://localhost:5001/invocations"
+from src.analytics import (
+    Bucket,
+    Metric,
+    RollupUpdater,
+    distribution,
+    export_logs,
+    request_counts,
+    utc_now,
+)
+from src.batching import MicroBatcher
+from src.bulk import (
+    BULK_FORMATS,
+    BulkStreamingResponse,
+    iter_lines,
+    ndjson_lines,
+    read_csv,
+    read_ndjson,
+    score_stream,
+)
+from src.cache import PredictionCache, create_cache, feature_key
+from src.columnar import ColumnarValidator, ColumnBatch
+from src.db_connection import async_session, get_async_engine, get_engine
+from src.drift import (
+    DriftMonitor,
+    DriftSnapshotter,
+    feature_kinds,
+    load_profile,
+)
+from src.encoder import KServeEncoder
+from src.health import ReadinessChecker
+from src.local_model import LocalModel
+from src.log_writer import PredictionLogWriter
+from src.metrics import (
+    MODEL_UPSTREAM_ERRORS,
+    PREDICTION_STAGE_SECONDS,
+    REGISTRY,
+    MetricFamily,
+    MetricsMiddleware,
+    from_histogram,
+    single_value,
+)
+from src.model_client import (
+    ModelResponseError,
+    ModelVersion,
+    Predictions,
+    error_type,
+    request_prediction,
+)
+from src.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    UpstreamPolicy,
+    create_upstream_policy,
 )
+from src.retention import PartitionMaintainer
+from src.routing import ReplicaRouter, create_router
+from src.singleflight import SingleFlight
+from src.utils import (
+    drift_settings,
+    get_app_version,
+    health_settings,
+    model_settings,
+    settings,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Creates the shared resources used for the lifetime of the app."""
+    # Created here rather than on import, so in each worker process
+    app.state.engine = get_engine()
+    app.state.async_engine = get_async_engine()
+    app.state.log_writer = PredictionLogWriter(
+        async_session,
+        batch_size=settings.DB_LOG_BATCH_SIZE,
+        flush_interval_ms=settings.DB_LOG_FLUSH_INTERVAL_MS,
+        max_queue_size=settings.DB_LOG_QUEUE_SIZE,
+        overflow_policy=settings.DB_LOG_OVERFLOW_POLICY,
+        enabled=settings.DB_LOG_ENABLED,
+    )
+    app.state.log_writer.start()
+    # Keeps the daily partitions of the logs ahead and drops the expired
+    app.state.partition_maintainer = None
+    if settings.DB_LOG_PARTITION_MAINTENANCE_INTERVAL > 0:
+        app.state.partition_maintainer = PartitionMaintainer(
+            app.state.async_engine,
+            interval=settings.DB_LOG_PARTITION_MAINTENANCE_INTERVAL,
+            days_ahead=settings.DB_LOG_PARTITION_DAYS_AHEAD,
+            retention_days=settings.DB_LOG_RETENTION_DAYS,
+        )
+        app.state.partition_maintainer.start()
+    # Keeps the rollups read by the analytics endpoints up to date
+    app.state.rollup_updater = None
+    if settings.DB_LOG_ROLLUP_INTERVAL > 0:
+        app.state.rollup_updater = RollupUpdater(
+            app.state.async_engine,
+            interval=settings.DB_LOG_ROLLUP_INTERVAL,
+            settle_seconds=settings.DB_LOG_ROLLUP_SETTLE_SECONDS,
+            batch_size=settings.DB_LOG_ROLLUP_BATCH_SIZE,
+        )
+        app.state.rollup_updater.start()
+    # Profiles the inputs, compared with the reference profile if any
+    app.state.drift_monitor = None
+    app.state.drift_snapshotter = None
+    if drift_settings.DRIFT_ENABLED:
+        reference_path = drift_settings.DRIFT_REFERENCE_PATH
+        app.state.drift_monitor = DriftMonitor(
+            *feature_kinds(DATATYPE_MAPPING),
+            reference=load_profile(reference_path) if reference_path else None,
+            relative_accuracy=drift_settings.DRIFT_RELATIVE_ACCURACY,
+            psi_threshold=drift_settings.DRIFT_PSI_THRESHOLD,
+        )
+        if drift_settings.DRIFT_SNAPSHOT_INTERVAL > 0:
+            app.state.drift_snapshotter = DriftSnapshotter(
+                app.state.drift_monitor,
+                app.state.async_engine,
+                interval=drift_settings.DRIFT_SNAPSHOT_INTERVAL,
+            )
+            app.state.drift_snapshotter.start()
+    # The local model is loaded whenever it is configured, so that the
+    # backend can be switched to it while running
+    app.state.local_model = None
+    if model_settings.LOCAL_MODEL_PATH:
+        app.state.local_model = LocalModel(
+            model_settings.LOCAL_MODEL_PATH,
+            DATATYPE_MAPPING,
+            executor=model_settings.LOCAL_MODEL_EXECUTOR,
+            workers=model_settings.LOCAL_MODEL_WORKERS,
+        )
+        app.state.local_model.start()
+    elif model_settings.PREDICTION_BACKEND == "local":
+        raise ValueError("PREDICTION_BACKEND=local needs a LOCAL_MODEL_PATH")
+    app.state.prediction_backend = model_settings.PREDICTION_BACKEND
+    # Requests are routed to the model replicas, each with its own pool
+    app.state.router = create_router(
+        probe_payload=kserve_encoder.encode([PROBE_HOUSE_DATA])
+    )
+    app.state.router.start()
+    app.state.upstream_policy = create_upstream_policy()
+    app.state.cache = create_cache()
+    app.state.single_flight = (
+        SingleFlight() if model_settings.MODEL_SINGLE_FLIGHT_ENABLED else None
+    )
+    app.state.batcher = None
+    if model_settings.MODEL_BATCHING_ENABLED:
+        app.state.batcher = MicroBatcher(
+            partial(score_rows, app.state),
+            max_batch_size=model_settings.MODEL_BATCHING_MAX_SIZE,
+            max_wait_ms=model_settings.MODEL_BATCHING_MAX_WAIT_MS,
+            max_concurrent_batches=(
+                model_settings.MODEL_BATCHING_MAX_CONCURRENCY
+            ),
+        )
+        app.state.batcher.start()
+    app.state.readiness = ReadinessChecker(
+        {
+            "database": check_database,
+            "model": partial(check_model, app.state),
+        },
+        ttl=health_settings.READINESS_CACHE_SECONDS,
+        timeout=health_settings.READINESS_TIMEOUT,
+    )
+    try:
+        yield
+    finally:
+        if app.state.batcher is not None:
+            await app.state.batcher.stop()
+        if app.state.local_model is not None:
+            await app.state.local_model.stop()
+        await app.state.router.stop()
+        if app.state.partition_maintainer is not None:
+            await app.state.partition_maintainer.stop()
+        if app.state.rollup_updater is not None:
+            await app.state.rollup_updater.stop()
+        if app.state.drift_snapshotter is not None:
+            await app.state.drift_snapshotter.stop()
+        # Write the remaining logs before shutting down
+        await app.state.log_writer.stop()
+        await app.state.async_engine.dispose()
+
 
 # custom type
 YesNoLiteral = Literal["YES", "yes", "Yes", "NO", "no", "No"]
@@ -31,7 +207,9 @@ app = FastAPI(
     version=get_app_version(),
     docs_url="/swagger",  # Swagger UI Documentation - default /doc
     redoc_url="/api-docs",  # API documentation - ReDoc - default /redoc
+    lifespan=lifespan,
 )
+app.add_middleware(MetricsMiddleware, pipeline_paths=["/predict"])
 
 
 class HousingData(BaseModel):
@@ -67,117 +245,885 @@ class ResponseModel(BaseModel):
     response: dict
 
 
-def preprocess_request(data: HousingData):
-    """Data transformation for sending the request to the kserve model."""
-
-    # Define datatype mapping for each feature
-    datatype_mapping = {
-        "mainroad": "BYTES",
-        "guestroom": "BYTES",
-        "basement": "BYTES",
-        "hotwaterheating": "BYTES",
-        "airconditioning": "BYTES",
-        "prefarea": "BYTES",
-        "furnishingstatus": "BYTES",
-        "area": "FP32",
-        "bedrooms": "INT64",
-        "bathrooms": "INT64",
-        "stories": "INT64",
-        "parking": "INT64",
-    }
+# Define datatype mapping for each feature
+DATATYPE_MAPPING = {
+    "mainroad": "BYTES",
+    "guestroom": "BYTES",
+    "basement": "BYTES",
+    "hotwaterheating": "BYTES",
+    "airconditioning": "BYTES",
+    "prefarea": "BYTES",
+    "furnishingstatus": "BYTES",
+    "area": "FP32",
+    "bedrooms": "INT64",
+    "bathrooms": "INT64",
+    "stories": "INT64",
+    "parking": "INT64",
+}
 
-    # Convert data into dict format
-    transformed_data = json.loads(data.model_dump_json())
-
-    # Modify the payload in the required kserve format
-    inputs = []
-    for key, value in transformed_data.items():
-        input_data = {
-            "name": key,
-            "shape": [1],
-            "datatype": datatype_mapping[key],
-            "data": [value.upper() if isinstance(value, str) else value],
-        }
-        inputs.append(input_data)
+# Writes the KServe v2 request body, one tensor of shape [N] per feature
+kserve_encoder = KServeEncoder(HousingData, DATATYPE_MAPPING)
+
+# Validates many rows at once, with the category lower-cased the way
+# `HousingData.normalize_category` does
+housing_validator = ColumnarValidator(
+    HousingData, lowercase=["furnishingstatus"]
+)
 
-    payload = {"inputs": inputs}
+# Known valid input, used to check that the model servers answer
+PROBE_HOUSE_DATA = HousingData(
+    mainroad="yes",
+    guestroom="no",
+    basement="no",
+    hotwaterheating="no",
+    airconditioning="yes",
+    prefarea="no",
+    furnishingstatus="furnished",
+    area=1200,
+    bedrooms=3,
+    bathrooms=2,
+    stories=2,
+    parking=1,
+)
 
-    return payload
 
+async def score_batch(
+    router: ReplicaRouter,
+    rows: list[HousingData] | ColumnBatch,
+    cache: PredictionCache | None = None,
+    policy: UpstreamPolicy | None = None,
+) -> Predictions:
+    """Scores the rows with one model request, one price per row.
 
-@app.post("/predict", response_model=ResponseModel)
-def get_prediction(house_data: HousingData, db: Session = Depends(get_db)):
-    """Get house price prediction form the model."""
-    transformed_payload = preprocess_request(house_data)
-    # Log the incoming request to the database
-    log_entry = PredictionLog(
-        mainroad=house_data.mainroad,
-        guestroom=house_data.guestroom,
-        basement=house_data.basement,
-        hotwaterheating=house_data.hotwaterheating,
-        airconditioning=house_data.airconditioning,
-        prefarea=house_data.prefarea,
-        furnishingstatus=house_data.furnishingstatus,
-        area=house_data.area,
-        bedrooms=house_data.bedrooms,
-        bathrooms=house_data.bathrooms,
-        stories=house_data.stories,
-        parking=house_data.parking,
+    With a `policy` the request is retried, hedged and circuit broken
+    following it.
+    """
+    with PREDICTION_STAGE_SECONDS.labels("preprocess").time():
+        if model_settings.MODEL_BINARY_DATA:
+            payload, header_length = kserve_encoder.encode_binary(rows)
+        else:
+            payload, header_length = kserve_encoder.encode(rows), None
+
+    async def send() -> dict:
+        return await router.request(payload, header_length)
+
+    try:
+        with PREDICTION_STAGE_SECONDS.labels("model").time():
+            if policy is not None:
+                model_response = await policy.call(send)
+            else:
+                model_response = await send()
+        predicted_prices = model_response["outputs"][0]["data"]
+        if isinstance(predicted_prices, np.ndarray):
+            # Binary output, converted to floats in one pass
+            predicted_prices = predicted_prices.tolist()
+        if len(predicted_prices) != len(rows):
+            raise ModelResponseError(
+                f"expected {len(rows)} predictions, "
+                f"got {len(predicted_prices)}"
+            )
+    except (httpx.HTTPError, ModelResponseError, CircuitOpenError) as e:
+        MODEL_UPSTREAM_ERRORS.labels(error_type(e)).inc()
+        raise
+    model = ModelVersion(
+        model_response.get("model_name"), model_response.get("model_version")
     )
-    db.add(log_entry)
-    db.commit()
-    # Refresh the instance to get the ID assigned by the DB
-    db.refresh(log_entry)
-    log_entry.timestamp = datetime.now(timezone.utc)
+    if cache is not None:
+        # Drop the cached predictions when a new model version is served
+        await cache.observe_model_version(model.version, model.name)
+    return Predictions(predicted_prices, model)
+
+
+async def score_local(
+    local_model: LocalModel,
+    rows: list[HousingData] | ColumnBatch,
+    cache: PredictionCache | None = None,
+) -> Predictions:
+    """Scores the rows in-process with the local model."""
+    with PREDICTION_STAGE_SECONDS.labels("preprocess").time():
+        columns = local_model.columns(rows)
     try:
-        start_time = time.perf_counter()
-        # Get the model prediction
+        with PREDICTION_STAGE_SECONDS.labels("model").time():
+            predicted_prices = await local_model.predict(columns)
+    except ModelResponseError as e:
+        MODEL_UPSTREAM_ERRORS.labels(error_type(e)).inc()
+        raise
+    model = ModelVersion(local_model.name, local_model.version)
+    if cache is not None:
+        await cache.observe_model_version(model.version, model.name)
+    return Predictions(predicted_prices, model)
 
-        headers = {"Content-Type": "application/json"}
-        response = requests.post(
-            model_prediction_endpoint,
-            json=transformed_payload,
-            headers=headers,
-        )
 
-        response.raise_for_status()
+async def score_rows(
+    state, rows: list[HousingData] | ColumnBatch
+) -> Predictions:
+    """Scores the rows with the prediction backend selected in the state."""
+    if state.prediction_backend == "local":
+        return await score_local(state.local_model, rows, state.cache)
+    return await score_batch(
+        state.router, rows, state.cache, state.upstream_policy
+    )
 
-        # Extract predicted price from the model endpoint's response
-        predicted_price = response.json()["outputs"][0]["data"][0]
 
-        # Calculate the inference time in seconds
-        end_time = time.perf_counter()
-        inference_time = end_time - start_time
+Scorer = Callable[[list[HousingData] | ColumnBatch], Awaitable[Predictions]]
+
+
+def service_unavailable(error: CircuitOpenError) -> HTTPException:
+    """503 telling the client when to retry while the circuit is open."""
+    return HTTPException(
+        status_code=503,
+        detail=f"Regression model prediction service error: {error}",
+        headers={"Retry-After": str(math.ceil(error.retry_after))},
+    )
+
 
-        # Log prediction response to the db
-        log_entry.prediction_response = predicted_price
-        # Log inference time to the db
-        log_entry.inference_time = inference_time
-        db.commit()
+def log_record(house_data: HousingData, **kwargs) -> dict:
+    """Creates the `PredictionLog` record for the input data.
 
-        # Return the response in the expected format
+    The input is a model or a row of a `ColumnBatch`.
+    """
+    return {
+        "mainroad": house_data.mainroad,
+        "guestroom": house_data.guestroom,
+        "basement": house_data.basement,
+        "hotwaterheating": house_data.hotwaterheating,
+        "airconditioning": house_data.airconditioning,
+        "prefarea": house_data.prefarea,
+        "furnishingstatus": house_data.furnishingstatus,
+        "area": house_data.area,
+        "bedrooms": house_data.bedrooms,
+        "bathrooms": house_data.bathrooms,
+        "stories": house_data.stories,
+        "parking": house_data.parking,
+        "prediction_response": None,
+        "inference_time": None,
+        "cache_hit": False,
+        "model_name": None,
+        "model_version": None,
+        **kwargs,
+    }
+
+
+def prediction_response(price: float, model: ModelVersion) -> dict:
+    """Response of a prediction, with the model that made it."""
+    return {
+        "prediction": price,
+        "unit": "GBP(£)",
+        "model_name": model.name,
+        "model_version": model.version,
+    }
+
+
+def get_scorer(request: Request) -> Scorer:
+    """FastAPI endpoint dependency to score rows with the selected backend."""
+    return partial(score_rows, request.app.state)
+
+
+def get_batcher(request: Request) -> MicroBatcher | None:
+    """FastAPI endpoint dependency to get the micro-batcher, if enabled."""
+    return request.app.state.batcher
+
+
+def get_cache(request: Request) -> PredictionCache | None:
+    """FastAPI endpoint dependency to get the prediction cache, if enabled."""
+    return request.app.state.cache
+
+
+def get_single_flight(request: Request) -> SingleFlight | None:
+    """FastAPI endpoint dependency to get the single-flight group."""
+    return request.app.state.single_flight
+
+
+def get_log_writer(request: Request) -> PredictionLogWriter:
+    """FastAPI endpoint dependency to get the prediction log writer."""
+    return request.app.state.log_writer
+
+
+def get_drift_monitor(request: Request) -> DriftMonitor | None:
+    """FastAPI endpoint dependency to get the drift monitor, if enabled."""
+    return request.app.state.drift_monitor
+
+
+@app.post("/predict", response_model=ResponseModel)
+async def get_prediction(
+    house_data: HousingData,
+    request: Request,
+    score: Scorer = Depends(get_scorer),
+    batcher: MicroBatcher | None = Depends(get_batcher),
+    cache: PredictionCache | None = Depends(get_cache),
+    single_flight: SingleFlight | None = Depends(get_single_flight),
+    log_writer: PredictionLogWriter = Depends(get_log_writer),
+    drift_monitor: DriftMonitor | None = Depends(get_drift_monitor),
+):
+    """Get house price prediction form the model."""
+    # Time spent reading and validating the request before getting here
+    PREDICTION_STAGE_SECONDS.labels("validate").observe(
+        time.perf_counter() - request.state.start_time
+    )
+    # Log entry for the incoming request, written in the background
+    log_entry = log_record(house_data)
+    features = house_data.model_dump()
+    if drift_monitor is not None:
+        drift_monitor.observe(features)
+    cached_price = await cache.get(features) if cache is not None else None
+    if cached_price is not None:
+        # Cached for the model version served now
+        model = ModelVersion(cache.model_name, cache.model_version)
+        log_entry["prediction_response"] = cached_price
+        log_entry["cache_hit"] = True
+        log_entry["model_name"], log_entry["model_version"] = model
+        with PREDICTION_STAGE_SECONDS.labels("log_write").time():
+            await log_writer.write(log_entry)
         return {
             "status": 200,
             "message": "House price prediction successful",
-            "response": {"prediction": predicted_price, "unit": "GBP(£)"},
+            "response": prediction_response(cached_price, model),
         }
-    except requests.exceptions.RequestException as e:
-        # Log the error and raise an HTTPException
-        db.rollback()  # Rollback in case of any exception
+
+    async def predict() -> tuple[float, float, ModelVersion]:
+        if batcher is not None:
+            # Scored together with the other concurrent requests
+            return await batcher.submit(house_data)
+        start_time = time.perf_counter()
+        # Get the model prediction
+        predictions = await score([house_data])
+        # Calculate the inference time in seconds
+        end_time = time.perf_counter()
+        return predictions[0], end_time - start_time, predictions.model
+
+    try:
+        if single_flight is not None:
+            # Identical concurrent requests share one model call
+            predicted_price, inference_time, model = await single_flight.do(
+                feature_key(features), predict
+            )
+        else:
+            predicted_price, inference_time, model = await predict()
+    except CircuitOpenError as e:
+        # Log the request without a prediction and fail fast
+        with PREDICTION_STAGE_SECONDS.labels("log_write").time():
+            await log_writer.write(log_entry)
+        raise service_unavailable(e)
+    except (httpx.HTTPError, ModelResponseError) as e:
+        # Log the request without a prediction and raise an HTTPException
+        with PREDICTION_STAGE_SECONDS.labels("log_write").time():
+            await log_writer.write(log_entry)
         raise HTTPException(
             status_code=500,
             detail=f"Regression model prediction service error: {e}",
         )
 
+    if cache is not None:
+        await cache.set(features, predicted_price)
+
+    # Log prediction response, inference time and model to the db
+    log_entry["prediction_response"] = predicted_price
+    log_entry["inference_time"] = inference_time
+    log_entry["model_name"], log_entry["model_version"] = model
+    with PREDICTION_STAGE_SECONDS.labels("log_write").time():
+        await log_writer.write(log_entry)
+
+    # Return the response in the expected format
+    return {
+        "status": 200,
+        "message": "House price prediction successful",
+        "response": prediction_response(predicted_price, model),
+    }
+
+
+@app.post("/predict/batch", response_model=ResponseModel)
+async def get_batch_prediction(
+    batch: list[Any],
+    score: Scorer = Depends(get_scorer),
+    log_writer: PredictionLogWriter = Depends(get_log_writer),
+    drift_monitor: DriftMonitor | None = Depends(get_drift_monitor),
+):
+    """Get house price predictions for many houses in one model request.
+
+    Rows failing validation are reported in `errors` with their index in
+    the batch, the remaining rows are scored together.
+    """
+    if len(batch) > model_settings.MODEL_MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch size {len(batch)} exceeds the limit of "
+            f"{model_settings.MODEL_MAX_BATCH_SIZE} rows",
+        )
+
+    # Validate the rows column by column, one bad row
+    # does not fail the whole batch
+    indices, rows, errors = housing_validator.validate_rows(batch)
+    if drift_monitor is not None and rows:
+        drift_monitor.observe_columns(rows.columns)
+
+    predictions, model = [], ModelVersion()
+    if rows:
+        try:
+            start_time = time.perf_counter()
+            predicted_prices = await score(rows)
+            # Share the round trip time across the rows of the batch
+            inference_time = (time.perf_counter() - start_time) / len(rows)
+        except CircuitOpenError as e:
+            raise service_unavailable(e)
+        except (httpx.HTTPError, ModelResponseError) as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Regression model prediction service error: {e}",
+            )
+
+        await log_writer.write_many(
+            [
+                log_record(
+                    house_data,
+                    prediction_response=price,
+                    inference_time=inference_time,
+                    model_name=predicted_prices.model.name,
+                    model_version=predicted_prices.model.version,
+                )
+                for house_data, price in zip(rows, predicted_prices)
+            ]
+        )
+        model = predicted_prices.model
+        predictions = [
+            {"index": index, "prediction": price}
+            for index, price in zip(indices, predicted_prices)
+        ]
+
+    return {
+        "status": 200,
+        "message": "House price batch prediction completed",
+        "response": {
+            "predictions": predictions,
+            "errors": errors,
+            "unit": "GBP(£)",
+            "model_name": model.name,
+            "model_version": model.version,
+        },
+    }
+
+
+@app.post("/predict/bulk", response_class=BulkStreamingResponse)
+async def get_bulk_prediction(
+    request: Request,
+    score: Scorer = Depends(get_scorer),
+    log_writer: PredictionLogWriter = Depends(get_log_writer),
+    drift_monitor: DriftMonitor | None = Depends(get_drift_monitor),
+):
+    """Get house price predictions for a NDJSON or CSV file of any size.
+
+    The rows are scored as they are uploaded and the results streamed back
+    as NDJSON, one line per row with its `index` and its `prediction`, its
+    validation errors as `detail` or the model `error`. The last line holds
+    the `stats` of the run.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0]
+    bulk_format = BULK_FORMATS.get(media_type.strip().lower())
+    if bulk_format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload the rows as one of " + ", ".join(BULK_FORMATS),
+        )
+    read_rows = read_csv if bulk_format == "csv" else read_ndjson
+
+    def validate_rows(rows: list[Any]):
+        indices, batch, errors = housing_validator.validate_rows(rows)
+        if drift_monitor is not None and batch:
+            drift_monitor.observe_columns(batch.columns)
+        return indices, batch, errors
+
+    async def log_scored(
+        indices: list[int],
+        rows: ColumnBatch,
+        prices: Predictions,
+        inference_time: float,
+    ):
+        await log_writer.write_many(
+            [
+                log_record(
+                    house_data,
+                    prediction_response=price,
+                    inference_time=inference_time,
+                    model_name=prices.model.name,
+                    model_version=prices.model.version,
+                )
+                for house_data, price in zip(rows, prices)
+            ]
+        )
+
+    results = score_stream(
+        read_rows(iter_lines(request.stream())),
+        validate_rows,
+        score,
+        chunk_size=model_settings.MODEL_BULK_CHUNK_SIZE,
+        max_concurrency=model_settings.MODEL_BULK_MAX_CONCURRENCY,
+        on_scored=log_scored,
+    )
+    return BulkStreamingResponse(ndjson_lines(results))
+
+
+class BackendSelection(BaseModel):
+    """Prediction backend to switch to."""
+
+    backend: Literal["remote", "local"]
+
+
+def backend_status(request: Request) -> dict:
+    state = request.app.state
+    return {
+        "backend": state.prediction_backend,
+        "available": ["remote"]
+        + (["local"] if state.local_model is not None else []),
+    }
+
+
+@app.get("/prediction-backend", response_model=ResponseModel)
+def get_prediction_backend(request: Request):
+    """The prediction backend in use and the ones available."""
+    return {
+        "status": 200,
+        "message": "success",
+        "response": backend_status(request),
+    }
+
+
+@app.put("/prediction-backend", response_model=ResponseModel)
+async def set_prediction_backend(
+    selection: BackendSelection,
+    request: Request,
+    cache: PredictionCache | None = Depends(get_cache),
+):
+    """Switches the prediction backend without restarting the service.
+
+    Requests already being scored finish on the previous backend.
+    """
+    state = request.app.state
+    if selection.backend == "local" and state.local_model is None:
+        raise HTTPException(
+            status_code=409,
+            detail="The local backend needs LOCAL_MODEL_PATH to be set",
+        )
+    if selection.backend != state.prediction_backend:
+        state.prediction_backend = selection.backend
+        if cache is not None:
+            # Do not serve the other backend's predictions from the cache
+            await cache.observe_model_version(
+                state.local_model.version
+                if selection.backend == "local"
+                else "remote"
+            )
+    return {
+        "status": 200,
+        "message": "Prediction backend updated",
+        "response": backend_status(request),
+    }
+
+
+def as_utc(value: datetime) -> datetime:
+    """The time in UTC without time zone, like the log timestamps."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def time_range(
+    start: datetime | None, end: datetime | None
+) -> tuple[datetime, datetime]:
+    """The range in UTC, the last day by default."""
+    end = as_utc(end) if end is not None else utc_now()
+    start = as_utc(start) if start is not None else end - timedelta(days=1)
+    return start, end
+
+
+async def read_logs(query: Callable, *args) -> Any:
+    """Runs a query function of `src.analytics` on the async engine."""
+    async with get_async_engine().connect() as connection:
+        return await connection.run_sync(query, *args)
+
+
+@app.get("/analytics/requests", response_model=ResponseModel)
+async def analytics_requests(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bucket: Bucket = "hour",
+):
+    """Requests, cache hits and failures per time bucket.
+
+    Read from the per-minute rollups of the logs, which leave out the logs
+    of the last DB_LOG_ROLLUP_SETTLE_SECONDS and DB_LOG_ROLLUP_INTERVAL.
+    The range is the last day by default.
+    """
+    start, end = time_range(start, end)
+    buckets = await read_logs(request_counts, start, end, bucket)
+    return {
+        "status": 200,
+        "message": "success",
+        "response": {"start": start, "end": end, "buckets": buckets},
+    }
+
+
+async def metric_distribution(
+    metric: Metric,
+    start: datetime | None,
+    end: datetime | None,
+    bucket: Bucket,
+) -> dict:
+    start, end = time_range(start, end)
+    buckets = await read_logs(distribution, metric, start, end, bucket)
+    return {
+        "status": 200,
+        "message": "success",
+        "response": {"start": start, "end": end, "buckets": buckets},
+    }
+
+
+@app.get("/analytics/inference-time", response_model=ResponseModel)
+async def analytics_inference_time(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bucket: Bucket = "hour",
+):
+    """Quantiles of the inference time in seconds per time bucket.
+
+    The quantiles are read from log-scale histograms and are within 5% of
+    the exact ones.
+    """
+    return await metric_distribution("inference_time", start, end, bucket)
+
+
+@app.get("/analytics/predictions", response_model=ResponseModel)
+async def analytics_predictions(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bucket: Bucket = "hour",
+):
+    """Quantiles of the predicted prices per time bucket.
+
+    The quantiles are read from log-scale histograms and are within 5% of
+    the exact ones.
+    """
+    return await metric_distribution("prediction", start, end, bucket)
+
+
+@app.get("/logs/export", response_model=ResponseModel)
+async def export_prediction_logs(
+    cursor: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=10000)] = 1000,
+    start: datetime | None = None,
+    end: datetime | None = None,
+):
+    """Prediction logs after the `cursor` id, in id order.
+
+    Pass the `next_cursor` of the response to get the next page, it is
+    null after the last one.
+    """
+    logs, next_cursor = await read_logs(
+        export_logs,
+        cursor,
+        limit,
+        start and as_utc(start),
+        end and as_utc(end),
+    )
+    return {
+        "status": 200,
+        "message": "success",
+        "response": {"logs": logs, "next_cursor": next_cursor},
+    }
+
+
+@app.get("/drift", response_model=ResponseModel)
+async def get_drift(
+    drift_monitor: DriftMonitor | None = Depends(get_drift_monitor),
+):
+    """Profile of the inputs of the current window of this worker and
+    their drift scores from the reference profile.
+
+    Async so that it reads the profile between two updates.
+    """
+    if drift_monitor is None:
+        raise HTTPException(
+            status_code=404, detail="Drift monitoring is disabled"
+        )
+    return {
+        "status": 200,
+        "message": "Drift of the input features",
+        "response": drift_monitor.report(),
+    }
+
+
+async def check_database():
+    """Checks out a connection from the pool and runs a query."""
+    async with get_async_engine().connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def check_model(state):
+    """Scores the probe input with the prediction backend in use.
+
+    The probe goes around the upstream policy and the prediction metrics,
+    so it never takes the trial call of the circuit breaker nor spends the
+    retry budget, and the model is not ready while the breaker is open.
+    """
+    if state.prediction_backend == "local":
+        local_model = state.local_model
+        await local_model.predict(local_model.columns([PROBE_HOUSE_DATA]))
+        return
+    breaker = state.upstream_policy.breaker
+    if breaker is not None and breaker.state == CircuitBreaker.OPEN:
+        raise CircuitOpenError(
+            breaker.opened_at + breaker.open_seconds - breaker.clock()
+        )
+    replica = state.router.choose()
+    await request_prediction(
+        replica.client, replica.endpoint, state.router.probe_payload
+    )
+
+
+def get_readiness(request: Request) -> ReadinessChecker:
+    """FastAPI endpoint dependency to get the readiness checker."""
+    return request.app.state.readiness
+
 
 @app.get("/health")
 def health_check():
-    """API health check."""
-    # TODO: pass a default valid payload to the
-    #  model prediction service and return it in the response
+    """Liveness probe, answers as long as the app is serving requests."""
     return {"status": 200, "message": "success", "response": None}
 
 
+@app.get("/ready", response_model=ResponseModel)
+async def readiness_check(
+    readiness: ReadinessChecker = Depends(get_readiness),
+):
+    """Readiness probe checking the database and the model.
+
+    Answers 503 when a dependency is not usable. The latency and error of
+    each dependency are in the response.
+    """
+    result = await readiness.check()
+    status = 200 if result["ready"] else 503
+    return JSONResponse(
+        status_code=status,
+        content={
+            "status": status,
+            "message": "ready" if result["ready"] else "not ready",
+            "response": result,
+        },
+    )
+
+
+def collect_component_metrics() -> list[MetricFamily]:
+    """Metrics of the app components, read when `/metrics` is scraped."""
+    state = app.state
+    pool_connections = MetricFamily(
+        "db_pool_connections_checked_out",
+        "Database connections currently checked out of the pool.",
+        "gauge",
+        ["engine"],
+    )
+    families = [pool_connections]
+    if getattr(state, "engine", None) is not None:
+        pool_connections.labels("sync").set(state.engine.pool.checkedout())
+        pool_connections.labels("async").set(
+            state.async_engine.pool.checkedout()
+        )
+    log_writer = getattr(state, "log_writer", None)
+    if log_writer is not None:
+        stats = log_writer.stats()
+        families += [
+            single_value(
+                "prediction_log_queue_depth",
+                "Prediction logs waiting to be written.",
+                "gauge",
+                stats["queue_depth"],
+            ),
+            single_value(
+                "prediction_logs_written_total",
+                "Prediction logs written to the database.",
+                "counter",
+                stats["written"],
+            ),
+            single_value(
+                "prediction_logs_dropped_total",
+                "Prediction logs dropped because the queue was full.",
+                "counter",
+                stats["dropped"],
+            ),
+            single_value(
+                "prediction_logs_failed_total",
+                "Prediction logs that failed to be written.",
+                "counter",
+                stats["failed"],
+            ),
+        ]
+    batcher = getattr(state, "batcher", None)
+    if batcher is not None:
+        families += [
+            single_value(
+                "model_batching_queue_depth",
+                "Rows waiting to be put in a model batch.",
+                "gauge",
+                batcher.queue_depth,
+            ),
+            from_histogram(
+                "model_batch_size_rows",
+                "Number of rows in each model batch.",
+                batcher.batch_size,
+            ),
+            from_histogram(
+                "model_batching_wait_seconds",
+                "Time a row waited before its batch was sent.",
+                batcher.wait_time,
+            ),
+        ]
+    cache = getattr(state, "cache", None)
+    if cache is not None:
+        families += [
+            single_value(
+                "prediction_cache_hits_total",
+                "Predictions served from the cache.",
+                "counter",
+                cache.hits,
+            ),
+            single_value(
+                "prediction_cache_misses_total",
+                "Predictions not found in the cache.",
+                "counter",
+                cache.misses,
+            ),
+        ]
+    single_flight = getattr(state, "single_flight", None)
+    if single_flight is not None:
+        families += [
+            single_value(
+                "model_single_flight_calls_total",
+                "Model calls started by the single-flight group.",
+                "counter",
+                single_flight.calls,
+            ),
+            single_value(
+                "model_single_flight_collapsed_total",
+                "Requests that joined an identical in-flight model call.",
+                "counter",
+                single_flight.collapsed,
+            ),
+        ]
+    router = getattr(state, "router", None)
+    if router is not None:
+        outstanding = MetricFamily(
+            "model_replica_outstanding_requests",
+            "Requests in flight to each model replica.",
+            "gauge",
+            ["endpoint"],
+        )
+        latency = MetricFamily(
+            "model_replica_latency_ewma_seconds",
+            "Moving average latency of each model replica.",
+            "gauge",
+            ["endpoint"],
+        )
+        ejected = MetricFamily(
+            "model_replica_ejected",
+            "1 while the model replica is ejected for failing.",
+            "gauge",
+            ["endpoint"],
+        )
+        requests = MetricFamily(
+            "model_replica_requests_total",
+            "Requests sent to each model replica.",
+            "counter",
+            ["endpoint"],
+        )
+        failures = MetricFamily(
+            "model_replica_failures_total",
+            "Failed requests to each model replica.",
+            "counter",
+            ["endpoint"],
+        )
+        times_ejected = MetricFamily(
+            "model_replica_ejections_total",
+            "Times each model replica was ejected for failing.",
+            "counter",
+            ["endpoint"],
+        )
+        for replica in router.replicas:
+            outstanding.labels(replica.endpoint).set(replica.outstanding)
+            latency.labels(replica.endpoint).set(replica.ewma or 0.0)
+            ejected.labels(replica.endpoint).set(int(replica.ejected))
+            requests.labels(replica.endpoint).inc(replica.requests)
+            failures.labels(replica.endpoint).inc(replica.failures)
+            times_ejected.labels(replica.endpoint).inc(replica.times_ejected)
+        families += [
+            outstanding,
+            latency,
+            ejected,
+            requests,
+            failures,
+            times_ejected,
+        ]
+    policy = getattr(state, "upstream_policy", None)
+    if policy is not None:
+        families += [
+            single_value(
+                "model_retries_total",
+                "Retries of failed model requests.",
+                "counter",
+                policy.retries,
+            ),
+            single_value(
+                "model_hedged_requests_total",
+                "Second model requests sent for slow requests.",
+                "counter",
+                policy.hedges,
+            ),
+            single_value(
+                "model_hedge_wins_total",
+                "Hedged requests answering before the first request.",
+                "counter",
+                policy.hedge_wins,
+            ),
+            single_value(
+                "model_attempt_timeouts_total",
+                "Model request attempts cancelled by the attempt timeout.",
+                "counter",
+                policy.timeouts,
+            ),
+        ]
+        if policy.breaker is not None:
+            families += [
+                single_value(
+                    "model_circuit_breaker_open",
+                    "1 while the circuit breaker is open, 0.5 half-open.",
+                    "gauge",
+                    {"closed": 0, "half_open": 0.5, "open": 1}[
+                        policy.breaker.state
+                    ],
+                ),
+                single_value(
+                    "model_circuit_breaker_rejected_total",
+                    "Requests failed fast while the circuit was open.",
+                    "counter",
+                    policy.breaker.rejected,
+                ),
+                single_value(
+                    "model_circuit_breaker_opened_total",
+                    "Times the circuit breaker opened.",
+                    "counter",
+                    policy.breaker.times_opened,
+                ),
+            ]
+    return families
+
+
+REGISTRY.add_collector(collect_component_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics of the service."""
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.post("/data", response_model=ResponseModel)
 def get_data(house_data: HousingData):
     """A test endpoint to see the formatted data passed."""
@@ -0,0 +1,309 @@
+"""In-process metric primitives for the service.
+
+Metrics are plain counters updated on the request path and only formatted
+in the Prometheus text format when `/metrics` is scraped, so recording a
+value costs an addition (and a bisect for histograms).
+"""
+
+import bisect
+import time
+from typing import Callable, Iterable, Sequence
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down."""
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds, Prometheus-style."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """Records one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "Timer":
+        """Context manager observing the duration of the block."""
+        return Timer(self)
+
+    def snapshot(self) -> dict:
+        """Returns the cumulative bucket counts, sum and count."""
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class Timer:
+    """Observes the time spent in a `with` block in a histogram."""
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace('"', '\\"'),
+        )
+        for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+class MetricFamily:
+    """Metric with a value per combination of label values."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        label_names: Sequence[str] = (),
+        factory: Callable[[], Counter | Gauge | Histogram] | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = tuple(label_names)
+        self.factory = (
+            factory
+            or {
+                "counter": Counter,
+                "gauge": Gauge,
+                "histogram": Histogram,
+            }[metric_type]
+        )
+        self.children: dict[tuple, Counter | Gauge | Histogram] = {}
+
+    def labels(self, *values):
+        """Returns the metric for the label values, created on first use."""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(
+                    f"{self.name} expects labels {self.label_names}"
+                )
+            child = self.children[values] = self.factory()
+        return child
+
+    def render(self) -> Iterable[str]:
+        """Lines of the family in the Prometheus text format."""
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.metric_type}"
+        for values, child in list(self.children.items()):
+            labels = dict(zip(self.label_names, values))
+            if isinstance(child, Histogram):
+                cumulative = 0
+                for bound, count in zip(
+                    (*child.buckets, "+Inf"), child.counts
+                ):
+                    cumulative += count
+                    bucket_labels = _format_labels({**labels, "le": bound})
+                    yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+                series_labels = _format_labels(labels)
+                yield f"{self.name}_sum{series_labels} {child.sum}"
+                yield f"{self.name}_count{series_labels} {child.count}"
+            else:
+                yield f"{self.name}{_format_labels(labels)} {child.value}"
+
+
+def single_value(
+    name: str, documentation: str, metric_type: str, value: float
+) -> MetricFamily:
+    """Family with one unlabelled value, for metrics read at scrape time."""
+    family = MetricFamily(name, documentation, metric_type)
+    family.labels().value = value
+    return family
+
+
+def from_histogram(
+    name: str, documentation: str, histogram: Histogram
+) -> MetricFamily:
+    """Family exposing a histogram kept by another component."""
+    family = MetricFamily(name, documentation, "histogram")
+    family.children[()] = histogram
+    return family
+
+
+class Registry:
+    """Collection of the metrics exposed at `/metrics`.
+
+    Besides the families registered up front, collectors are called at
+    scrape time to build families from state kept elsewhere.
+    """
+
+    def __init__(self):
+        self.families: dict[str, MetricFamily] = {}
+        self.collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+    def _register(self, family: MetricFamily) -> MetricFamily:
+        if family.name in self.families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self.families[family.name] = family
+        return family
+
+    def counter(self, name, documentation, label_names=()) -> MetricFamily:
+        return self._register(
+            MetricFamily(name, documentation, "counter", label_names)
+        )
+
+    def gauge(self, name, documentation, label_names=()) -> MetricFamily:
+        return self._register(
+            MetricFamily(name, documentation, "gauge", label_names)
+        )
+
+    def histogram(
+        self,
+        name,
+        documentation,
+        label_names=(),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> MetricFamily:
+        return self._register(
+            MetricFamily(
+                name,
+                documentation,
+                "histogram",
+                label_names,
+                factory=lambda: Histogram(buckets),
+            )
+        )
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """All the metrics in the Prometheus text format."""
+        families = list(self.families.values())
+        for collector in self.collectors:
+            families.extend(collector())
+        lines = [line for family in families for line in family.render()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+PREDICTION_STAGE_SECONDS = REGISTRY.histogram(
+    "prediction_stage_duration_seconds",
+    "Time spent in each stage of the prediction pipeline.",
+    ["stage"],
+)
+MODEL_UPSTREAM_ERRORS = REGISTRY.counter(
+    "model_upstream_errors_total",
+    "Failed requests to the model server by type of error.",
+    ["type"],
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Total time to serve a request, by path.",
+    ["method", "path", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "Requests currently being served."
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording in-flight requests and request durations.
+
+    The start time is stored in the request state as `start_time`, so the
+    endpoints can measure the time spent before they are called. For the
+    `pipeline_paths` the request duration is also recorded as the `total`
+    stage of the prediction pipeline.
+    """
+
+    def __init__(self, app, pipeline_paths: Sequence[str] = ()):
+        self.app = app
+        self.pipeline_paths = frozenset(pipeline_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        scope.setdefault("state", {})["start_time"] = start_time
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels()
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            duration = time.perf_counter() - start_time
+            # Unknown paths share one label to bound the number of series
+            path = scope["path"] if status != 404 else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], path, status).observe(
+                duration
+            )
+            if path in self.pipeline_paths:
+                PREDICTION_STAGE_SECONDS.labels("total").observe(duration)
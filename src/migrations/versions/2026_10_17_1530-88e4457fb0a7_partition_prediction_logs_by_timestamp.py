@@ -0,0 +1,178 @@
+"""Partition prediction_logs by timestamp
+
+Revision ID: 88e4457fb0a7
+Revises: e9c0d9c03fe1
+Create Date: 2026-10-17 15:30:12.408131
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "88e4457fb0a7"
+down_revision: Union[str, None] = "e9c0d9c03fe1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created in advance, the service keeps creating them
+DAYS_AHEAD = 7
+LOG_COLUMNS = (
+    "mainroad, guestroom, basement, hotwaterheating, airconditioning, "
+    "prefarea, furnishingstatus, area, bedrooms, bathrooms, stories, "
+    "parking, prediction_response, inference_time, cache_hit"
+)
+
+
+def create_daily_partition(day: date) -> None:
+    op.execute(
+        f"CREATE TABLE prediction_logs_p{day:%Y%m%d} "
+        "PARTITION OF prediction_logs "
+        f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+    )
+
+
+def upgrade() -> None:
+    op.drop_index("ix_prediction_logs_id", table_name="prediction_logs")
+    op.rename_table("prediction_logs", "prediction_logs_old")
+    op.execute(
+        "ALTER SEQUENCE prediction_logs_id_seq "
+        "RENAME TO prediction_logs_old_id_seq"
+    )
+    op.execute(
+        "ALTER TABLE prediction_logs_old "
+        "RENAME CONSTRAINT prediction_logs_pkey TO prediction_logs_old_pkey"
+    )
+
+    op.create_table(
+        "prediction_logs",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("mainroad", sa.String(), nullable=False),
+        sa.Column("guestroom", sa.String(), nullable=False),
+        sa.Column("basement", sa.String(), nullable=False),
+        sa.Column("hotwaterheating", sa.String(), nullable=False),
+        sa.Column("airconditioning", sa.String(), nullable=False),
+        sa.Column("prefarea", sa.String(), nullable=False),
+        sa.Column("furnishingstatus", sa.String(), nullable=False),
+        sa.Column("area", sa.Float(), nullable=False),
+        sa.Column("bedrooms", sa.Integer(), nullable=False),
+        sa.Column("bathrooms", sa.Integer(), nullable=False),
+        sa.Column("stories", sa.Integer(), nullable=False),
+        sa.Column("parking", sa.Integer(), nullable=False),
+        sa.Column("prediction_response", sa.Float(), nullable=True),
+        sa.Column(
+            "timestamp",
+            sa.DateTime(),
+            server_default=sa.text("(now() AT TIME ZONE 'utc')"),
+            nullable=False,
+        ),
+        sa.Column("inference_time", sa.Float(), nullable=True),
+        sa.Column(
+            "cache_hit",
+            sa.Boolean(),
+            server_default=sa.text("false"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.create_index(
+        op.f("ix_prediction_logs_timestamp"),
+        "prediction_logs",
+        ["timestamp"],
+        unique=False,
+    )
+
+    # One partition per day from the oldest log to the coming days. There
+    # is no default partition, as it would prevent detaching the expired
+    # partitions concurrently
+    today = datetime.now(timezone.utc).date()
+    oldest, newest = (
+        op.get_bind()
+        .execute(
+            sa.text(
+                "SELECT min(timestamp), max(timestamp) "
+                "FROM prediction_logs_old"
+            )
+        )
+        .one()
+    )
+    day = min(oldest.date(), today) if oldest is not None else today
+    last_day = today + timedelta(days=DAYS_AHEAD)
+    if newest is not None:
+        last_day = max(newest.date(), last_day)
+    while day <= last_day:
+        create_daily_partition(day)
+        day += timedelta(days=1)
+
+    # The logs written without a timestamp are dated to the migration
+    op.execute(
+        f"INSERT INTO prediction_logs (id, timestamp, {LOG_COLUMNS}) "
+        "OVERRIDING SYSTEM VALUE "
+        "SELECT id, COALESCE(timestamp, now() AT TIME ZONE 'utc'), "
+        f"{LOG_COLUMNS} FROM prediction_logs_old"
+    )
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('prediction_logs', 'id'), "
+        "COALESCE((SELECT max(id) FROM prediction_logs), 0) + 1, false)"
+    )
+    op.drop_table("prediction_logs_old")
+
+
+def downgrade() -> None:
+    op.rename_table("prediction_logs", "prediction_logs_partitioned")
+    op.execute(
+        "ALTER SEQUENCE prediction_logs_id_seq "
+        "RENAME TO prediction_logs_partitioned_id_seq"
+    )
+    op.execute(
+        "ALTER TABLE prediction_logs_partitioned RENAME CONSTRAINT "
+        "prediction_logs_pkey TO prediction_logs_partitioned_pkey"
+    )
+    op.execute(
+        "ALTER INDEX ix_prediction_logs_timestamp "
+        "RENAME TO ix_prediction_logs_partitioned_timestamp"
+    )
+
+    op.create_table(
+        "prediction_logs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("mainroad", sa.String(), nullable=False),
+        sa.Column("guestroom", sa.String(), nullable=False),
+        sa.Column("basement", sa.String(), nullable=False),
+        sa.Column("hotwaterheating", sa.String(), nullable=False),
+        sa.Column("airconditioning", sa.String(), nullable=False),
+        sa.Column("prefarea", sa.String(), nullable=False),
+        sa.Column("furnishingstatus", sa.String(), nullable=False),
+        sa.Column("area", sa.Float(), nullable=False),
+        sa.Column("bedrooms", sa.Integer(), nullable=False),
+        sa.Column("bathrooms", sa.Integer(), nullable=False),
+        sa.Column("stories", sa.Integer(), nullable=False),
+        sa.Column("parking", sa.Integer(), nullable=False),
+        sa.Column("prediction_response", sa.Float(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.Column("inference_time", sa.Float(), nullable=True),
+        sa.Column(
+            "cache_hit",
+            sa.Boolean(),
+            server_default=sa.text("false"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_prediction_logs_id"), "prediction_logs", ["id"], unique=False
+    )
+    op.execute(
+        f"INSERT INTO prediction_logs (id, timestamp, {LOG_COLUMNS}) "
+        f"SELECT id, timestamp, {LOG_COLUMNS} "
+        "FROM prediction_logs_partitioned"
+    )
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('prediction_logs', 'id'), "
+        "COALESCE((SELECT max(id) FROM prediction_logs), 0) + 1, false)"
+    )
+    # Drops the partitions with it
+    op.drop_table("prediction_logs_partitioned")
@@ -0,0 +1,51 @@
+"""Add model_name and model_version columns to prediction_logs
+
+Revision ID: 06af86d58c89
+Revises: 88e4457fb0a7
+Create Date: 2026-10-17 18:30:41.215930
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "06af86d58c89"
+down_revision: Union[str, None] = "88e4457fb0a7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "prediction_logs", sa.Column("model_name", sa.String(), nullable=True)
+    )
+    op.add_column(
+        "prediction_logs",
+        sa.Column("model_version", sa.String(), nullable=True),
+    )
+    # Created on each daily partition too
+    op.create_index(
+        op.f("ix_prediction_logs_model_name"),
+        "prediction_logs",
+        ["model_name"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_prediction_logs_model_version"),
+        "prediction_logs",
+        ["model_version"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_prediction_logs_model_version"), table_name="prediction_logs"
+    )
+    op.drop_index(
+        op.f("ix_prediction_logs_model_name"), table_name="prediction_logs"
+    )
+    op.drop_column("prediction_logs", "model_version")
+    op.drop_column("prediction_logs", "model_name")
@@ -0,0 +1,54 @@
+"""Add rollup tables of prediction_logs
+
+Revision ID: 5b1f7d2c9e43
+Revises: 06af86d58c89
+Create Date: 2026-10-17 20:10:27.631044
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5b1f7d2c9e43"
+down_revision: Union[str, None] = "06af86d58c89"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "prediction_logs_minutes",
+        sa.Column("minute", sa.DateTime(), nullable=False),
+        sa.Column("requests", sa.BigInteger(), nullable=False),
+        sa.Column("cache_hits", sa.BigInteger(), nullable=False),
+        sa.Column("failures", sa.BigInteger(), nullable=False),
+        sa.Column("inference_time_count", sa.BigInteger(), nullable=False),
+        sa.Column("inference_time_sum", sa.Float(), nullable=False),
+        sa.Column("prediction_sum", sa.Float(), nullable=False),
+        sa.Column("prediction_min", sa.Float(), nullable=True),
+        sa.Column("prediction_max", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("minute"),
+    )
+    op.create_table(
+        "prediction_logs_minute_histograms",
+        sa.Column("minute", sa.DateTime(), nullable=False),
+        sa.Column("metric", sa.String(), nullable=False),
+        sa.Column("bin", sa.Integer(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("minute", "metric", "bin"),
+    )
+    op.create_table(
+        "rollup_watermarks",
+        sa.Column("source_table", sa.String(), nullable=False),
+        sa.Column("last_id", sa.BigInteger(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("source_table"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup_watermarks")
+    op.drop_table("prediction_logs_minute_histograms")
+    op.drop_table("prediction_logs_minutes")
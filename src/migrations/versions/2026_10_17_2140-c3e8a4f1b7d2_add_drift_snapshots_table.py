@@ -0,0 +1,43 @@
+"""Add drift_snapshots table
+
+Revision ID: c3e8a4f1b7d2
+Revises: 5b1f7d2c9e43
+Create Date: 2026-10-17 21:40:12.408513
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c3e8a4f1b7d2"
+down_revision: Union[str, None] = "5b1f7d2c9e43"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "drift_snapshots",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("ended_at", sa.DateTime(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column("profile", sa.JSON(), nullable=False),
+        sa.Column("scores", sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_drift_snapshots_ended_at"),
+        "drift_snapshots",
+        ["ended_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_drift_snapshots_ended_at"), table_name="drift_snapshots"
+    )
+    op.drop_table("drift_snapshots")
@@ -0,0 +1,158 @@
+"""HTTP client for the regression model prediction service."""
+
+import importlib.util
+import json
+from typing import Iterable, NamedTuple
+
+import httpx
+import numpy as np
+
+from src.encoder import NUMPY_DTYPES
+from src.utils import ModelSettings, model_settings
+
+# Length of the JSON header of a body using binary tensor data
+HEADER_LENGTH = "Inference-Header-Content-Length"
+
+
+class ModelResponseError(Exception):
+    """The model response does not match the request."""
+
+
+class ModelVersion(NamedTuple):
+    """Model that scored a request, None when the server does not tell."""
+
+    name: str | None = None
+    version: str | None = None
+
+
+class Predictions(list):
+    """Prices of the rows of a request, with the model that scored them."""
+
+    def __init__(
+        self,
+        prices: Iterable[float] = (),
+        model: ModelVersion = ModelVersion(),
+    ):
+        super().__init__(prices)
+        self.model = model
+
+
+def error_type(error: Exception) -> str:
+    """Short name of a model request error, used as a metric label."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    return type(error).__name__
+
+
+def http2_available() -> bool:
+    """Checks whether the optional `h2` package is installed."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client(
+    config: ModelSettings = model_settings,
+) -> httpx.AsyncClient:
+    """Creates the shared keep-alive client for the model server.
+
+    A single client is created for the lifetime of the app so that the
+    connections to the model server are pooled and reused instead of
+    opening a new TCP/TLS connection for every prediction.
+    """
+    limits = httpx.Limits(
+        max_connections=config.MODEL_POOL_SIZE,
+        max_keepalive_connections=config.MODEL_POOL_KEEPALIVE,
+        keepalive_expiry=config.MODEL_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        connect=config.MODEL_CONNECT_TIMEOUT,
+        read=config.MODEL_READ_TIMEOUT,
+        write=config.MODEL_READ_TIMEOUT,
+        pool=config.MODEL_POOL_TIMEOUT,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=config.MODEL_HTTP2 and http2_available(),
+        headers={"Content-Type": "application/json"},
+    )
+
+
+def decode_binary_response(body: bytes, header_length: int) -> dict:
+    """Parses a response using the binary tensor data extension.
+
+    The binary outputs are NumPy arrays reading the response body in place,
+    set as the `data` of their output.
+    """
+    response = json.loads(body[:header_length])
+    offset = header_length
+    for output in response.get("outputs", []):
+        size = output.get("parameters", {}).get("binary_data_size")
+        if size is None:
+            continue
+        dtype = NUMPY_DTYPES.get(output["datatype"])
+        if dtype is None:
+            raise ModelResponseError(
+                f"unsupported binary output datatype {output['datatype']}"
+            )
+        if offset + size > len(body):
+            raise ModelResponseError("binary output exceeds the response")
+        output["data"] = np.frombuffer(
+            body,
+            dtype=dtype,
+            count=size // np.dtype(dtype).itemsize,
+            offset=offset,
+        )
+        offset += size
+    return response
+
+
+async def request_prediction(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    payload: dict | bytes,
+    header_length: int | None = None,
+) -> dict:
+    """Sends a KServe v2 payload to the model and returns the response.
+
+    The payload is either a dict or a request body already encoded as JSON.
+    With a `header_length` the body is a JSON header of that length followed
+    by binary tensor data, binary outputs in the response are returned as
+    NumPy arrays.
+    """
+    if header_length is not None:
+        response = await client.post(
+            endpoint,
+            content=payload,
+            headers={
+                "Content-Type": "application/octet-stream",
+                HEADER_LENGTH: str(header_length),
+            },
+        )
+    elif isinstance(payload, bytes):
+        response = await client.post(endpoint, content=payload)
+    else:
+        response = await client.post(endpoint, json=payload)
+    response.raise_for_status()
+    if HEADER_LENGTH in response.headers:
+        return decode_binary_response(
+            response.content, int(response.headers[HEADER_LENGTH])
+        )
+    return response.json()
+
+
+async def request_metadata(client: httpx.AsyncClient, endpoint: str) -> dict:
+    """Gets the KServe v2 metadata of a model, with its name and versions."""
+    response = await client.get(endpoint)
+    response.raise_for_status()
+    return response.json()
+
+
+def metadata_endpoint(endpoint: str) -> str | None:
+    """Metadata endpoint of a KServe v2 `.../infer` endpoint, None for others.
+
+    The metadata of `/v2/models/{name}[/versions/{version}]/infer` is read
+    from the same path without `/infer`.
+    """
+    if endpoint.rstrip("/").endswith("/infer"):
+        return endpoint.rstrip("/").removesuffix("/infer")
+    return None
@@ -0,0 +1,405 @@
+"""Timeouts, retries, hedging and circuit breaking of the model requests."""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+from src.utils import ModelSettings, model_settings
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open, the model server is not called."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"model service unavailable, retry in {retry_after:.1f}s"
+        )
+        self.retry_after = retry_after
+
+
+class AttemptTimeout(httpx.TimeoutException):
+    """A model request took longer than the attempt timeout."""
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Whether the error means the model server is unhealthy.
+
+    Connection errors, timeouts and 5xx responses count as failures and are
+    retried, 4xx responses are the request's fault.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class RollingCounts:
+    """Two counters over a sliding window, kept in one-second buckets."""
+
+    def __init__(self, window_seconds: float, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self._buckets: deque[list] = deque()
+
+    def _current(self) -> list:
+        second = int(self.clock())
+        while self._buckets and (
+            self._buckets[0][0] <= second - self.window_seconds
+        ):
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        return self._buckets[-1]
+
+    def add(self, first: int = 0, second: int = 0):
+        bucket = self._current()
+        bucket[1] += first
+        bucket[2] += second
+
+    def totals(self) -> tuple[int, int]:
+        self._current()
+        return (
+            sum(bucket[1] for bucket in self._buckets),
+            sum(bucket[2] for bucket in self._buckets),
+        )
+
+    def clear(self):
+        self._buckets.clear()
+
+
+class CircuitBreaker:
+    """Stops calling the model server while most of the calls fail.
+
+    The breaker opens when at least `min_calls` calls were made in the last
+    `window_seconds` and the share of failures reaches `failure_rate`.
+    While open the calls fail fast, after `open_seconds` it lets
+    `half_open_calls` trial calls through, closing again if they succeed
+    and reopening on a failure.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 20,
+        window_seconds: float = 10.0,
+        open_seconds: float = 5.0,
+        half_open_calls: int = 1,
+        clock=time.monotonic,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.clock = clock
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trials = 0
+        # Counts of (calls, failures)
+        self._window = RollingCounts(window_seconds, clock)
+
+    def allow(self):
+        """Raises `CircuitOpenError` if a call cannot be made now."""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.open_seconds - self.clock()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(remaining)
+            self.state = self.HALF_OPEN
+            self._trials = 0
+        if self.state == self.HALF_OPEN:
+            if self._trials >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.open_seconds)
+            self._trials += 1
+
+    def release(self):
+        """Gives back the slot of a call cancelled before it finished."""
+        if self.state == self.HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def record_success(self):
+        if self.state == self.HALF_OPEN:
+            self.state = self.CLOSED
+            self._window.clear()
+        self._window.add(1, 0)
+
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        self._window.add(1, 1)
+        calls, failures = self._window.totals()
+        if (
+            self.state == self.CLOSED
+            and calls >= self.min_calls
+            and failures / calls >= self.failure_rate
+        ):
+            self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self.times_opened += 1
+
+    def stats(self) -> dict:
+        calls, failures = self._window.totals()
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "failure_rate": failures / calls if calls else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """Caps the retries to a share of the requests.
+
+    Over the last `window_seconds`, retries are allowed while they stay
+    under `ratio` of the requests plus `min_per_second` per second, so a
+    failing model server gets little extra load from the retries.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        min_per_second: float = 5.0,
+        window_seconds: float = 10.0,
+        clock=time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_retries = min_per_second * window_seconds
+        # Counts of (requests, retries)
+        self._window = RollingCounts(window_seconds, clock)
+
+    def deposit(self):
+        """Records a request."""
+        self._window.add(1, 0)
+
+    def withdraw(self) -> bool:
+        """Records a retry if the budget allows it."""
+        requests, retries = self._window.totals()
+        if retries >= self.ratio * requests + self.min_retries:
+            return False
+        self._window.add(0, 1)
+        return True
+
+
+class LatencyTracker:
+    """Quantile of the latency of the recent successful attempts."""
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        samples: int = 1000,
+        min_samples: int = 20,
+        refresh_every: int = 50,
+    ):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._samples: deque[float] = deque(maxlen=samples)
+        self._since_refresh = 0
+        self._value: float | None = None
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._value is None or self._since_refresh >= self.refresh_every:
+            self._refresh()
+
+    def _refresh(self):
+        self._since_refresh = 0
+        if len(self._samples) < self.min_samples:
+            return
+        ordered = sorted(self._samples)
+        self._value = ordered[int(self.quantile * (len(ordered) - 1))]
+
+    @property
+    def value(self) -> float | None:
+        """The quantile in seconds, None until there are enough samples."""
+        return self._value
+
+
+class UpstreamPolicy:
+    """Runs the model requests with timeouts, retries, hedging and a breaker.
+
+    Each attempt is cancelled after `attempt_timeout` seconds. Failed
+    attempts are retried up to `max_retries` times, within the retry
+    budget, after a random backoff of up to `backoff_base` doubled at each
+    retry and capped at `backoff_max` seconds. With `hedging` a second
+    attempt is started when the first one is slower than the recent p95
+    latency (and at least `hedge_min_delay`), the first answer wins.
+    """
+
+    def __init__(
+        self,
+        breaker: CircuitBreaker | None = None,
+        budget: RetryBudget | None = None,
+        attempt_timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.05,
+        backoff_max: float = 1.0,
+        hedging: bool = False,
+        hedge_min_delay: float = 0.01,
+        latency: LatencyTracker | None = None,
+    ):
+        self.breaker = breaker
+        self.budget = budget or RetryBudget()
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = latency or LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter backoff before the retry, starting at 1."""
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** (retry - 1))
+        return random.uniform(0, ceiling)
+
+    def hedge_delay(self) -> float | None:
+        """Delay before hedging, None until the p95 latency is known."""
+        if self.latency.value is None:
+            return None
+        return max(self.latency.value, self.hedge_min_delay)
+
+    async def call(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Calls `attempt` until it succeeds or the retries are exhausted."""
+        if self.breaker is not None:
+            self.breaker.allow()
+        self.budget.deposit()
+        retries = 0
+        while True:
+            try:
+                if self.hedging:
+                    return await self._hedged(attempt)
+                return await self._attempt(attempt)
+            except Exception as e:
+                if (
+                    not is_upstream_failure(e)
+                    or retries >= self.max_retries
+                    or not self.budget.withdraw()
+                ):
+                    raise
+            retries += 1
+            self.retries += 1
+            await asyncio.sleep(self.backoff(retries))
+            # Stop retrying as soon as the circuit opens
+            if self.breaker is not None:
+                self.breaker.allow()
+
+    async def _attempt(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        start_time = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(attempt(), self.attempt_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise AttemptTimeout(
+                f"model did not answer within {self.attempt_timeout}s"
+            ) from None
+        except asyncio.CancelledError:
+            # The outcome is unknown, let another trial call through
+            if self.breaker is not None:
+                self.breaker.release()
+            raise
+        except Exception as e:
+            if self.breaker is not None:
+                if is_upstream_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        self.latency.observe(time.perf_counter() - start_time)
+        return result
+
+    async def _hedged(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        tasks = [asyncio.ensure_future(self._attempt(attempt))]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                # Hedges are extra load, they are paid from the retry budget
+                if not done and self.budget.withdraw():
+                    self.hedges += 1
+                    tasks.append(asyncio.ensure_future(self._attempt(attempt)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "circuit_breaker": (
+                self.breaker.stats() if self.breaker is not None else None
+            ),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "attempt_timeouts": self.timeouts,
+            "hedge_delay_ms": (
+                None
+                if self.hedge_delay() is None
+                else self.hedge_delay() * 1000
+            ),
+        }
+
+
+def create_upstream_policy(
+    config: ModelSettings = model_settings,
+) -> UpstreamPolicy:
+    """Creates the policy for the model requests configured in the settings."""
+    breaker = None
+    if config.MODEL_CIRCUIT_BREAKER_ENABLED:
+        breaker = CircuitBreaker(
+            failure_rate=config.MODEL_CIRCUIT_FAILURE_RATE,
+            min_calls=config.MODEL_CIRCUIT_MIN_CALLS,
+            window_seconds=config.MODEL_CIRCUIT_WINDOW_SECONDS,
+            open_seconds=config.MODEL_CIRCUIT_OPEN_SECONDS,
+        )
+    return UpstreamPolicy(
+        breaker=breaker,
+        budget=RetryBudget(
+            ratio=config.MODEL_RETRY_BUDGET_RATIO,
+            min_per_second=config.MODEL_RETRY_MIN_PER_SECOND,
+        ),
+        attempt_timeout=config.MODEL_ATTEMPT_TIMEOUT,
+        max_retries=config.MODEL_MAX_RETRIES,
+        backoff_base=config.MODEL_RETRY_BACKOFF_MS / 1000,
+        backoff_max=config.MODEL_RETRY_BACKOFF_MAX_MS / 1000,
+        hedging=config.MODEL_HEDGING_ENABLED,
+        hedge_min_delay=config.MODEL_HEDGE_MIN_DELAY_MS / 1000,
+    )
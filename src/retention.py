@@ -0,0 +1,256 @@
+"""Daily partitions of the prediction logs and their retention.
+
+The `prediction_logs` table is partitioned by range of `timestamp`, with
+one partition per UTC day. Partitions are created ahead of time, and the
+expired ones are detached concurrently and dropped as a whole instead of
+deleting their rows, which leaves no dead rows behind and does not block
+the writes of the logs.
+
+Run once with `python -m src.retention`, the service also runs it
+periodically while it is up.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import Connection, create_engine, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.utils import settings
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "prediction_logs"
+# Key of the advisory lock taken while maintaining the partitions, so that
+# replicas of the service do not do it at the same time
+MAINTENANCE_LOCK_ID = 0x5052454C4F4753
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def partition_name(day: date, table: str = PARENT_TABLE) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def list_partitions(
+    connection: Connection, table: str = PARENT_TABLE
+) -> dict[str, tuple[date, bool]]:
+    """The daily partitions of the table with their day, by name.
+
+    The flag is set for the partitions with a detach left unfinished.
+    """
+    rows = connection.execute(
+        text(
+            "SELECT child.relname, pg_inherits.inhdetachpending "
+            "FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = :parent"
+        ),
+        {"parent": table},
+    )
+    partitions = {}
+    for name, detach_pending in rows:
+        suffix = name.removeprefix(f"{table}_p")
+        if suffix != name and len(suffix) == 8 and suffix.isdigit():
+            day = datetime.strptime(suffix, "%Y%m%d").date()
+            partitions[name] = (day, detach_pending)
+    return partitions
+
+
+def create_partition(
+    connection: Connection, day: date, table: str = PARENT_TABLE
+):
+    """Creates the partition of the day.
+
+    The partition is created apart and then attached, which only needs a
+    lock that lets the logs be written meanwhile.
+    """
+    name = partition_name(day, table)
+    connection.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} "
+            f"(LIKE {table} INCLUDING DEFAULTS)"
+        )
+    )
+    connection.execute(
+        text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+        )
+    )
+
+
+def create_partitions(
+    connection: Connection,
+    first_day: date,
+    last_day: date,
+    table: str = PARENT_TABLE,
+) -> list[str]:
+    """Creates the missing daily partitions from `first_day` to `last_day`."""
+    existing = list_partitions(connection, table)
+    created = []
+    day = first_day
+    while day <= last_day:
+        if partition_name(day, table) not in existing:
+            create_partition(connection, day, table)
+            created.append(partition_name(day, table))
+        day += timedelta(days=1)
+    return created
+
+
+def drop_partitions_before(
+    connection: Connection, cutoff: date, table: str = PARENT_TABLE
+) -> list[str]:
+    """Drops the daily partitions of the days before `cutoff`.
+
+    Each partition is detached concurrently first, so that the logs can
+    still be written while it is removed, a detach interrupted earlier is
+    finished instead. Needs a connection in autocommit mode.
+    """
+    dropped = []
+    for name, (day, detach_pending) in sorted(
+        list_partitions(connection, table).items()
+    ):
+        if day >= cutoff:
+            continue
+        mode = "FINALIZE" if detach_pending else "CONCURRENTLY"
+        connection.execute(
+            text(f"ALTER TABLE {table} DETACH PARTITION {name} {mode}")
+        )
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+
+def maintain_partitions(
+    connection: Connection,
+    today: date,
+    days_ahead: int,
+    retention_days: int,
+    lock_timeout: float = 5.0,
+    table: str = PARENT_TABLE,
+) -> dict:
+    """Creates the coming partitions and drops the expired ones.
+
+    With a `retention_days` of 0 the logs are kept forever. Nothing is done
+    when another process is maintaining the partitions. Statements waiting
+    more than `lock_timeout` seconds for a lock fail rather than holding up
+    the writes queued behind them. Needs a connection in autocommit mode.
+    """
+    locked = connection.execute(
+        text("SELECT pg_try_advisory_lock(:lock_id)"),
+        {"lock_id": MAINTENANCE_LOCK_ID},
+    ).scalar()
+    if not locked:
+        return {"created": [], "dropped": [], "skipped": True}
+    connection.execute(text(f"SET lock_timeout = {int(lock_timeout * 1000)}"))
+    try:
+        created = create_partitions(
+            connection, today, today + timedelta(days=days_ahead), table
+        )
+        dropped = []
+        if retention_days > 0:
+            dropped = drop_partitions_before(
+                connection, today - timedelta(days=retention_days), table
+            )
+    finally:
+        connection.execute(text("RESET lock_timeout"))
+        connection.execute(
+            text("SELECT pg_advisory_unlock(:lock_id)"),
+            {"lock_id": MAINTENANCE_LOCK_ID},
+        )
+    return {"created": created, "dropped": dropped, "skipped": False}
+
+
+class PartitionMaintainer:
+    """Maintains the partitions every `interval` seconds in the background."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        interval: float = 3600.0,
+        days_ahead: int = 7,
+        retention_days: int = 0,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.days_ahead = days_ahead
+        self.retention_days = retention_days
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Starts maintaining, must be called inside the event loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> dict:
+        async with self.engine.connect() as connection:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            result = await connection.run_sync(
+                maintain_partitions,
+                utc_today(),
+                self.days_ahead,
+                self.retention_days,
+            )
+        if result["created"] or result["dropped"]:
+            logger.info(
+                "Created partitions %s, dropped partitions %s",
+                result["created"],
+                result["dropped"],
+            )
+        return result
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Maintaining the log partitions failed")
+            await asyncio.sleep(self.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=settings.DB_LOG_RETENTION_DAYS,
+        help="days of logs to keep, 0 to keep them all",
+    )
+    parser.add_argument(
+        "--days-ahead",
+        type=int,
+        default=settings.DB_LOG_PARTITION_DAYS_AHEAD,
+        help="days of partitions to create in advance",
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, isolation_level="AUTOCOMMIT")
+    with engine.connect() as connection:
+        result = maintain_partitions(
+            connection, utc_today(), args.days_ahead, args.retention_days
+        )
+    print(
+        f"created {len(result['created'])} partitions, "
+        f"dropped {len(result['dropped'])} partitions"
+        + (" (skipped, maintenance in progress)" if result["skipped"] else "")
+    )
+    for name in result["dropped"]:
+        print(f"dropped {name}")
+
+
+if __name__ == "__main__":
+    main()
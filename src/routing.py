@@ -0,0 +1,298 @@
+"""Routing of the model requests across the model server replicas."""
+
+import asyncio
+import logging
+import time
+from typing import Literal
+
+import httpx
+
+from src.model_client import (
+    create_http_client,
+    metadata_endpoint,
+    request_metadata,
+    request_prediction,
+)
+from src.resilience import is_upstream_failure
+from src.utils import ModelSettings, model_settings
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """One model server endpoint with its own connection pool."""
+
+    def __init__(self, endpoint: str, client: httpx.AsyncClient):
+        self.endpoint = endpoint
+        self.client = client
+        self.outstanding = 0
+        # Moving average of the latency in seconds, None until measured
+        self.ewma: float | None = None
+        self.consecutive_failures = 0
+        self.ejected = False
+        self.ejected_at = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.times_ejected = 0
+        # Model name and version read from the metadata endpoint, cached
+        self.metadata: dict | None = None
+        self.metadata_expires_at = 0.0
+        self.metadata_lookup: asyncio.Task | None = None
+
+    def stats(self) -> dict:
+        return {
+            "endpoint": self.endpoint,
+            "outstanding": self.outstanding,
+            "ewma_ms": None if self.ewma is None else self.ewma * 1000,
+            "ejected": self.ejected,
+            "requests": self.requests,
+            "failures": self.failures,
+            "times_ejected": self.times_ejected,
+        }
+
+
+class ReplicaRouter:
+    """Sends each model request to the replica expected to answer first.
+
+    With the `least_outstanding` strategy the replica with the fewest
+    requests in flight is chosen, ties going to the lowest latency. With
+    `ewma` the replica with the lowest moving average latency weighted by
+    its requests in flight is chosen. Replicas without a measured latency
+    are tried first.
+
+    A replica failing `eject_after_failures` times in a row is ejected and
+    only gets traffic again after a probe request to it succeeds, the
+    probes start `eject_seconds` after the ejection. When all the replicas
+    are ejected the requests are still sent, so that a shared outage does
+    not turn into a complete one. A request cancelled after running for
+    about `attempt_timeout` seconds was cut by the attempt timeout and
+    counts as a failure too.
+
+    Model servers leaving `model_name` or `model_version` out of their
+    responses get them from their KServe v2 metadata endpoint, looked up
+    at most once per `metadata_ttl` seconds for each replica.
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        strategy: Literal["least_outstanding", "ewma"] = "least_outstanding",
+        eject_after_failures: int = 5,
+        eject_seconds: float = 10.0,
+        probe_interval: float = 5.0,
+        probe_payload: dict | bytes | None = None,
+        ewma_alpha: float = 0.3,
+        attempt_timeout: float | None = None,
+        metadata_ttl: float = 60.0,
+        clock=time.monotonic,
+    ):
+        if not replicas:
+            raise ValueError("At least one model endpoint is needed")
+        self.replicas = replicas
+        self.strategy = strategy
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.probe_interval = probe_interval
+        self.probe_payload = probe_payload
+        self.ewma_alpha = ewma_alpha
+        self.attempt_timeout = attempt_timeout
+        self.metadata_ttl = metadata_ttl
+        self.clock = clock
+        self._next = 0
+        self._prober: asyncio.Task | None = None
+
+    def start(self):
+        """Starts probing the ejected replicas in the background."""
+        if self.probe_payload is not None:
+            self._prober = asyncio.create_task(self._probe_periodically())
+
+    async def stop(self):
+        """Stops the probes and closes the connection pools."""
+        if self._prober is not None:
+            self._prober.cancel()
+            try:
+                await self._prober
+            except asyncio.CancelledError:
+                pass
+            self._prober = None
+        for replica in self.replicas:
+            await replica.client.aclose()
+
+    def _score(self, replica: Replica) -> tuple:
+        latency = replica.ewma if replica.ewma is not None else 0.0
+        if self.strategy == "ewma":
+            return (latency * (replica.outstanding + 1), replica.outstanding)
+        return (replica.outstanding, latency)
+
+    def choose(self) -> Replica:
+        """Picks the replica for the next request."""
+        healthy = [r for r in self.replicas if not r.ejected] or self.replicas
+        # Rotate the starting point to spread the ties
+        self._next = (self._next + 1) % len(healthy)
+        index = min(
+            range(len(healthy)),
+            key=lambda i: (
+                self._score(healthy[i]),
+                (i - self._next) % len(healthy),
+            ),
+        )
+        return healthy[index]
+
+    def _observe(self, replica: Replica, seconds: float):
+        if replica.ewma is None:
+            replica.ewma = seconds
+        else:
+            replica.ewma += self.ewma_alpha * (seconds - replica.ewma)
+
+    def _record_failure(self, replica: Replica):
+        replica.failures += 1
+        replica.consecutive_failures += 1
+        if (
+            not replica.ejected
+            and replica.consecutive_failures >= self.eject_after_failures
+        ):
+            replica.ejected = True
+            replica.ejected_at = self.clock()
+            replica.times_ejected += 1
+            logger.warning("Ejected model replica %s", replica.endpoint)
+
+    async def request(
+        self, payload: dict | bytes, header_length: int | None = None
+    ) -> dict:
+        """Sends the prediction request to the chosen replica."""
+        replica = self.choose()
+        replica.outstanding += 1
+        replica.requests += 1
+        start_time = time.perf_counter()
+        try:
+            response = await request_prediction(
+                replica.client, replica.endpoint, payload, header_length
+            )
+        except asyncio.CancelledError:
+            # The time waited still counts against the replica
+            elapsed = time.perf_counter() - start_time
+            self._observe(replica, elapsed)
+            # Hedges losing the race are cancelled well before the timeout,
+            # the margin absorbs the resolution of the event loop clock
+            if (
+                self.attempt_timeout is not None
+                and elapsed >= self.attempt_timeout * 0.9
+            ):
+                self._record_failure(replica)
+            raise
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._record_failure(replica)
+            raise
+        finally:
+            replica.outstanding -= 1
+        self._observe(replica, time.perf_counter() - start_time)
+        replica.consecutive_failures = 0
+        if "model_name" not in response or "model_version" not in response:
+            for key, value in (await self.metadata(replica)).items():
+                response.setdefault(key, value)
+        return response
+
+    async def metadata(self, replica: Replica) -> dict:
+        """Model name and version served by the replica, cached.
+
+        Concurrent lookups share one request, a failed lookup is retried
+        after `metadata_ttl` too.
+        """
+        endpoint = metadata_endpoint(replica.endpoint)
+        if endpoint is None:
+            return {}
+        if (
+            replica.metadata is not None
+            and self.clock() < replica.metadata_expires_at
+        ):
+            return replica.metadata
+        if replica.metadata_lookup is None:
+            replica.metadata_lookup = asyncio.create_task(
+                self._lookup_metadata(replica, endpoint)
+            )
+        # The lookup goes on for the other requests if this one is cancelled
+        return await asyncio.shield(replica.metadata_lookup)
+
+    async def _lookup_metadata(self, replica: Replica, endpoint: str) -> dict:
+        try:
+            metadata = await request_metadata(replica.client, endpoint)
+            versions = metadata.get("versions") or [None]
+            replica.metadata = {
+                "model_name": metadata.get("name"),
+                "model_version": versions[-1],
+            }
+        except Exception as e:
+            # Best effort, the predictions are logged without the model
+            logger.warning(
+                "Model metadata lookup on %s failed: %r", endpoint, e
+            )
+            replica.metadata = {}
+        replica.metadata_expires_at = self.clock() + self.metadata_ttl
+        replica.metadata_lookup = None
+        return replica.metadata
+
+    async def probe(self):
+        """Probes the ejected replicas due and readmits the healthy ones."""
+        due = [
+            replica
+            for replica in self.replicas
+            if replica.ejected
+            and self.clock() - replica.ejected_at >= self.eject_seconds
+        ]
+        for replica in due:
+            try:
+                await request_prediction(
+                    replica.client, replica.endpoint, self.probe_payload
+                )
+            except Exception:
+                # Wait another ejection period before the next probe
+                replica.ejected_at = self.clock()
+                continue
+            replica.ejected = False
+            replica.consecutive_failures = 0
+            logger.info("Model replica %s is back", replica.endpoint)
+
+    async def _probe_periodically(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe()
+            except Exception:
+                logger.exception("Probing the model replicas failed")
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+def model_endpoints(config: ModelSettings = model_settings) -> list[str]:
+    """The model endpoints configured, one or a comma separated list."""
+    endpoints = [
+        endpoint.strip()
+        for endpoint in config.MODEL_PREDICTION_ENDPOINTS.split(",")
+        if endpoint.strip()
+    ]
+    return endpoints or [config.MODEL_PREDICTION_ENDPOINT]
+
+
+def create_router(
+    probe_payload: dict | bytes | None = None,
+    config: ModelSettings = model_settings,
+) -> ReplicaRouter:
+    """Creates the router with a connection pool per model endpoint."""
+    return ReplicaRouter(
+        [
+            Replica(endpoint, create_http_client(config))
+            for endpoint in model_endpoints(config)
+        ],
+        strategy=config.MODEL_ROUTING_STRATEGY,
+        eject_after_failures=config.MODEL_EJECT_AFTER_FAILURES,
+        eject_seconds=config.MODEL_EJECT_SECONDS,
+        probe_interval=config.MODEL_PROBE_INTERVAL_SECONDS,
+        probe_payload=probe_payload,
+        attempt_timeout=config.MODEL_ATTEMPT_TIMEOUT,
+        metadata_ttl=config.MODEL_METADATA_TTL_SECONDS,
+    )
@@ -0,0 +1,163 @@
+"""Production server, a preloaded app served by several worker processes.
+
+The app is imported once by the main process, which binds the socket and
+forks the workers, so that they start without importing it again. The
+workers use uvloop and httptools when they are installed
+(`poetry install -E server`). Each worker runs the lifespan of the app,
+which opens its own database connections and model client pools.
+
+On SIGTERM or SIGINT the workers stop accepting connections and are given
+SERVER_GRACEFUL_TIMEOUT seconds to finish the requests in flight, then the
+app shuts down and writes its remaining logs. A worker that dies is
+replaced. Run with `python -m src.server`.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+
+import uvicorn
+from uvicorn.importer import import_from_string
+
+from src.utils import server_settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Exit code of a worker that could not start the app, as used by uvicorn
+STARTUP_FAILURE = 3
+# Seconds between checks of the workers by the main process
+POLL_INTERVAL = 0.2
+
+
+def worker_count(workers: int) -> int:
+    """Number of workers, `workers` or one per CPU available when 0."""
+    if workers > 0:
+        return workers
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run_worker(config: uvicorn.Config, sock) -> int:
+    """Serves the app on the socket, in a forked worker process."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(config)
+    try:
+        server.run(sockets=[sock])
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        logger.exception("Worker %d failed", os.getpid())
+        return 1
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def serve(app: str, host: str, port: int, workers: int, **options) -> int:
+    """Serves the app with `workers` processes until SIGTERM or SIGINT.
+
+    Returns the exit code, STARTUP_FAILURE when a worker failed to start
+    the app.
+    """
+    config = uvicorn.Config(
+        import_from_string(app),
+        host=host,
+        port=port,
+        loop="auto",
+        http="auto",
+        **options,
+    )
+    sock = config.bind_socket()
+    pids: set[int] = set()
+    stopping = False
+    exit_code = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            os._exit(run_worker(config, sock))
+        pids.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info("Starting %d workers, pid %d", workers, os.getpid())
+    for _ in range(workers):
+        spawn()
+    while not stopping:
+        time.sleep(POLL_INTERVAL)
+        for pid in list(pids):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if not done:
+                continue
+            pids.discard(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if code == STARTUP_FAILURE:
+                # Restarting would fail the same way
+                logger.error("Worker %d failed to start the app", pid)
+                exit_code = STARTUP_FAILURE
+                stopping = True
+            elif not stopping:
+                logger.warning(
+                    "Worker %d exited with %d, replacing", pid, code
+                )
+                spawn()
+
+    logger.info("Stopping the workers")
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+    # Beyond the graceful timeout, the app shutdown writes the logs
+    deadline = time.monotonic() + config.timeout_graceful_shutdown + 30
+    while pids and time.monotonic() < deadline:
+        for pid in list(pids):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                pids.discard(pid)
+        time.sleep(POLL_INTERVAL)
+    for pid in pids:
+        logger.warning("Worker %d did not stop, killing it", pid)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    sock.close()
+    return exit_code
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("app", nargs="?", default="src.main:app")
+    parser.add_argument("--host", default=server_settings.SERVER_HOST)
+    parser.add_argument(
+        "--port", type=int, default=server_settings.SERVER_PORT
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=server_settings.SERVER_WORKERS,
+        help="0 for one per CPU",
+    )
+    args = parser.parse_args(argv)
+    options = {
+        "timeout_graceful_shutdown": server_settings.SERVER_GRACEFUL_TIMEOUT,
+        "timeout_keep_alive": server_settings.SERVER_KEEPALIVE_TIMEOUT,
+    }
+    workers = worker_count(args.workers)
+    if not hasattr(os, "fork"):
+        # Without fork, uvicorn starts the workers and each imports the app
+        uvicorn.run(
+            args.app,
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            **options,
+        )
+        return
+    sys.exit(serve(args.app, args.host, args.port, workers, **options))
+
+
+if __name__ == "__main__":
+    main()
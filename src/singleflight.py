@@ -0,0 +1,39 @@
+"""Coalescing of identical in-flight calls."""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Shares one call between concurrent callers with the same key.
+
+    The first caller for a key starts the call, callers arriving while it
+    is in flight wait for the same result (or exception) instead of
+    starting their own call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]):
+        """Runs `call`, or joins the in-flight call with the same key."""
+        future = self._in_flight.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.collapsed += 1
+        # A caller going away must not cancel the call for the others
+        return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        """Counts of the calls made and of the callers that joined one."""
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+        }
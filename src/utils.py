@@ -2,26 +2,27 @@
 
 import os
 import pathlib
+from typing import Literal
 
 import tomli
 from pydantic_settings import BaseSettings
 
 
 def get_app_version() -> str:
-    """Gets the current version specified in the pyproject.toml file."""
-    current_dir = pathlib.Path(__file__).resolve().parent
-    while current_dir != pathlib.Path("/"):
-        toml_file_path = current_dir / "pyproject.toml"
-        if toml_file_path.exists():
-            with open(toml_file_path, mode="rb") as config:
-                toml_file = tomli.load(config)
-                version = toml_file["tool"]["poetry"]["version"]
-            return version
-        current_dir = current_dir.parent
+    """Gets the version of the app.
 
-    raise FileNotFoundError(
-        "pyproject.toml file not found in any parent directory."
-    )
+    The version is written to `src/_version.py` when the Docker image is
+    built, otherwise it is read from the pyproject.toml file of the repo.
+    """
+    try:
+        from src._version import VERSION
+    except ImportError:
+        toml_file_path = (
+            pathlib.Path(__file__).parent.parent / "pyproject.toml"
+        )
+        with open(toml_file_path, mode="rb") as config:
+            return tomli.load(config)["tool"]["poetry"]["version"]
+    return VERSION
 
 
 class DBSettings(BaseSettings):
@@ -38,6 +39,235 @@ class DBSettings(BaseSettings):
         f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:"
         f"{POSTGRES_PORT}/{POSTGRES_DB}"
     )
+    ASYNC_DATABASE_URL: str = (
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@"
+        f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    )
+    # Connection pool of each engine
+    DB_POOL_SIZE: int = os.getenv("DB_POOL_SIZE", "10")
+    DB_MAX_OVERFLOW: int = os.getenv("DB_MAX_OVERFLOW", "20")
+    DB_POOL_TIMEOUT: float = os.getenv("DB_POOL_TIMEOUT", "30")
+    # Seconds after which a connection is replaced, -1 to keep them
+    DB_POOL_RECYCLE: int = os.getenv("DB_POOL_RECYCLE", "1800")
+    # Test connections for liveness when they are checked out
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true")
+    # Whether the predictions are logged to the database at all
+    DB_LOG_ENABLED: bool = os.getenv("DB_LOG_ENABLED", "true")
+    # Prediction logs are written in bulk in the background
+    DB_LOG_BATCH_SIZE: int = os.getenv("DB_LOG_BATCH_SIZE", "500")
+    DB_LOG_FLUSH_INTERVAL_MS: float = os.getenv(
+        "DB_LOG_FLUSH_INTERVAL_MS", "200"
+    )
+    DB_LOG_QUEUE_SIZE: int = os.getenv("DB_LOG_QUEUE_SIZE", "10000")
+    # What to do with new logs when the queue is full, "drop" or "block"
+    DB_LOG_OVERFLOW_POLICY: Literal["drop", "block"] = os.getenv(
+        "DB_LOG_OVERFLOW_POLICY", "drop"
+    )
+    # Prediction logs are partitioned by day, the partitions of the coming
+    # days are created in advance and the expired ones dropped
+    DB_LOG_PARTITION_DAYS_AHEAD: int = os.getenv(
+        "DB_LOG_PARTITION_DAYS_AHEAD", "7"
+    )
+    # Days of prediction logs kept, 0 to keep them all
+    DB_LOG_RETENTION_DAYS: int = os.getenv("DB_LOG_RETENTION_DAYS", "0")
+    # Seconds between maintenances of the partitions, 0 to disable them
+    DB_LOG_PARTITION_MAINTENANCE_INTERVAL: float = os.getenv(
+        "DB_LOG_PARTITION_MAINTENANCE_INTERVAL", "3600"
+    )
+    # Seconds between updates of the rollups of the logs, 0 to disable them
+    DB_LOG_ROLLUP_INTERVAL: float = os.getenv("DB_LOG_ROLLUP_INTERVAL", "60")
+    # Logs younger than this many seconds wait for the next rollup update
+    DB_LOG_ROLLUP_SETTLE_SECONDS: float = os.getenv(
+        "DB_LOG_ROLLUP_SETTLE_SECONDS", "30"
+    )
+    # Logs rolled up per transaction
+    DB_LOG_ROLLUP_BATCH_SIZE: int = os.getenv(
+        "DB_LOG_ROLLUP_BATCH_SIZE", "50000"
+    )
+
+
+class ModelSettings(BaseSettings):
+    """
+    Settings for the connection to the model prediction service.
+    """
+
+    MODEL_PREDICTION_ENDPOINT: str = os.getenv(
+        "MODEL_PREDICTION_ENDPOINT", "http://localhost:5001/invocations"
+    )
+    # Comma separated endpoints of the model replicas, requests are routed
+    # to them directly. MODEL_PREDICTION_ENDPOINT is used when empty
+    MODEL_PREDICTION_ENDPOINTS: str = os.getenv(
+        "MODEL_PREDICTION_ENDPOINTS", ""
+    )
+    # "least_outstanding" requests or lowest "ewma" latency first
+    MODEL_ROUTING_STRATEGY: Literal["least_outstanding", "ewma"] = os.getenv(
+        "MODEL_ROUTING_STRATEGY", "least_outstanding"
+    )
+    # Replicas failing this many times in a row stop getting traffic until
+    # a probe, sent every interval once the ejection time is over, succeeds
+    MODEL_EJECT_AFTER_FAILURES: int = os.getenv(
+        "MODEL_EJECT_AFTER_FAILURES", "5"
+    )
+    MODEL_EJECT_SECONDS: float = os.getenv("MODEL_EJECT_SECONDS", "10")
+    MODEL_PROBE_INTERVAL_SECONDS: float = os.getenv(
+        "MODEL_PROBE_INTERVAL_SECONDS", "5"
+    )
+    # Maximum number of concurrent connections to each model server
+    MODEL_POOL_SIZE: int = os.getenv("MODEL_POOL_SIZE", "100")
+    # Connections kept open between requests for reuse
+    MODEL_POOL_KEEPALIVE: int = os.getenv("MODEL_POOL_KEEPALIVE", "20")
+    MODEL_KEEPALIVE_EXPIRY: float = os.getenv("MODEL_KEEPALIVE_EXPIRY", "30")
+    # Timeouts in seconds
+    MODEL_CONNECT_TIMEOUT: float = os.getenv("MODEL_CONNECT_TIMEOUT", "5")
+    MODEL_READ_TIMEOUT: float = os.getenv("MODEL_READ_TIMEOUT", "30")
+    MODEL_POOL_TIMEOUT: float = os.getenv("MODEL_POOL_TIMEOUT", "5")
+    # HTTP/2 is only used when the `h2` package is installed
+    MODEL_HTTP2: bool = os.getenv("MODEL_HTTP2", "true")
+    # Send the numeric features as binary tensors, for model servers
+    # supporting the KServe/Triton binary tensor data extension
+    MODEL_BINARY_DATA: bool = os.getenv("MODEL_BINARY_DATA", "false")
+    # Seconds the model name and version read from the KServe v2 metadata
+    # endpoint are cached, for model servers not returning them with the
+    # predictions
+    MODEL_METADATA_TTL_SECONDS: float = os.getenv(
+        "MODEL_METADATA_TTL_SECONDS", "60"
+    )
+    # Maximum number of rows accepted in one batch prediction request
+    MODEL_MAX_BATCH_SIZE: int = os.getenv("MODEL_MAX_BATCH_SIZE", "1000")
+    # Rows of an uploaded file scored with each model request, and number
+    # of these requests in flight for each upload
+    MODEL_BULK_CHUNK_SIZE: int = os.getenv("MODEL_BULK_CHUNK_SIZE", "256")
+    MODEL_BULK_MAX_CONCURRENCY: int = os.getenv(
+        "MODEL_BULK_MAX_CONCURRENCY", "4"
+    )
+    # Opt-in coalescing of concurrent /predict calls into one model request
+    MODEL_BATCHING_ENABLED: bool = os.getenv("MODEL_BATCHING_ENABLED", "false")
+    MODEL_BATCHING_MAX_SIZE: int = os.getenv("MODEL_BATCHING_MAX_SIZE", "32")
+    MODEL_BATCHING_MAX_WAIT_MS: float = os.getenv(
+        "MODEL_BATCHING_MAX_WAIT_MS", "5"
+    )
+    MODEL_BATCHING_MAX_CONCURRENCY: int = os.getenv(
+        "MODEL_BATCHING_MAX_CONCURRENCY", "4"
+    )
+    # Identical concurrent /predict calls share one model request
+    MODEL_SINGLE_FLIGHT_ENABLED: bool = os.getenv(
+        "MODEL_SINGLE_FLIGHT_ENABLED", "true"
+    )
+    # Each model request attempt is cancelled after this many seconds
+    MODEL_ATTEMPT_TIMEOUT: float = os.getenv("MODEL_ATTEMPT_TIMEOUT", "5")
+    # Retries of failed attempts, with a random backoff doubling each time
+    MODEL_MAX_RETRIES: int = os.getenv("MODEL_MAX_RETRIES", "2")
+    MODEL_RETRY_BACKOFF_MS: float = os.getenv("MODEL_RETRY_BACKOFF_MS", "50")
+    MODEL_RETRY_BACKOFF_MAX_MS: float = os.getenv(
+        "MODEL_RETRY_BACKOFF_MAX_MS", "1000"
+    )
+    # Retries and hedges allowed as a share of the requests, plus a minimum
+    MODEL_RETRY_BUDGET_RATIO: float = os.getenv(
+        "MODEL_RETRY_BUDGET_RATIO", "0.1"
+    )
+    MODEL_RETRY_MIN_PER_SECOND: float = os.getenv(
+        "MODEL_RETRY_MIN_PER_SECOND", "5"
+    )
+    # Send a second request when the first is slower than the p95 latency
+    MODEL_HEDGING_ENABLED: bool = os.getenv("MODEL_HEDGING_ENABLED", "false")
+    MODEL_HEDGE_MIN_DELAY_MS: float = os.getenv(
+        "MODEL_HEDGE_MIN_DELAY_MS", "10"
+    )
+    # Fail fast with a 503 while most of the model requests fail
+    MODEL_CIRCUIT_BREAKER_ENABLED: bool = os.getenv(
+        "MODEL_CIRCUIT_BREAKER_ENABLED", "true"
+    )
+    MODEL_CIRCUIT_FAILURE_RATE: float = os.getenv(
+        "MODEL_CIRCUIT_FAILURE_RATE", "0.5"
+    )
+    MODEL_CIRCUIT_MIN_CALLS: int = os.getenv("MODEL_CIRCUIT_MIN_CALLS", "20")
+    MODEL_CIRCUIT_WINDOW_SECONDS: float = os.getenv(
+        "MODEL_CIRCUIT_WINDOW_SECONDS", "10"
+    )
+    MODEL_CIRCUIT_OPEN_SECONDS: float = os.getenv(
+        "MODEL_CIRCUIT_OPEN_SECONDS", "5"
+    )
+    # "remote" to call the model server, "local" to score in-process with
+    # the model at LOCAL_MODEL_PATH, can be switched while running
+    PREDICTION_BACKEND: Literal["remote", "local"] = os.getenv(
+        "PREDICTION_BACKEND", "remote"
+    )
+    # MLflow model directory or pickled sklearn model, loaded when set
+    LOCAL_MODEL_PATH: str = os.getenv("LOCAL_MODEL_PATH", "")
+    LOCAL_MODEL_EXECUTOR: Literal["thread", "process"] = os.getenv(
+        "LOCAL_MODEL_EXECUTOR", "thread"
+    )
+    LOCAL_MODEL_WORKERS: int = os.getenv("LOCAL_MODEL_WORKERS", "1")
+
+
+class CacheSettings(BaseSettings):
+    """
+    Settings for the cache of the model predictions.
+    """
+
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "false")
+    # "memory" for a cache per process, "redis" for a shared cache
+    CACHE_BACKEND: Literal["memory", "redis"] = os.getenv(
+        "CACHE_BACKEND", "memory"
+    )
+    CACHE_TTL_SECONDS: float = os.getenv("CACHE_TTL_SECONDS", "300")
+    # Maximum number of entries of the in-process cache
+    CACHE_MAX_SIZE: int = os.getenv("CACHE_MAX_SIZE", "10000")
+    CACHE_REDIS_URL: str = os.getenv(
+        "CACHE_REDIS_URL", "redis://localhost:6379/0"
+    )
+
+
+class HealthSettings(BaseSettings):
+    """
+    Settings for the readiness checks of the dependencies.
+    """
+
+    # Seconds a readiness result is reused for the next probes
+    READINESS_CACHE_SECONDS: float = os.getenv("READINESS_CACHE_SECONDS", "5")
+    # Seconds after which a dependency check fails
+    READINESS_TIMEOUT: float = os.getenv("READINESS_TIMEOUT", "2")
+
+
+class DriftSettings(BaseSettings):
+    """
+    Settings of the monitoring of the drift of the input features.
+    """
+
+    DRIFT_ENABLED: bool = os.getenv("DRIFT_ENABLED", "true")
+    # JSON profile built by `python -m src.drift`, no scores when not set
+    DRIFT_REFERENCE_PATH: str = os.getenv("DRIFT_REFERENCE_PATH", "")
+    # Relative accuracy of the quantiles of the numeric features
+    DRIFT_RELATIVE_ACCURACY: float = os.getenv(
+        "DRIFT_RELATIVE_ACCURACY", "0.01"
+    )
+    # PSI from which a feature is reported as drifted
+    DRIFT_PSI_THRESHOLD: float = os.getenv("DRIFT_PSI_THRESHOLD", "0.2")
+    # Seconds between snapshots stored in the database, each starting a new
+    # window, 0 to keep one window since the start
+    DRIFT_SNAPSHOT_INTERVAL: float = os.getenv(
+        "DRIFT_SNAPSHOT_INTERVAL", "3600"
+    )
+
+
+class ServerSettings(BaseSettings):
+    """
+    Settings of the production server started by `python -m src.server`.
+    """
+
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = os.getenv("SERVER_PORT", "8000")
+    # Number of worker processes, 0 for one per CPU available
+    SERVER_WORKERS: int = os.getenv("SERVER_WORKERS", "0")
+    # Seconds the requests in flight are given to finish on shutdown
+    SERVER_GRACEFUL_TIMEOUT: float = os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")
+    # Seconds an idle keep-alive connection is kept open
+    SERVER_KEEPALIVE_TIMEOUT: int = os.getenv("SERVER_KEEPALIVE_TIMEOUT", "5")
 
 
 settings = DBSettings()
+model_settings = ModelSettings()
+cache_settings = CacheSettings()
+health_settings = HealthSettings()
+drift_settings = DriftSettings()
+server_settings = ServerSettings()
@@ -0,0 +1,198 @@
+"""Tests for the rollups of the prediction logs and their queries.
+
+The rollups are built from a scratch log table, with scratch rollup
+tables shaped like the ones of the logs.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from src.analytics import (
+    distribution,
+    export_logs,
+    log_table,
+    request_counts,
+    roll_up,
+    roll_up_batch,
+)
+from src.utils import settings
+from tests.test_retention import LOG
+
+TABLE = "analytics_test_logs"
+START = datetime(2001, 1, 10, 12, 0)
+CUTOFF = START + timedelta(days=1)
+
+
+@pytest.fixture
+def connection():
+    """Connection with the scratch tables, dropped afterwards."""
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.connect() as connection:
+        with connection.begin():
+            connection.execute(
+                text(
+                    f"CREATE TABLE {TABLE} "
+                    "(LIKE prediction_logs INCLUDING ALL)"
+                )
+            )
+            for rollup in ("minutes", "minute_histograms"):
+                connection.execute(
+                    text(
+                        f"CREATE TABLE {TABLE}_{rollup} "
+                        f"(LIKE prediction_logs_{rollup} INCLUDING ALL)"
+                    )
+                )
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            with connection.begin():
+                for name in (
+                    TABLE,
+                    f"{TABLE}_minutes",
+                    f"{TABLE}_minute_histograms",
+                ):
+                    connection.execute(text(f"DROP TABLE {name}"))
+                connection.execute(
+                    text(
+                        "DELETE FROM rollup_watermarks "
+                        "WHERE source_table = :table"
+                    ),
+                    {"table": TABLE},
+                )
+    engine.dispose()
+
+
+def insert_logs(connection, logs: list[dict]):
+    with connection.begin():
+        connection.execute(
+            insert(log_table(TABLE)), [{**LOG, **log} for log in logs]
+        )
+
+
+def test_logs_are_counted_per_bucket(connection):
+    """Test the counts and means of the logs of each minute and hour."""
+    insert_logs(
+        connection,
+        [
+            {
+                "timestamp": START + timedelta(seconds=20 * i),
+                "prediction_response": None if i == 0 else 1000.0 * i,
+                "inference_time": 0.01 * i,
+                "cache_hit": i % 2 == 1,
+            }
+            for i in range(6)
+        ],
+    )
+
+    assert roll_up(connection, CUTOFF, batch_size=4, table=TABLE) == 6
+    minutes = request_counts(connection, START, CUTOFF, "minute", table=TABLE)
+    hours = request_counts(connection, START, CUTOFF, "hour", table=TABLE)
+
+    assert [minute["requests"] for minute in minutes] == [3, 3]
+    assert [minute["failures"] for minute in minutes] == [1, 0]
+    assert minutes[0]["mean_prediction"] == pytest.approx(1500.0)
+    assert hours == [
+        {
+            "bucket": START,
+            "requests": 6,
+            "cache_hits": 3,
+            "failures": 1,
+            "mean_inference_time": pytest.approx(0.025),
+            "mean_prediction": pytest.approx(3000.0),
+            "min_prediction": 1000.0,
+            "max_prediction": 5000.0,
+        }
+    ]
+
+
+def test_rollups_are_updated_incrementally(connection):
+    """Test only the logs after the watermark and before the cutoff are
+    added to the rollups."""
+    insert_logs(connection, [{"timestamp": START}] * 3)
+    assert roll_up(connection, CUTOFF, table=TABLE) == 3
+    later = CUTOFF + timedelta(minutes=1)
+    insert_logs(connection, [{"timestamp": START}, {"timestamp": later}])
+
+    assert roll_up(connection, CUTOFF, table=TABLE) == 1
+    assert roll_up(connection, CUTOFF, table=TABLE) == 0
+    assert roll_up(connection, later + timedelta(1), table=TABLE) == 1
+    counts = request_counts(
+        connection, START, later + timedelta(1), "day", table=TABLE
+    )
+    assert [day["requests"] for day in counts] == [4, 1]
+
+
+def test_logs_are_rolled_up_once_by_concurrent_updates(connection):
+    """Test an update skips the logs while another one is running."""
+    # Creates the watermark, the creation by two updates is serialised
+    assert roll_up(connection, CUTOFF, table=TABLE) == 0
+    insert_logs(connection, [{"timestamp": START}] * 3)
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.connect() as other, other.begin():
+        assert roll_up_batch(other, CUTOFF, 100, table=TABLE) == 3
+
+        with connection.begin():
+            assert roll_up_batch(connection, CUTOFF, 100, table=TABLE) is None
+    engine.dispose()
+
+    assert roll_up(connection, CUTOFF, table=TABLE) == 0
+    counts = request_counts(connection, START, CUTOFF, table=TABLE)
+    assert counts[0]["requests"] == 3
+
+
+def test_quantiles_are_within_the_bin_width(connection):
+    """Test the quantiles of the histograms are close to the exact ones."""
+    generator = np.random.default_rng(22)
+    times = generator.lognormal(np.log(0.02), 0.8, 2000)
+    prices = generator.normal(4e6, 1e6, 2000).clip(1e5)
+    insert_logs(
+        connection,
+        [
+            {
+                "timestamp": START + timedelta(seconds=i),
+                "inference_time": float(inference_time),
+                "prediction_response": float(price),
+            }
+            for i, (inference_time, price) in enumerate(zip(times, prices))
+        ],
+    )
+    roll_up(connection, CUTOFF, table=TABLE)
+
+    for metric, values in (("inference_time", times), ("prediction", prices)):
+        buckets = distribution(
+            connection, metric, START, CUTOFF, "day", table=TABLE
+        )
+        assert len(buckets) == 1
+        assert buckets[0]["count"] == 2000
+        for q in (50, 90, 95, 99):
+            exact = np.percentile(values, q)
+            assert buckets[0][f"p{q}"] == pytest.approx(exact, rel=0.05)
+
+
+def test_export_pages_follow_the_cursor(connection):
+    """Test the pages of the export cover each log once, in id order."""
+    insert_logs(
+        connection,
+        [{"timestamp": START + timedelta(hours=i)} for i in range(7)],
+    )
+
+    pages, cursor = [], 0
+    while cursor is not None:
+        logs, cursor = export_logs(connection, cursor, limit=3, table=TABLE)
+        pages.append([log["timestamp"] for log in logs])
+    logs, last = export_logs(
+        connection, 0, limit=2, start=START + timedelta(hours=5), table=TABLE
+    )
+
+    assert pages == [
+        [START + timedelta(hours=i) for i in range(3)],
+        [START + timedelta(hours=i) for i in range(3, 6)],
+        [START + timedelta(hours=6)],
+    ]
+    assert len(logs) == 2
+    assert last == logs[-1]["id"]
+    assert set(logs[0]) == set(log_table().c.keys())
@@ -0,0 +1,160 @@
+"""Tests for the offline scoring of files."""
+
+import asyncio
+import csv
+import json
+
+import pytest
+from sqlalchemy import func, select
+
+from src.batch_score import BatchScoringJob, create_stub_router, read_chunks
+from src.data_models import PredictionLog
+from src.db_connection import get_engine
+
+HOUSE = {
+    "mainroad": "yes",
+    "guestroom": "no",
+    "basement": "yes",
+    "hotwaterheating": "no",
+    "airconditioning": "yes",
+    "prefarea": "no",
+    "furnishingstatus": "furnished",
+    "area": 1200,
+    "bedrooms": 3,
+    "bathrooms": 2,
+    "stories": 2,
+    "parking": 1,
+}
+
+
+def houses(count: int, first_area: int = 1000) -> list[dict]:
+    return [{**HOUSE, "area": first_area + index} for index in range(count)]
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    return path
+
+
+def run_job(input_path, output_dir, **kwargs) -> dict:
+    async def main():
+        router = create_stub_router()
+        router.start()
+        try:
+            job = BatchScoringJob(input_path, output_dir, router, **kwargs)
+            return await job.run()
+        finally:
+            await router.stop()
+
+    return asyncio.run(main())
+
+
+def read_output(output_dir) -> list[dict]:
+    rows = []
+    for part in sorted(output_dir.glob("part-*.csv")):
+        with open(part, newline="") as file:
+            rows += list(csv.DictReader(file))
+    return rows
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".csv", ".parquet"])
+def test_chunks_are_read_from_the_position(tmp_path, suffix):
+    """Test reading resumes at the position given with a chunk."""
+    rows = houses(25)
+    path = tmp_path / f"houses{suffix}"
+    if suffix == ".jsonl":
+        write_jsonl(path, rows)
+    elif suffix == ".csv":
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=list(HOUSE))
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        pyarrow = pytest.importorskip("pyarrow")
+        pytest.importorskip("pyarrow.parquet")
+        pyarrow.parquet.write_table(
+            pyarrow.Table.from_pylist(rows), path, row_group_size=7
+        )
+
+    chunks = list(read_chunks(path, chunk_size=10))
+    _, position = chunks[1]
+    resumed = list(read_chunks(path, chunk_size=10, position=position))
+
+    areas = [float(row["area"]) for chunk, _ in chunks for row in chunk]
+    assert areas == [float(row["area"]) for row in rows]
+    resumed_areas = [
+        float(row["area"]) for chunk, _ in resumed for row in chunk
+    ]
+    skipped = sum(len(chunk) for chunk, _ in chunks[:2])
+    assert resumed_areas == areas[skipped:]
+
+
+def test_rows_are_scored_into_part_files(tmp_path):
+    """Test each row gets its prediction or its error in the output."""
+    rows = houses(50)
+    rows[7] = {**HOUSE, "bedrooms": 42}
+    input_path = write_jsonl(tmp_path / "houses.jsonl", rows)
+
+    stats = run_job(input_path, tmp_path / "out", chunk_size=8, part_rows=20)
+
+    output = read_output(tmp_path / "out")
+    assert [int(row["row"]) for row in output] == list(range(50))
+    assert output[0]["prediction"] == "500000.0"
+    assert output[7]["prediction"] == ""
+    assert json.loads(output[7]["error"])[0]["loc"] == ["bedrooms"]
+    assert len(list((tmp_path / "out").glob("part-*.csv"))) == 3
+    assert stats["rows"] == 50
+    assert stats["errors"] == 1
+
+
+def test_interrupted_run_resumes_after_the_last_part(tmp_path):
+    """Test a resumed run scores each row once, from the last checkpoint."""
+    input_path = write_jsonl(tmp_path / "houses.jsonl", houses(100))
+    calls = 0
+
+    async def failing_score(self, rows):
+        nonlocal calls
+        calls += 1
+        if calls == 8:
+            raise RuntimeError("interrupted")
+        return [500000.0] * len(rows)
+
+    original_score = BatchScoringJob.score
+    BatchScoringJob.score = failing_score
+    try:
+        with pytest.raises(RuntimeError):
+            run_job(
+                input_path,
+                tmp_path / "out",
+                chunk_size=10,
+                concurrency=1,
+                part_rows=30,
+            )
+    finally:
+        BatchScoringJob.score = original_score
+    checkpoint = json.loads((tmp_path / "out" / "checkpoint.json").read_text())
+    assert checkpoint["rows"] == 60
+
+    stats = run_job(input_path, tmp_path / "out", chunk_size=10, part_rows=30)
+
+    assert stats["first_row"] == 60
+    assert stats["rows"] == 40
+    output = read_output(tmp_path / "out")
+    assert [int(row["row"]) for row in output] == list(range(100))
+
+
+def test_predictions_are_logged_with_copy(tmp_path):
+    """Test the scored rows are written to prediction_logs with COPY."""
+    rows = houses(30, first_area=771000)
+    input_path = write_jsonl(tmp_path / "houses.jsonl", rows)
+    query = select(
+        func.count(), func.count(PredictionLog.inference_time)
+    ).where(PredictionLog.area.between(771000, 771029))
+    with get_engine().connect() as connection:
+        before = connection.execute(query).one()
+
+    run_job(input_path, tmp_path / "out", chunk_size=8, part_rows=16, log=True)
+
+    with get_engine().connect() as connection:
+        after = connection.execute(query).one()
+    assert (after[0] - before[0], after[1] - before[1]) == (30, 30)
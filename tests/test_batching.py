@@ -0,0 +1,98 @@
+"""Unit tests for the micro-batching scheduler."""
+
+import asyncio
+
+import pytest
+
+from src.batching import MicroBatcher
+
+
+class FakeModel:
+    """Scores rows by doubling them and records the batches it receives."""
+
+    def __init__(self, delay: float = 0.01, error: Exception | None = None):
+        self.delay = delay
+        self.error = error
+        self.batches = []
+
+    async def __call__(self, rows):
+        self.batches.append(list(rows))
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return [row * 2 for row in rows]
+
+
+def run_concurrently(batcher: MicroBatcher, rows):
+    """Submits all rows concurrently and returns the results in order."""
+
+    async def main():
+        batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(r) for r in rows))
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_are_coalesced():
+    """Test concurrent rows are scored in one batch and split back."""
+    model = FakeModel()
+    batcher = MicroBatcher(model, max_batch_size=32, max_wait_ms=20)
+
+    results = run_concurrently(batcher, list(range(10)))
+
+    assert model.batches == [list(range(10))]
+    assert [price for price, _, _ in results] == [r * 2 for r in range(10)]
+    # The round trip time is shared across the rows of the batch
+    inference_times = {inference_time for _, inference_time, _ in results}
+    assert len(inference_times) == 1
+    assert 0 < inference_times.pop() < model.delay
+    assert batcher.stats()["batch_size"]["count"] == 1
+    assert batcher.stats()["wait_time_seconds"]["count"] == 10
+
+
+def test_batches_are_capped_at_max_batch_size():
+    """Test the batch is sent as soon as it reaches max_batch_size."""
+    model = FakeModel()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=1000)
+
+    results = run_concurrently(batcher, list(range(10)))
+
+    assert [len(batch) for batch in model.batches] == [4, 4, 2]
+    assert [price for price, _, _ in results] == [r * 2 for r in range(10)]
+
+
+def test_model_errors_are_raised_for_every_row():
+    """Test a failed batch fails each of the waiting callers."""
+    model = FakeModel(error=RuntimeError("model down"))
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=5)
+
+    with pytest.raises(RuntimeError, match="model down"):
+        run_concurrently(batcher, [1, 2, 3])
+    assert len(model.batches) == 1
+
+
+def test_stop_scores_the_batch_being_collected():
+    """Test rows already taken into a batch are scored on stop."""
+    model = FakeModel()
+    batcher = MicroBatcher(
+        model, max_batch_size=8, max_wait_ms=10_000, max_concurrent_batches=2
+    )
+
+    async def main():
+        batcher.start()
+        submitted = [asyncio.ensure_future(batcher.submit(r)) for r in (1, 2)]
+        # Let the collector take the rows and wait for more
+        await asyncio.sleep(0.01)
+        assert batcher.queue_depth == 0
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(*submitted), 1)
+
+    results = asyncio.run(main())
+
+    assert [price for price, _, _ in results] == [2, 4]
+    assert model.batches == [[1, 2]]
+    # Every slot is given back
+    assert batcher._slots._value == 2
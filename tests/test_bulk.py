@@ -0,0 +1,164 @@
+"""Unit tests for the streaming scoring of files."""
+
+import asyncio
+
+import httpx
+from pydantic import BaseModel, ValidationError
+
+from src.bulk import (
+    InvalidRow,
+    iter_lines,
+    read_csv,
+    read_ndjson,
+    score_stream,
+)
+
+
+class Row(BaseModel):
+    value: int
+
+
+def validate_rows(items):
+    indices, rows, errors = [], [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append(Row.model_validate(item))
+            indices.append(index)
+        except ValidationError as e:
+            errors.append({"index": index, "detail": e.errors()})
+    return indices, rows, errors
+
+
+class FakeModel:
+    """Scores rows by doubling them and records the calls in flight."""
+
+    def __init__(self, delay: float = 0.01, fail_on: int | None = None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.chunks = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, rows):
+        self.chunks.append([row.value for row in rows])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if self.fail_on in (row.value for row in rows):
+            raise httpx.ConnectError("model down")
+        return [row.value * 2 for row in rows]
+
+
+async def chunks_of(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:][:size]
+
+
+async def collect(results) -> list:
+    return [result async for result in results]
+
+
+def run(items, model: FakeModel, **kwargs) -> list[dict]:
+    return asyncio.run(
+        collect(score_stream(items, validate_rows, model, **kwargs))
+    )
+
+
+async def items_of(values):
+    for value in values:
+        yield value
+
+
+def test_lines_are_split_across_chunks():
+    """Test lines cut between body chunks are put back together."""
+    body = b'{"value": 1}\r\n{"value": 22}\n\n{"val'
+    lines = asyncio.run(collect(iter_lines(chunks_of(body, 5))))
+
+    assert lines == ['{"value": 1}', '{"value": 22}', "", '{"val']
+
+
+def test_malformed_lines_are_reported_inline():
+    """Test NDJSON and CSV rows that do not parse become invalid rows."""
+
+    async def parse(reader, lines):
+        return await collect(reader(items_of(lines)))
+
+    ndjson = asyncio.run(parse(read_ndjson, ['{"value": 1}', "", "{"]))
+    csv_rows = asyncio.run(
+        parse(read_csv, ["value, other", '3,"a,b"', "4", "5,c"])
+    )
+
+    assert ndjson[0] == {"value": 1}
+    assert ndjson[1].detail[0]["type"] == "json_invalid"
+    assert len(ndjson) == 2
+    assert csv_rows[0] == {"value": "3", "other": "a,b"}
+    assert csv_rows[1].detail[0]["msg"] == "Expected 2 fields, got 1"
+    assert csv_rows[2] == {"value": "5", "other": "c"}
+
+
+def test_rows_are_scored_in_chunks_with_bounded_concurrency():
+    """Test the chunks are scored concurrently up to the limit, in order."""
+    model = FakeModel()
+    values = [{"value": value} for value in range(100)]
+
+    results = run(items_of(values), model, chunk_size=10, max_concurrency=3)
+
+    assert results[:-1] == [
+        {"index": value, "prediction": value * 2} for value in range(100)
+    ]
+    assert model.chunks == [
+        list(range(start, start + 10)) for start in range(0, 100, 10)
+    ]
+    assert model.max_in_flight == 3
+    stats = results[-1]["stats"]
+    assert stats["rows"] == 100
+    assert stats["predictions"] == 100
+    assert stats["errors"] == 0
+    assert stats["chunks"] == 10
+    assert stats["rows_per_second"] > 0
+
+
+def test_errors_are_reported_inline():
+    """Test invalid rows and failed chunks do not stop the other rows."""
+    model = FakeModel(fail_on=5)
+    items = [
+        {"value": 1},
+        {"value": "x"},
+        InvalidRow("json_invalid", "Invalid JSON"),
+        {"value": 4},
+        {"value": 5},
+        {"value": 6},
+    ]
+
+    results = run(items_of(items), model, chunk_size=4)
+
+    assert results[0] == {"index": 0, "prediction": 2}
+    assert results[1]["detail"][0]["loc"] == ("value",)
+    assert results[2]["detail"][0]["type"] == "json_invalid"
+    assert results[3] == {"index": 3, "prediction": 8}
+    assert [result["index"] for result in results[4:6]] == [4, 5]
+    assert all("model down" in result["error"] for result in results[4:6])
+    assert results[-1]["stats"]["errors"] == 4
+    assert results[-1]["stats"]["predictions"] == 2
+
+
+def test_scored_rows_are_passed_on():
+    """Test the scored rows are given with their indices, prices and time."""
+    model = FakeModel()
+    scored = []
+
+    async def on_scored(indices, rows, prices, inference_time):
+        scored.append((indices, [row.value for row in rows], prices))
+        assert 0 < inference_time < 1
+
+    run(
+        items_of([{"value": 1}, {"value": 2}, {"value": 3}]),
+        model,
+        chunk_size=2,
+        on_scored=on_scored,
+    )
+
+    assert scored == [([0, 1], [1, 2], [2, 4]), ([2], [3], [6])]
@@ -0,0 +1,101 @@
+"""Unit tests for the prediction cache."""
+
+import asyncio
+import time
+
+from src.cache import (
+    MemoryCacheBackend,
+    PredictionCache,
+    RedisCacheBackend,
+    feature_key,
+)
+
+FEATURES = {
+    "mainroad": "yes",
+    "guestroom": "no",
+    "basement": "yes",
+    "hotwaterheating": "no",
+    "airconditioning": "yes",
+    "prefarea": "no",
+    "furnishingstatus": "furnished",
+    "area": 1200,
+    "bedrooms": 3,
+    "bathrooms": 2,
+    "stories": 2,
+    "parking": 1,
+}
+
+
+class FakeRedis:
+    """Local stand-in for the `redis.asyncio.Redis` client."""
+
+    def __init__(self):
+        self.entries = {}
+
+    async def get(self, key):
+        value, expires_at = self.entries.get(key, (None, 0))
+        if expires_at < time.monotonic():
+            return None
+        return value
+
+    async def set(self, key, value, px):
+        self.entries[key] = (value.encode(), time.monotonic() + px / 1000)
+
+
+def test_feature_key_is_normalised():
+    """Test equivalent inputs share the same key."""
+    same = {**FEATURES, "mainroad": "YES", "guestroom": "No", "area": 1200.0}
+    reordered = dict(reversed(FEATURES.items()))
+    other = {**FEATURES, "bedrooms": 4}
+
+    assert feature_key(same) == feature_key(FEATURES)
+    assert feature_key(reordered) == feature_key(FEATURES)
+    assert feature_key(other) != feature_key(FEATURES)
+
+
+def test_memory_backend_evicts_least_recently_used():
+    """Test the least recently used entry is evicted first."""
+    backend = MemoryCacheBackend(max_size=2)
+
+    async def main():
+        await backend.set("a", 1.0, ttl=60)
+        await backend.set("b", 2.0, ttl=60)
+        assert await backend.get("a") == 1.0
+        await backend.set("c", 3.0, ttl=60)
+        return [await backend.get(key) for key in "abc"]
+
+    assert asyncio.run(main()) == [1.0, None, 3.0]
+
+
+def test_memory_backend_expires_entries():
+    """Test entries are not returned after their time to live."""
+    backend = MemoryCacheBackend()
+
+    async def main():
+        await backend.set("a", 1.0, ttl=0.01)
+        await asyncio.sleep(0.02)
+        return await backend.get("a")
+
+    assert asyncio.run(main()) is None
+    assert len(backend) == 0
+
+
+def test_cache_is_invalidated_on_new_model_version():
+    """Test cached predictions are only used for the same model version."""
+    for backend in (MemoryCacheBackend(), RedisCacheBackend(FakeRedis())):
+        cache = PredictionCache(backend, ttl=60)
+
+        async def main():
+            await cache.observe_model_version("4")
+            await cache.set(FEATURES, 500000.0)
+            hit = await cache.get(FEATURES)
+            await cache.observe_model_version("4")
+            same_version = await cache.get(FEATURES)
+            await cache.observe_model_version("5")
+            new_version = await cache.get(FEATURES)
+            return hit, same_version, new_version
+
+        assert asyncio.run(main()) == (500000.0, 500000.0, None)
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hit_ratio"] == 2 / 3
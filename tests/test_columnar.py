@@ -0,0 +1,299 @@
+"""Unit tests for the column by column validation of batches."""
+
+import json
+import random
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from src.local_model import LocalModel
+from src.main import (
+    DATATYPE_MAPPING,
+    HousingData,
+    housing_validator,
+    kserve_encoder,
+)
+from tests.test_encoder import ROW
+
+# Values of each kind of field, valid or not for HousingData
+YES_NO_VALUES = ["yes", "YES", "Yes", "No", "yEs", "y", " yes", 1, None, []]
+FURNISHING_VALUES = [
+    "furnished",
+    "Semi-Furnished",
+    "UNFURNISHED",
+    "furnished ",
+    "other",
+    1,
+    None,
+    b"furnished",
+]
+NUMBER_VALUES = [
+    0,
+    3,
+    9,
+    10,
+    -4,
+    3.0,
+    3.5,
+    9.99,
+    1200.5,
+    float("nan"),
+    float("inf"),
+    True,
+    "3",
+    "03",
+    "+3",
+    "-3",
+    " 3",
+    "3.0",
+    "1200.5",
+    "1e3",
+    "3_0",
+    "",
+    "x",
+    "٣",
+    2**63,
+    -(2**63),
+    10**400,
+    -1e30,
+    None,
+    [3],
+    {"value": 3},
+]
+CASES = (
+    [("mainroad", value) for value in YES_NO_VALUES]
+    + [("furnishingstatus", value) for value in FURNISHING_VALUES]
+    + [
+        (name, value)
+        for name in ("area", "bedrooms", "stories")
+        for value in NUMBER_VALUES
+    ]
+)
+
+
+def model_result(item) -> tuple[dict | None, list | None]:
+    """Values or errors of the row validated by the model."""
+    try:
+        return HousingData.model_validate(item).model_dump(), None
+    except ValidationError as e:
+        return None, comparable(
+            e.errors(include_url=False, include_input=False)
+        )
+
+
+def comparable(errors: list) -> list:
+    # The errors of validators hold the exception raised in their context
+    return json.loads(json.dumps(errors, default=repr))
+
+
+def assert_same_values(row: dict, expected: dict):
+    assert row.keys() == expected.keys()
+    for name, value in expected.items():
+        if isinstance(value, float) and np.isnan(value):
+            assert np.isnan(row[name])
+        else:
+            assert row[name] == value
+            assert type(row[name]) is type(value) or name == "area"
+
+
+@pytest.mark.parametrize("name, value", CASES)
+def test_rows_are_validated_like_the_model(name, value):
+    """Test each value gives the values or the errors of the model."""
+    item = {**ROW, name: value}
+    values, errors = model_result(item)
+
+    indices, rows, row_errors = housing_validator.validate_rows([item])
+
+    if name == "area" and value == 10**400:
+        # Valid for the model, but too large for the area column
+        assert row_errors[0]["detail"][0]["type"] == "number_too_large"
+        return
+    if errors is None:
+        assert indices == [0]
+        assert row_errors == []
+        assert_same_values(next(iter(rows))._asdict(), values)
+    else:
+        assert indices == []
+        assert len(rows) == 0
+        assert comparable(row_errors) == [{"index": 0, "detail": errors}]
+
+
+@pytest.mark.parametrize("name, value", CASES)
+def test_checks_only_accept_what_the_model_accepts(name, value):
+    """Test rows passing the column checks have the values of the model."""
+    item = {**ROW, name: value}
+    values, _ = model_result(item)
+
+    typed, rejected = housing_validator.check(
+        {field: [item[field]] for field in item}, 1
+    )
+
+    if not rejected[0]:
+        assert values is not None
+        assert_same_values(
+            {field: column.tolist()[0] for field, column in typed.items()},
+            values,
+        )
+
+
+def test_random_batch_is_validated_like_the_model():
+    """Test a batch of random rows matches the model row by row."""
+    generator = random.Random(18)
+    choices = {
+        "mainroad": YES_NO_VALUES,
+        "furnishingstatus": FURNISHING_VALUES,
+        "area": [value for value in NUMBER_VALUES if value != 10**400],
+        "bedrooms": NUMBER_VALUES,
+        "parking": NUMBER_VALUES,
+    }
+    batch = []
+    for _ in range(2000):
+        row = dict(ROW)
+        for name in generator.sample(list(choices), 2):
+            row[name] = generator.choice(choices[name])
+        if generator.random() < 0.05:
+            del row["stories"]
+        batch.append(row)
+    batch += [None, "row", [ROW]]
+
+    indices, rows, errors = housing_validator.validate_rows(batch)
+
+    expected = [model_result(item) for item in batch]
+    assert indices == [i for i, (_, e) in enumerate(expected) if e is None]
+    assert comparable(errors) == [
+        {"index": i, "detail": e}
+        for i, (_, e) in enumerate(expected)
+        if e is not None
+    ]
+    for index, row in zip(indices, rows):
+        assert_same_values(row._asdict(), expected[index][0])
+
+
+def test_csv_batch_is_validated_like_the_model():
+    """Test rows of strings, as read from CSV files, match the model."""
+    strings = [
+        "3",
+        "-0",
+        "+9",
+        "10",
+        "1.",
+        ".5",
+        "1.5.2",
+        "0.000001",
+        "1200.25",
+        "-",
+        "+",
+        "",
+        "3 ",
+        "3\x003",
+        "123456789012345",
+        "1234567890123456",
+        "99999999999999.5",
+    ]
+    batch = [
+        {
+            **{name: str(value) for name, value in ROW.items()},
+            "area": area,
+            "bedrooms": bedrooms,
+        }
+        for area in strings
+        for bedrooms in strings
+    ]
+
+    indices, rows, errors = housing_validator.validate_rows(batch)
+
+    expected = [model_result(item) for item in batch]
+    assert indices == [i for i, (_, e) in enumerate(expected) if e is None]
+    assert len(errors) == len(batch) - len(indices)
+    for index, row in zip(indices, rows):
+        assert_same_values(row._asdict(), expected[index][0])
+
+
+def test_typed_columns_are_checked():
+    """Test NumPy columns are checked without going through objects."""
+    count = 4
+    columns = {
+        name: np.full(count, value)
+        for name, value in ROW.items()
+        if isinstance(value, str)
+    }
+    columns["furnishingstatus"] = np.array(
+        ["Furnished", "unfurnished", "semi", "SEMI-FURNISHED"]
+    )
+    columns["area"] = np.array([900.5, 1000, 1100, 1200], dtype=np.float32)
+    columns["bedrooms"] = np.array([1, 2, 12, 4], dtype=np.int64)
+    columns["bathrooms"] = np.array([1.0, 2.5, 1.0, 1.0])
+    columns["stories"] = np.ones(count, dtype=np.uint8)
+    columns["parking"] = np.zeros(count, dtype=bool)
+
+    typed, rejected = housing_validator.check(columns, count)
+
+    assert rejected.tolist() == [False, True, True, False]
+    assert typed["furnishingstatus"][[0, 3]].tolist() == [
+        "furnished",
+        "semi-furnished",
+    ]
+    assert typed["bedrooms"].dtype == np.int64
+    assert typed["area"].dtype == np.float64
+    assert typed["parking"].tolist() == [0, 0, 0, 0]
+
+
+def test_missing_column_rejects_every_row():
+    """Test a field missing from the columns is an error of each row."""
+    columns = {name: [value] * 3 for name, value in ROW.items()}
+    del columns["parking"]
+
+    _, rejected = housing_validator.check(columns, 3)
+
+    assert rejected.tolist() == [True, True, True]
+
+
+def test_arrow_columns_are_checked():
+    """Test the columns of an Arrow table are read as arrays."""
+    pyarrow = pytest.importorskip("pyarrow")
+    rows = [{**ROW, "area": 1000 + index} for index in range(5)]
+    rows[2]["bedrooms"] = 11
+    table = pyarrow.Table.from_pylist(rows)
+
+    typed, rejected = housing_validator.check(
+        {name: table.column(name) for name in table.column_names},
+        table.num_rows,
+    )
+
+    assert rejected.tolist() == [False, False, True, False, False]
+    assert typed["area"].tolist() == [1000, 1001, 1002, 1003, 1004]
+
+
+def test_column_batch_is_encoded_like_the_models():
+    """Test the encoders give the same request for a batch and models."""
+    batch = [
+        {**ROW, "area": 1000.5 + index, "bedrooms": index % 10}
+        for index in range(20)
+    ]
+    models = [HousingData.model_validate(item) for item in batch]
+
+    _, rows, _ = housing_validator.validate_rows(batch)
+
+    assert kserve_encoder.encode(rows) == kserve_encoder.encode(models)
+    assert kserve_encoder.encode_binary(rows) == kserve_encoder.encode_binary(
+        models
+    )
+    local_model = LocalModel("model.pkl", DATATYPE_MAPPING)
+    columns = local_model.columns(rows)
+    expected = local_model.columns(models)
+    for name, column in expected.items():
+        assert columns[name].dtype == column.dtype
+        assert columns[name].tolist() == column.tolist()
+
+
+def test_integer_areas_are_encoded_as_numbers():
+    """Test areas read as floats encode to the same numbers."""
+    batch = [{**ROW, "area": area} for area in (1200, "950", 3.4e38)]
+    models = [HousingData.model_validate(item) for item in batch]
+
+    _, rows, _ = housing_validator.validate_rows(batch)
+
+    encoded = json.loads(kserve_encoder.encode(rows))
+    expected = json.loads(kserve_encoder.encode(models))
+    assert encoded == expected
@@ -0,0 +1,188 @@
+"""Unit tests for the streaming profile of the input features."""
+
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.data_models import DriftSnapshot
+from src.drift import (
+    DriftMonitor,
+    DriftSnapshotter,
+    FeatureProfile,
+    QuantileSketch,
+    numeric_drift,
+)
+from src.utils import settings
+
+NUMERIC = ["area", "bedrooms"]
+CATEGORICAL = ["mainroad", "furnishingstatus"]
+
+
+def inputs(generator, count: int, area: float = 7.0, furnished=0.3):
+    """Columns of random inputs, the area log-normal around e**area."""
+    return {
+        "area": generator.lognormal(area, 0.5, count),
+        "bedrooms": generator.integers(1, 6, count),
+        "mainroad": generator.choice(["yes", "No"], count),
+        "furnishingstatus": generator.choice(
+            ["furnished", "unfurnished"], count, p=[furnished, 1 - furnished]
+        ),
+    }
+
+
+def profile_of(columns: dict) -> FeatureProfile:
+    profile = FeatureProfile(NUMERIC, CATEGORICAL)
+    profile.observe_columns(columns)
+    return profile
+
+
+def test_quantiles_are_within_the_relative_accuracy():
+    """Test the quantiles of the sketch against the exact ones."""
+    generator = np.random.default_rng(23)
+    values = np.concatenate(
+        [generator.lognormal(7, 1, 5000), -generator.lognormal(0, 1, 500)]
+    )
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    columns = QuantileSketch(relative_accuracy=0.01)
+    columns.add_many(values)
+
+    assert columns.bins() == sketch.bins()
+    for q in (0.01, 0.05, 0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method="inverted_cdf")
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+    assert sketch.quantile(0) == values.min()
+    assert sketch.quantile(1) == values.max()
+
+
+def test_sketch_bins_are_bounded():
+    """Test the bins of the smallest magnitudes are merged past the limit."""
+    sketch = QuantileSketch(relative_accuracy=0.01, max_bins=100)
+    sketch.add_many(np.geomspace(1e-3, 1e6, 10000))
+
+    assert len(sketch.positive) == 100
+    assert sketch.count == 10000
+    assert sketch.quantile(0.99) == pytest.approx(
+        np.geomspace(1e-3, 1e6, 10000)[9899], rel=0.01
+    )
+
+
+def test_profiles_are_merged_and_saved():
+    """Test merging profiles is the same as profiling all the inputs and
+    the profile is the same once read back from JSON."""
+    generator = np.random.default_rng(24)
+    first, second = inputs(generator, 300), inputs(generator, 200)
+    merged = profile_of(first)
+    merged.merge(profile_of(second))
+    both = profile_of(
+        {name: np.concatenate([first[name], second[name]]) for name in first}
+    )
+
+    assert merged.count == both.count
+    assert merged.categories == both.categories
+    for name, sketch in both.sketches.items():
+        assert merged.sketches[name].bins() == sketch.bins()
+        assert merged.sketches[name].sum == pytest.approx(sketch.sum)
+    saved = json.loads(json.dumps(both.to_dict()))
+    assert FeatureProfile.from_dict(saved).to_dict() == both.to_dict()
+
+
+def test_drift_scores_the_changed_features():
+    """Test the shifted numeric feature and the category now more frequent
+    are reported as drifted, the unchanged features are not."""
+    generator = np.random.default_rng(25)
+    reference = profile_of(inputs(generator, 20000))
+    monitor = DriftMonitor(NUMERIC, CATEGORICAL, reference)
+    monitor.observe_columns(inputs(generator, 5000, area=7.4, furnished=0.6))
+    monitor.observe(
+        {
+            "area": 1000,
+            "bedrooms": 3,
+            "mainroad": "YES",
+            "furnishingstatus": "",
+        }
+    )
+
+    report = monitor.report()
+
+    features = report["features"]
+    assert report["count"] == 5001
+    assert features["area"]["drifted"]
+    assert features["area"]["ks"] > 0.2
+    assert features["furnishingstatus"]["drifted"]
+    assert not features["bedrooms"]["drifted"]
+    assert features["bedrooms"]["ks"] < 0.05
+    assert not features["mainroad"]["drifted"]
+    assert set(features["mainroad"]["fractions"]) == {"yes", "no"}
+
+
+def test_same_distribution_has_no_drift():
+    """Test two samples of one distribution have a small PSI and KS."""
+    generator = np.random.default_rng(26)
+    reference, current = QuantileSketch(), QuantileSketch()
+    reference.add_many(generator.normal(5000, 800, 20000))
+    current.add_many(generator.normal(5000, 800, 20000))
+
+    scores = numeric_drift(reference, current)
+
+    assert scores["psi"] < 0.01
+    assert scores["ks"] < 0.02
+
+
+def test_report_without_reference_has_no_scores():
+    """Test the profile is reported without a reference profile."""
+    monitor = DriftMonitor(NUMERIC, CATEGORICAL)
+    monitor.observe_columns(inputs(np.random.default_rng(27), 10))
+
+    report = monitor.report()
+
+    assert report["reference_count"] is None
+    assert monitor.scores() is None
+    assert set(report["features"]["area"]) == {
+        "mean",
+        "min",
+        "p50",
+        "p90",
+        "p99",
+        "max",
+    }
+
+
+def test_snapshots_store_the_window_and_start_a_new_one():
+    """Test a snapshot stores the profile and scores of the window."""
+    generator = np.random.default_rng(28)
+    reference = profile_of(inputs(generator, 1000))
+    monitor = DriftMonitor(NUMERIC, CATEGORICAL, reference)
+    monitor.observe_columns(inputs(generator, 100))
+    started_at = monitor.started_at
+
+    async def main():
+        engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+        snapshotter = DriftSnapshotter(monitor, engine, interval=3600)
+        stored = await snapshotter.run_once()
+        # Nothing is stored for a window without inputs
+        assert not await snapshotter.run_once()
+        await engine.dispose()
+        return stored
+
+    assert asyncio.run(main())
+    assert monitor.window.count == 0
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.begin() as connection:
+        snapshot = connection.execute(
+            select(DriftSnapshot).where(DriftSnapshot.started_at == started_at)
+        ).one()
+        connection.execute(
+            delete(DriftSnapshot).where(DriftSnapshot.id == snapshot.id)
+        )
+    engine.dispose()
+
+    assert snapshot.count == 100
+    assert snapshot.ended_at >= started_at
+    assert snapshot.profile["numeric"]["area"]["count"] == 100
+    assert snapshot.scores["area"]["drifted"] is False
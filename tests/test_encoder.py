@@ -0,0 +1,139 @@
+"""Unit tests for the KServe request encoder."""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+import pytest
+
+from benchmarks.bench_encoder import json_payload
+from benchmarks.stub_model_server import create_app
+from src.main import HousingData, kserve_encoder, model_settings, score_batch
+from src.model_client import ModelResponseError, decode_binary_response
+from src.routing import Replica, ReplicaRouter
+
+ROW = {
+    "mainroad": "yes",
+    "guestroom": "No",
+    "basement": "YES",
+    "hotwaterheating": "no",
+    "airconditioning": "Yes",
+    "prefarea": "NO",
+    "furnishingstatus": "Semi-Furnished",
+    "area": 1200,
+    "bedrooms": 3,
+    "bathrooms": 2,
+    "stories": 2,
+    "parking": 1,
+}
+
+
+def reference_encoding(rows: list[HousingData]) -> bytes:
+    """Request body serialised from the payload built the previous way."""
+    return json.dumps(json_payload(rows), separators=(",", ":")).encode()
+
+
+@pytest.mark.parametrize(
+    "area", [1200, 1200.0, 1200.5, 0.1, 1e-7, 3.4e38, -5, float("inf")]
+)
+def test_encoding_matches_the_json_payload(area):
+    """Test the encoded body is the same as the serialised payload."""
+    rows = [HousingData(**{**ROW, "area": area})]
+
+    assert kserve_encoder.encode(rows) == reference_encoding(rows)
+
+
+def test_encoding_of_many_rows():
+    """Test the rows are encoded as one tensor of shape [N] per feature."""
+    rows = [
+        HousingData(**{**ROW, "bedrooms": bedrooms, "area": 1000 + bedrooms})
+        for bedrooms in range(5)
+    ]
+
+    body = kserve_encoder.encode(rows)
+
+    assert body == reference_encoding(rows)
+    inputs = {tensor["name"]: tensor for tensor in json.loads(body)["inputs"]}
+    assert all(tensor["shape"] == [5] for tensor in inputs.values())
+    assert inputs["bedrooms"]["data"] == [0, 1, 2, 3, 4]
+    assert inputs["furnishingstatus"]["data"] == ["SEMI-FURNISHED"] * 5
+
+
+def test_encoding_of_empty_batch():
+    """Test an empty batch gives tensors with no data."""
+    assert kserve_encoder.encode([]) == reference_encoding([])
+
+
+def test_binary_encoding():
+    """Test the numeric features are sent as little-endian buffers."""
+    rows = [
+        HousingData(**{**ROW, "bedrooms": bedrooms, "area": 1000.5 + bedrooms})
+        for bedrooms in range(3)
+    ]
+
+    body, header_length = kserve_encoder.encode_binary(rows)
+
+    header = json.loads(body[:header_length])
+    assert header["parameters"] == {"binary_data_output": True}
+    inputs = {tensor["name"]: tensor for tensor in header["inputs"]}
+    assert inputs["mainroad"]["data"] == ["YES"] * 3
+    assert inputs["area"]["parameters"] == {"binary_data_size": 12}
+    assert "data" not in inputs["area"]
+    offset = header_length
+    buffers = {}
+    for tensor in header["inputs"]:
+        if "parameters" in tensor:
+            end = offset + tensor["parameters"]["binary_data_size"]
+            buffers[tensor["name"]] = body[offset:end]
+            offset = end
+    assert offset == len(body)
+    assert np.frombuffer(buffers["area"], "<f4").tolist() == [
+        1000.5,
+        1001.5,
+        1002.5,
+    ]
+    assert np.frombuffer(buffers["bedrooms"], "<i8").tolist() == [0, 1, 2]
+
+
+def test_decode_binary_response():
+    """Test binary outputs are read from the response body."""
+    header = json.dumps(
+        {
+            "outputs": [
+                {
+                    "name": "output-1",
+                    "shape": [2, 1],
+                    "datatype": "FP32",
+                    "parameters": {"binary_data_size": 8},
+                }
+            ]
+        }
+    ).encode()
+    body = header + np.array([1.5, 2.5], dtype="<f4").tobytes()
+
+    response = decode_binary_response(body, len(header))
+
+    assert response["outputs"][0]["data"].tolist() == [1.5, 2.5]
+    with pytest.raises(ModelResponseError):
+        decode_binary_response(body[:-1], len(header))
+
+
+def test_binary_prediction_with_stub_model_server():
+    """Test a binary request is scored by a model server supporting it."""
+    stub = create_app(price=123456.5)
+    rows = [HousingData(**{**ROW, "area": area}) for area in (900, 1200.5)]
+
+    async def score():
+        transport = httpx.ASGITransport(app=stub)
+        client = httpx.AsyncClient(transport=transport)
+        router = ReplicaRouter([Replica("http://stub/invocations", client)])
+        try:
+            return await score_batch(router, rows)
+        finally:
+            await router.stop()
+
+    with patch.object(model_settings, "MODEL_BINARY_DATA", True):
+        assert asyncio.run(score()) == [123456.5, 123456.5]
+    assert stub.state.requests == 1
@@ -0,0 +1,80 @@
+"""Unit tests for the readiness checks."""
+
+import asyncio
+
+from src.health import ReadinessChecker
+from tests.test_resilience import FakeClock
+
+
+def test_results_are_cached_for_the_ttl():
+    """Test the checks only run again once the result is stale."""
+    clock = FakeClock()
+    runs = []
+
+    async def check():
+        runs.append(clock.now)
+
+    readiness = ReadinessChecker({"model": check}, ttl=5, clock=clock)
+
+    async def main():
+        first = await readiness.check()
+        clock.now += 4
+        second = await readiness.check()
+        clock.now += 1
+        third = await readiness.check()
+        return first, second, third
+
+    first, second, third = asyncio.run(main())
+
+    assert len(runs) == 2
+    assert first["ready"] and not first["cached"]
+    assert second["cached"] and second["age_seconds"] == 4
+    assert not third["cached"]
+    assert first["dependencies"]["model"]["latency_ms"] >= 0
+
+
+def test_failing_and_slow_dependencies_are_not_ready():
+    """Test errors and timeouts are reported per dependency."""
+
+    async def ok():
+        pass
+
+    async def broken():
+        raise ConnectionError("connection refused")
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    readiness = ReadinessChecker(
+        {"database": ok, "model": broken, "cache": slow}, timeout=0.05
+    )
+
+    result = asyncio.run(readiness.check())
+
+    assert not result["ready"]
+    dependencies = result["dependencies"]
+    assert dependencies["database"]["ready"]
+    assert "error" not in dependencies["database"]
+    assert dependencies["model"]["error"] == (
+        "ConnectionError: connection refused"
+    )
+    assert dependencies["cache"]["error"] == "no answer within 0.05s"
+
+
+def test_concurrent_probes_share_one_run():
+    """Test probes arriving during the checks wait for the same result."""
+    runs = []
+
+    async def check():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+
+    readiness = ReadinessChecker({"model": check})
+
+    async def main():
+        return await asyncio.gather(*(readiness.check() for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert len(runs) == 1
+    assert all(result["ready"] for result in results)
@@ -0,0 +1,90 @@
+"""Unit tests for the load generators of the benchmarks."""
+
+import asyncio
+import os
+
+import httpx
+
+from benchmarks.harness import cpu_seconds
+from benchmarks.load import compare, run_fixed_rate, run_ramp
+from benchmarks.stub_model_server import create_app
+
+BODY = {"inputs": [{"name": "area", "shape": [1], "data": [1200]}]}
+
+
+def test_fixed_rate_sends_requests_on_schedule():
+    """Test the requests are sent at the rate, whatever their latency."""
+    transport = httpx.ASGITransport(app=create_app(latency_ms=50))
+
+    result = asyncio.run(
+        run_fixed_rate(
+            "http://stub/invocations", BODY, 200, 0.25, transport=transport
+        )
+    )
+
+    assert result.requests == 50
+    assert result.errors == 0
+    # With a closed loop of one worker, 50 requests would take 2.5s
+    assert result.duration < 1
+    assert result.p50_ms >= 50
+
+
+def test_ramp_runs_each_concurrency():
+    """Test the ramp gives a result per concurrency, with the errors."""
+    stub = create_app(latency_ms=5, error_rate=0.5, seed=20)
+    transport = httpx.ASGITransport(app=stub)
+
+    results = asyncio.run(
+        run_ramp(
+            "http://stub/invocations", BODY, [1, 4], 0.2, transport=transport
+        )
+    )
+
+    assert list(results) == [1, 4]
+    assert results[4].requests > results[1].requests
+    assert all(
+        0 < result.errors < result.requests for result in results.values()
+    )
+    assert sum(r.requests for r in results.values()) == stub.state.requests
+
+
+def test_compare_reports_regressions():
+    """Test metrics worse than the baseline by the tolerance are reported."""
+    baseline = {
+        "predict/rate_100": {
+            "requests_per_second": 100.0,
+            "p50_ms": 10.0,
+            "p95_ms": 20.0,
+            "p99_ms": 30.0,
+            "cpu_ms_per_request": None,
+        },
+        "predict/concurrency_8": {"requests_per_second": 400.0},
+    }
+    results = {
+        "predict/rate_100": {
+            "requests_per_second": 99.0,
+            "p50_ms": 9.0,
+            "p95_ms": 21.0,
+            "p99_ms": 40.0,
+            "cpu_ms_per_request": 1.5,
+        },
+        "predict/concurrency_8": {"requests_per_second": 300.0},
+        "predict/concurrency_64": {"requests_per_second": 900.0},
+    }
+
+    lines, regressions = compare(baseline, results, tolerance=10)
+
+    assert len(lines) == 5
+    assert regressions == [
+        "predict/rate_100 p99_ms: 30.00 -> 40.00 (+33.3%)",
+        "predict/concurrency_8 requests_per_second: 400.00 -> 300.00 "
+        "(-25.0%)",
+    ]
+
+
+def test_cpu_seconds_counts_the_process():
+    """Test the CPU time of a process grows as it runs."""
+    before = cpu_seconds(os.getpid())
+    sum(i * i for i in range(2_000_000))
+
+    assert cpu_seconds(os.getpid()) > before
@@ -0,0 +1,82 @@
+"""Unit tests for the in-process local model."""
+
+import asyncio
+import pickle
+
+import pytest
+
+from src.local_model import LocalModel, LocalModelError
+from src.main import DATATYPE_MAPPING, HousingData
+from tests.test_main import PAYLOAD
+
+
+class LinearModel:
+    """Picklable stand-in for a regression model."""
+
+    def predict(self, frame):
+        price = frame["area"] * 100.0 + frame["bedrooms"] * 1000.0
+        # Categorical columns are passed upper-cased
+        return price + (frame["mainroad"] == "YES") * 1.0
+
+
+class BrokenModel:
+    """Model failing to score."""
+
+    def predict(self, frame):
+        raise RuntimeError("model is broken")
+
+
+def save_model(model, tmp_path) -> str:
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps(model))
+    return str(path)
+
+
+def score(local_model: LocalModel, rows) -> list[float]:
+    async def main():
+        local_model.start()
+        try:
+            return await local_model.predict(local_model.columns(rows))
+        finally:
+            await local_model.stop()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_rows_are_scored_in_one_call(executor, tmp_path):
+    """Test the rows are scored together in the thread or process pool."""
+    local_model = LocalModel(
+        save_model(LinearModel(), tmp_path), DATATYPE_MAPPING, executor
+    )
+    rows = [
+        HousingData(**{**PAYLOAD, "area": 1000, "bedrooms": 2}),
+        HousingData(**{**PAYLOAD, "area": 1500.5, "mainroad": "no"}),
+    ]
+
+    assert score(local_model, rows) == [102001.0, 153050.0]
+
+
+def test_columns_match_the_model_request():
+    """Test the columns hold the values sent to the model server."""
+    local_model = LocalModel("model.pkl", DATATYPE_MAPPING)
+
+    columns = local_model.columns(
+        [HousingData(**PAYLOAD), HousingData(**{**PAYLOAD, "area": 1.5})]
+    )
+
+    assert list(columns) == list(DATATYPE_MAPPING)
+    assert columns["furnishingstatus"].tolist() == ["FURNISHED"] * 2
+    assert columns["area"].dtype.str == "<f4"
+    assert columns["area"].tolist() == [1200.0, 1.5]
+    assert columns["parking"].tolist() == [1, 1]
+
+
+def test_model_errors_are_raised_as_local_model_errors(tmp_path):
+    """Test a failing model raises a LocalModelError."""
+    local_model = LocalModel(
+        save_model(BrokenModel(), tmp_path), DATATYPE_MAPPING
+    )
+
+    with pytest.raises(LocalModelError, match="model is broken"):
+        score(local_model, [HousingData(**PAYLOAD)])
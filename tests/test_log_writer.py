@@ -0,0 +1,118 @@
+"""Unit tests for the background prediction log writer."""
+
+import asyncio
+
+from src.log_writer import PredictionLogWriter
+
+
+class FakeSession:
+    """Session stand-in recording the rows of each bulk insert."""
+
+    inserts: list[list[dict]] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def connection(self):
+        pass
+
+    async def execute(self, statement, records):
+        self.inserts.append(list(records))
+
+    async def commit(self):
+        pass
+
+
+async def wait_for_inserts(count: int, timeout: float = 2.0):
+    """Waits until the writer has made `count` inserts."""
+    for _ in range(int(timeout / 0.01)):
+        if len(FakeSession.inserts) >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
+def make_writer(**kwargs) -> PredictionLogWriter:
+    FakeSession.inserts = []
+    return PredictionLogWriter(FakeSession, **kwargs)
+
+
+def test_records_are_written_in_bulk():
+    """Test the queued records are written with multi-row inserts."""
+    writer = make_writer(batch_size=4, flush_interval_ms=1000)
+
+    async def main():
+        writer.start()
+        await writer.write_many([{"id": i} for i in range(10)])
+        # Full batches are written without waiting for the interval
+        await wait_for_inserts(2)
+        assert [len(rows) for rows in FakeSession.inserts] == [4, 4]
+        await writer.stop()
+
+    asyncio.run(main())
+    assert [len(rows) for rows in FakeSession.inserts] == [4, 4, 2]
+    assert writer.stats()["written"] == 10
+    assert writer.queue_depth == 0
+
+
+def test_records_are_written_after_flush_interval():
+    """Test a partial batch is written once the interval has passed."""
+    writer = make_writer(batch_size=100, flush_interval_ms=10)
+
+    async def main():
+        writer.start()
+        await writer.write({"id": 1})
+        await wait_for_inserts(1)
+        assert FakeSession.inserts == [[{"id": 1}]]
+        await writer.stop()
+
+    asyncio.run(main())
+
+
+def test_drop_policy_when_queue_is_full():
+    """Test records are dropped instead of blocking when the queue is full."""
+    writer = make_writer(max_queue_size=2, overflow_policy="drop")
+
+    async def main():
+        accepted = await writer.write_many([{"id": i} for i in range(5)])
+        assert accepted == 2
+        await writer.stop()
+
+    asyncio.run(main())
+    assert writer.stats()["dropped"] == 3
+    assert FakeSession.inserts == [[{"id": 0}, {"id": 1}]]
+
+
+def test_block_policy_waits_for_space():
+    """Test the caller waits for the writer to make space in the queue."""
+    writer = make_writer(
+        batch_size=1, max_queue_size=1, overflow_policy="block"
+    )
+
+    async def main():
+        writer.start()
+        await asyncio.wait_for(
+            writer.write_many([{"id": i} for i in range(5)]), timeout=5
+        )
+        await writer.stop()
+
+    asyncio.run(main())
+    assert writer.stats()["dropped"] == 0
+    assert writer.stats()["written"] == 5
+
+
+def test_disabled_writer_writes_nothing():
+    """Test the records given to a disabled writer are discarded."""
+    writer = make_writer(enabled=False)
+
+    async def main():
+        writer.start()
+        accepted = await writer.write_many([{"id": i} for i in range(3)])
+        assert accepted == 0
+        await writer.stop()
+
+    asyncio.run(main())
+    assert FakeSession.inserts == []
+    assert writer.stats()["dropped"] == 0
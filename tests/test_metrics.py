@@ -0,0 +1,65 @@
+"""Unit tests for the metric primitives."""
+
+import pytest
+
+from src.metrics import Registry, from_histogram, single_value
+
+
+def test_histogram_is_rendered_in_prometheus_format():
+    """Test histogram buckets are cumulative and end with +Inf."""
+    registry = Registry()
+    family = registry.histogram(
+        "stage_seconds", "Stage time.", ["stage"], buckets=(0.1, 1)
+    )
+    for value in (0.05, 0.5, 0.5, 5):
+        family.labels("model").observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP stage_seconds Stage time.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="model",le="0.1"} 1',
+        'stage_seconds_bucket{stage="model",le="1"} 3',
+        'stage_seconds_bucket{stage="model",le="+Inf"} 4',
+        'stage_seconds_sum{stage="model"} 6.05',
+        'stage_seconds_count{stage="model"} 4',
+    ]
+
+
+def test_counters_and_collectors():
+    """Test labelled counters and the families built at scrape time."""
+    registry = Registry()
+    errors = registry.counter("errors_total", "Errors.", ["type"])
+    errors.labels('Read"Timeout').inc()
+    errors.labels("http_503").inc(2)
+    queue_depth = 0
+    registry.add_collector(
+        lambda: [single_value("queue_depth", "Queue.", "gauge", queue_depth)]
+    )
+
+    queue_depth = 7
+    lines = registry.render().splitlines()
+
+    assert 'errors_total{type="Read\\"Timeout"} 1.0' in lines
+    assert 'errors_total{type="http_503"} 2.0' in lines
+    assert "queue_depth 7" in lines
+
+
+def test_labels_must_match_and_names_are_unique():
+    """Test wrong label counts and duplicate names are rejected."""
+    registry = Registry()
+    family = registry.counter("errors_total", "Errors.", ["type"])
+
+    with pytest.raises(ValueError):
+        family.labels()
+    with pytest.raises(ValueError):
+        registry.counter("errors_total", "Errors.")
+
+
+def test_histogram_kept_elsewhere_can_be_exposed():
+    """Test a component's own histogram can be rendered as a family."""
+    registry = Registry()
+    family = registry.histogram("size", "Size.", buckets=(1, 2))
+    family.labels().observe(2)
+    exposed = from_histogram("batch_size", "Batch size.", family.labels())
+
+    assert "batch_size_count 1" in list(exposed.render())
@@ -0,0 +1,200 @@
+"""Unit tests for the resilience of the model requests."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.stub_model_server import create_app
+from src.resilience import (
+    AttemptTimeout,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    UpstreamPolicy,
+)
+
+MODEL_PAYLOAD = {
+    "inputs": [
+        {"name": "area", "shape": [1], "datatype": "FP32", "data": [1200]}
+    ]
+}
+
+
+class FakeClock:
+    """Clock advanced by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def call_stub(stub, policy: UpstreamPolicy, calls: int = 1):
+    """Makes the calls to the stub model server through the policy."""
+
+    async def main():
+        transport = httpx.ASGITransport(app=stub)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://stub"
+        ) as client:
+
+            async def send():
+                response = await client.post(
+                    "/invocations", json=MODEL_PAYLOAD
+                )
+                response.raise_for_status()
+                return response.json()
+
+            return [await policy.call(send) for _ in range(calls)]
+
+    return asyncio.run(main())
+
+
+def test_breaker_opens_on_failure_rate_and_recovers():
+    """Test the breaker fails fast once open and closes after a trial."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        failure_rate=0.5, min_calls=4, open_seconds=5, clock=clock
+    )
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.allow()
+    assert error.value.retry_after == 5
+
+    clock.now += 5
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one trial call at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_failed_trial_reopens_the_breaker():
+    """Test a failure while half-open opens the breaker again."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=5, clock=clock)
+    breaker.record_failure()
+    clock.now += 5
+    breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_cancelled_trial_lets_the_next_call_through():
+    """Test a trial call cancelled while half-open does not jam the breaker."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=1, open_seconds=5, clock=clock)
+    policy = UpstreamPolicy(breaker=breaker, max_retries=0)
+    breaker.record_failure()
+    clock.now += 5
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def answer():
+        return "answer"
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(policy.call(slow), timeout=0.05)
+        return await policy.call(answer)
+
+    assert asyncio.run(main()) == "answer"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_budget_limits_the_retries():
+    """Test retries are allowed up to the share of the requests."""
+    budget = RetryBudget(ratio=0.2, min_per_second=0, clock=FakeClock())
+    for _ in range(10):
+        budget.deposit()
+
+    assert [budget.withdraw() for _ in range(3)] == [True, True, False]
+
+
+def test_failed_attempts_are_retried():
+    """Test 5xx responses are retried up to the maximum retries."""
+    stub = create_app(error_rate=1.0)
+    policy = UpstreamPolicy(max_retries=2, backoff_base=0)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call_stub(stub, policy)
+
+    assert stub.state.requests == 3
+    assert policy.retries == 2
+
+
+def test_open_breaker_stops_calling_the_model():
+    """Test the model server is no longer called once the breaker opens."""
+    stub = create_app(error_rate=1.0)
+    policy = UpstreamPolicy(
+        breaker=CircuitBreaker(min_calls=3),
+        max_retries=2,
+        backoff_base=0,
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        call_stub(stub, policy)
+
+    with pytest.raises(CircuitOpenError):
+        call_stub(stub, policy)
+
+    assert stub.state.requests == 3
+    assert policy.stats()["circuit_breaker"]["state"] == "open"
+
+
+def test_retries_recover_from_intermittent_errors():
+    """Test the calls succeed despite some failing attempts."""
+    stub = create_app(error_rate=0.3, price=42.0, seed=3)
+    policy = UpstreamPolicy(
+        breaker=CircuitBreaker(), max_retries=3, backoff_base=0
+    )
+
+    responses = call_stub(stub, policy, calls=20)
+
+    assert [r["outputs"][0]["data"] for r in responses] == [[42.0]] * 20
+    assert policy.retries > 0
+    assert stub.state.requests == 20 + policy.retries
+
+
+def test_slow_attempts_time_out():
+    """Test an attempt is cancelled after the attempt timeout."""
+    stub = create_app(slow_rate=1.0, slow_ms=1000)
+    policy = UpstreamPolicy(attempt_timeout=0.05, max_retries=0)
+
+    with pytest.raises(AttemptTimeout):
+        call_stub(stub, policy)
+
+    assert policy.timeouts == 1
+
+
+def test_slow_attempt_is_hedged():
+    """Test a second attempt is sent when the first one is slow."""
+    policy = UpstreamPolicy(hedging=True, hedge_min_delay=0.01)
+    for _ in range(20):
+        policy.latency.observe(0.01)
+    delays = [1.0, 0.0]
+
+    async def attempt():
+        await asyncio.sleep(delays.pop(0))
+        return "answer"
+
+    async def main():
+        return await asyncio.wait_for(policy.call(attempt), timeout=0.5)
+
+    assert asyncio.run(main()) == "answer"
+    assert policy.hedges == 1
+    assert policy.hedge_wins == 1
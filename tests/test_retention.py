@@ -0,0 +1,145 @@
+"""Tests for the partitions of the prediction logs.
+
+The maintenance runs on a scratch partitioned table shaped like the logs,
+so that its locks do not get in the way of the other tests.
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+
+from src.data_models import PredictionLog
+from src.db_connection import get_engine
+from src.retention import (
+    MAINTENANCE_LOCK_ID,
+    list_partitions,
+    maintain_partitions,
+    partition_name,
+)
+from src.utils import settings
+
+TABLE = "retention_test_logs"
+DAY = date(2001, 1, 10)
+LOG = {
+    "mainroad": "yes",
+    "guestroom": "no",
+    "basement": "yes",
+    "hotwaterheating": "no",
+    "airconditioning": "yes",
+    "prefarea": "no",
+    "furnishingstatus": "furnished",
+    "area": 1200,
+    "bedrooms": 3,
+    "bathrooms": 2,
+    "stories": 2,
+    "parking": 1,
+}
+
+
+@pytest.fixture
+def connection():
+    """Autocommit connection with the scratch table, dropped afterwards."""
+    autocommit_engine = create_engine(
+        settings.DATABASE_URL, isolation_level="AUTOCOMMIT"
+    )
+    with autocommit_engine.connect() as connection:
+        connection.execute(text("SET lock_timeout = 5000"))
+        connection.execute(
+            text(
+                f"CREATE TABLE {TABLE} (LIKE prediction_logs INCLUDING ALL) "
+                "PARTITION BY RANGE (timestamp)"
+            )
+        )
+        try:
+            yield connection
+        finally:
+            connection.execute(text(f"DROP TABLE {TABLE}"))
+    autocommit_engine.dispose()
+
+
+def maintain(connection, today: date, days_ahead=0, retention_days=0):
+    return maintain_partitions(
+        connection, today, days_ahead, retention_days, table=TABLE
+    )
+
+
+def insert_log(connection, timestamp: datetime):
+    columns = ", ".join(LOG)
+    connection.execute(
+        text(
+            f"INSERT INTO {TABLE} (id, timestamp, {columns}) VALUES "
+            f"(1, :timestamp, {', '.join(':' + column for column in LOG)})"
+        ),
+        {**LOG, "timestamp": timestamp},
+    )
+
+
+def test_timestamp_is_set_when_inserting():
+    """Test the database dates the logs written without a timestamp."""
+    engine = get_engine()
+    with engine.connect() as connection, connection.begin() as transaction:
+        connection.execute(insert(PredictionLog), [{**LOG, "area": 123321}])
+        logged_at = connection.execute(
+            select(PredictionLog.timestamp).where(PredictionLog.area == 123321)
+        ).scalar_one()
+        transaction.rollback()
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    assert abs(now - logged_at) < timedelta(minutes=1)
+
+
+def test_partitions_are_created_ahead_and_expired_ones_dropped(connection):
+    """Test the maintenance keeps the coming days and drops the old ones."""
+    old_day = DAY - timedelta(days=40)
+    maintain(connection, old_day)
+    insert_log(connection, datetime(2000, 12, 1, 8))
+
+    result = maintain(connection, DAY, days_ahead=2, retention_days=30)
+
+    assert result["created"] == [
+        partition_name(DAY + timedelta(days=offset), TABLE)
+        for offset in range(3)
+    ]
+    assert result["dropped"] == [partition_name(old_day, TABLE)]
+    assert sorted(list_partitions(connection, TABLE)) == result["created"]
+    # The dropped partition is gone, not only detached
+    assert not connection.execute(
+        text("SELECT to_regclass(:name)"),
+        {"name": partition_name(old_day, TABLE)},
+    ).scalar()
+    assert not connection.execute(
+        text(f"SELECT count(*) FROM {TABLE}")
+    ).scalar()
+
+
+def test_logs_are_written_to_the_partition_of_their_day(connection):
+    """Test the logs of a day land in the partition of that day."""
+    maintain(connection, DAY, days_ahead=1)
+
+    insert_log(connection, datetime(2001, 1, 11, 12, 30))
+
+    partition = connection.execute(
+        text(f"SELECT tableoid::regclass::text FROM {TABLE}")
+    ).scalar_one()
+    assert partition == partition_name(DAY + timedelta(days=1), TABLE)
+
+
+def test_maintenance_is_skipped_while_another_one_runs(connection):
+    """Test only one process maintains the partitions at a time."""
+    with get_engine().connect() as other_connection:
+        other_connection.execute(
+            text("SELECT pg_advisory_lock(:lock_id)"),
+            {"lock_id": MAINTENANCE_LOCK_ID},
+        )
+        try:
+            result = maintain(connection, DAY)
+        finally:
+            other_connection.execute(
+                text("SELECT pg_advisory_unlock(:lock_id)"),
+                {"lock_id": MAINTENANCE_LOCK_ID},
+            )
+            other_connection.commit()
+
+    assert result == {"created": [], "dropped": [], "skipped": True}
+    assert list_partitions(connection, TABLE) == {}
@@ -0,0 +1,200 @@
+"""Unit tests for the routing across the model replicas."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks.stub_model_server import create_app
+from src.resilience import AttemptTimeout, UpstreamPolicy
+from src.routing import Replica, ReplicaRouter
+from tests.test_resilience import MODEL_PAYLOAD, FakeClock
+
+
+def stub_replica(name: str, stub) -> Replica:
+    transport = httpx.ASGITransport(app=stub)
+    return Replica(
+        f"http://{name}/invocations", httpx.AsyncClient(transport=transport)
+    )
+
+
+@pytest.mark.parametrize("strategy", ["least_outstanding", "ewma"])
+def test_traffic_moves_away_from_slow_replicas(strategy):
+    """Test the slow replica gets less traffic than the fast ones."""
+    stubs = {
+        "fast-1": create_app(latency_ms=2),
+        "fast-2": create_app(latency_ms=2),
+        "slow": create_app(latency_ms=40),
+    }
+    router = ReplicaRouter(
+        [stub_replica(name, stub) for name, stub in stubs.items()],
+        strategy=strategy,
+    )
+
+    async def worker():
+        for _ in range(15):
+            await router.request(MODEL_PAYLOAD)
+
+    async def main():
+        try:
+            await asyncio.gather(*(worker() for _ in range(6)))
+        finally:
+            await router.stop()
+
+    asyncio.run(main())
+
+    requests = {name: stub.state.requests for name, stub in stubs.items()}
+    assert sum(requests.values()) == 90
+    assert requests["slow"] * 3 < requests["fast-1"]
+    assert requests["slow"] * 3 < requests["fast-2"]
+
+
+def test_failing_replica_is_ejected_until_a_probe_succeeds():
+    """Test a failing replica stops getting traffic until it recovers."""
+    broken = True
+    calls = {"a": 0, "b": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls[request.url.host] += 1
+        if request.url.host == "b" and broken:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"outputs": [{"data": [1.0]}]})
+
+    transport = httpx.MockTransport(handler)
+    clock = FakeClock()
+    router = ReplicaRouter(
+        [
+            Replica(
+                f"http://{host}/invocations",
+                httpx.AsyncClient(transport=transport),
+            )
+            for host in ("a", "b")
+        ],
+        eject_after_failures=2,
+        eject_seconds=10,
+        probe_payload=MODEL_PAYLOAD,
+        clock=clock,
+    )
+    replica_b = router.replicas[1]
+
+    async def send(count: int):
+        for _ in range(count):
+            try:
+                await router.request(MODEL_PAYLOAD)
+            except httpx.HTTPStatusError:
+                pass
+
+    async def main():
+        await send(6)
+        assert replica_b.ejected
+        calls_before = calls["b"]
+        await send(10)
+        # No traffic while ejected, and no probe before the ejection time
+        await router.probe()
+        assert calls["b"] == calls_before
+
+        clock.now += 10
+        await router.probe()
+        assert replica_b.ejected
+
+        nonlocal broken
+        broken = False
+        clock.now += 10
+        await router.probe()
+        assert not replica_b.ejected
+        calls_before = calls["b"]
+        await send(4)
+        assert calls["b"] > calls_before
+        await router.stop()
+
+    asyncio.run(main())
+
+    assert router.stats()["replicas"][1]["times_ejected"] == 1
+
+
+def test_replica_timing_out_is_ejected():
+    """Test attempts cut by the attempt timeout count as failures."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={"outputs": [{"data": [1.0]}]})
+
+    transport = httpx.MockTransport(handler)
+    router = ReplicaRouter(
+        [
+            Replica(
+                "http://stuck/invocations",
+                httpx.AsyncClient(transport=transport),
+            )
+        ],
+        eject_after_failures=2,
+        attempt_timeout=0.05,
+    )
+    policy = UpstreamPolicy(attempt_timeout=0.05, max_retries=0)
+    stuck = router.replicas[0]
+
+    async def main():
+        for _ in range(2):
+            try:
+                await policy.call(lambda: router.request(MODEL_PAYLOAD))
+            except AttemptTimeout:
+                pass
+        await router.stop()
+
+    asyncio.run(main())
+
+    assert stuck.ejected
+    assert stuck.failures == 2
+
+
+def test_model_version_is_looked_up_once_per_ttl():
+    """Test responses without the model version get it from the metadata."""
+    stub = create_app(model_version="7", version_in_response=False)
+    transport = httpx.ASGITransport(app=stub)
+    replica = Replica(
+        "http://stub/v2/models/houses/infer",
+        httpx.AsyncClient(transport=transport),
+    )
+    clock = FakeClock()
+    router = ReplicaRouter([replica], metadata_ttl=60, clock=clock)
+
+    async def main():
+        try:
+            first = await asyncio.gather(
+                *(router.request(MODEL_PAYLOAD) for _ in range(5))
+            )
+            clock.now += 61
+            return first, await router.request(MODEL_PAYLOAD)
+        finally:
+            await router.stop()
+
+    first, later = asyncio.run(main())
+
+    assert {response["model_version"] for response in first} == {"7"}
+    assert later["model_version"] == "7"
+    assert first[0]["model_name"] == "house_price_prediction_prod"
+    assert stub.state.requests == 6
+    assert stub.state.metadata_requests == 2
+
+
+def test_model_version_in_the_response_is_kept():
+    """Test no metadata is looked up when the response has the version."""
+    stub = create_app(model_version="7")
+    transport = httpx.ASGITransport(app=stub)
+    router = ReplicaRouter(
+        [
+            Replica(
+                "http://stub/v2/models/houses/infer",
+                httpx.AsyncClient(transport=transport),
+            )
+        ]
+    )
+
+    async def main():
+        try:
+            return await router.request(MODEL_PAYLOAD)
+        finally:
+            await router.stop()
+
+    assert asyncio.run(main())["model_version"] == "7"
+    assert stub.state.metadata_requests == 0
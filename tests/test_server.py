@@ -0,0 +1,89 @@
+"""Tests of the multi-worker production server."""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+import httpx
+import pytest
+
+from benchmarks.harness import free_port, wait_until_up
+from src.server import STARTUP_FAILURE, worker_count
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(os, "fork"), reason="the workers are forked"
+)
+
+
+def start_server(app: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "src.server",
+            app,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            "2",
+        ],
+        env={**os.environ, **env},
+    )
+
+
+def test_worker_count_defaults_to_the_cpus():
+    """Test 0 workers means one per CPU available."""
+    assert worker_count(3) == 3
+    assert worker_count(0) >= 1
+
+
+def test_requests_in_flight_finish_on_sigterm():
+    """Test SIGTERM lets the requests being processed finish."""
+    port = free_port()
+    process = start_server(
+        "benchmarks.stub_model_server:app", port, {"STUB_LATENCY_MS": "500"}
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(f"{url}/")
+        responses = []
+        request = threading.Thread(
+            target=lambda: responses.append(
+                httpx.post(
+                    f"{url}/invocations",
+                    json={"inputs": [{"name": "area", "shape": [1]}]},
+                    timeout=10,
+                )
+            )
+        )
+        request.start()
+        # Wait for the request to be processed by a worker
+        threading.Event().wait(0.2)
+        process.send_signal(signal.SIGTERM)
+        request.join()
+
+        assert process.wait(timeout=10) == 0
+        assert responses[0].status_code == 200
+        with pytest.raises(httpx.TransportError):
+            httpx.get(f"{url}/", timeout=1)
+    finally:
+        process.kill()
+        process.wait()
+
+
+def test_startup_failure_stops_the_server():
+    """Test the workers are not restarted when the app cannot start."""
+    process = start_server(
+        "src.main:app",
+        free_port(),
+        {"PREDICTION_BACKEND": "local", "LOCAL_MODEL_PATH": ""},
+    )
+    try:
+        assert process.wait(timeout=30) == STARTUP_FAILURE
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,79 @@
+"""Unit tests for the coalescing of identical in-flight calls."""
+
+import asyncio
+
+import pytest
+
+from src.singleflight import SingleFlight
+
+
+def test_calls_with_different_keys_are_not_shared():
+    """Test only the calls with the same key are collapsed."""
+    single_flight = SingleFlight()
+    calls = []
+
+    async def call(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def main():
+        return await asyncio.gather(
+            *(
+                single_flight.do(key, lambda key=key: call(key))
+                for key in ["a", "b", "a", "a", "b"]
+            )
+        )
+
+    assert asyncio.run(main()) == ["a", "b", "a", "a", "b"]
+    assert sorted(calls) == ["a", "b"]
+    assert single_flight.stats() == {
+        "in_flight": 0,
+        "calls": 2,
+        "collapsed": 3,
+    }
+
+
+def test_errors_are_shared_and_not_cached():
+    """Test a failed call fails every waiting caller but not later ones."""
+    single_flight = SingleFlight()
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.01)
+        if attempts == 1:
+            raise RuntimeError("upstream error")
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(
+            *(single_flight.do("key", flaky) for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+        return await single_flight.do("key", flaky)
+
+    assert asyncio.run(main()) == "ok"
+    assert attempts == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    """Test the other callers get the result if the first one goes away."""
+    single_flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.do("key", call))
+        second = asyncio.ensure_future(single_flight.do("key", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == 42